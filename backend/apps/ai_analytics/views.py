@@ -966,7 +966,8 @@ def generate_multiple_appreciations(request):
     """Générer des appréciations pour plusieurs élèves"""
     from apps.ai_modules.appreciation_generator import AppreciationGenerator
     from apps.grades.models import SubjectAverage, GradingPeriod
-    from apps.schools.models import Subject, Class
+    from apps.schools.models import Class
+    from apps.timetable.models import Subject
     
     # Vérifier les permissions
     if request.user.user_type not in ['teacher', 'admin']:
@@ -997,7 +998,10 @@ def generate_multiple_appreciations(request):
         students = []
         if class_id:
             class_obj = get_object_or_404(Class, id=class_id)
-            students = [enrollment.student for enrollment in class_obj.students.filter(is_active=True)]
+            students = [
+                enrollment.student
+                for enrollment in class_obj.students.filter(is_active=True).select_related('student')
+            ]
         elif student_ids:
             students = User.objects.filter(id__in=student_ids, user_type='student')
         else:
@@ -1007,20 +1011,22 @@ def generate_multiple_appreciations(request):
             )
         
         # Préparer les données pour la génération
-        students_data = []
-        for student in students:
-            subject_average = SubjectAverage.objects.filter(
-                student=student,
-                subject=subject,
-                grading_period=period
-            ).first()
-            
-            students_data.append({
+        students = list(students)
+        averages = dict(SubjectAverage.objects.filter(
+            student__in=students,
+            subject=subject,
+            grading_period=period
+        ).values_list('student_id', 'average'))
+        
+        students_data = [
+            {
                 'student': student,
                 'subject': subject,
-                'average': subject_average.average if subject_average else None,
+                'average': averages.get(student.id),
                 'period': period
-            })
+            }
+            for student in students
+        ]
         
         # Générer toutes les appréciations
         generator = AppreciationGenerator()
@@ -2,6 +2,7 @@
 Module IA pour générer des appréciations
 """
 from .base import BaseAIModule
+import numpy as np
 import random
 import json
 import re
@@ -16,7 +17,11 @@ logger = logging.getLogger(__name__)
 class AppreciationGenerator(BaseAIModule):
     """Générateur d'appréciations pour les bulletins"""
     
-    def generate_appreciation(self, student, subject, average, period, options=None):
+    def generate(self, **kwargs):
+        """Méthode principale de génération"""
+        return self.generate_appreciation(**kwargs)
+    
+    def generate_appreciation(self, student, subject, average, period, options=None, profile=None):
         """
         Générer une appréciation pour un élève
         
@@ -26,13 +31,15 @@ class AppreciationGenerator(BaseAIModule):
             average: Moyenne de l'élève
             period: Période d'évaluation
             options: Options de génération (type, ton, longueur, etc.)
+            profile: Profil déjà calculé (traitement par lot), sinon analysé ici
         """
         try:
             if not options:
                 options = {}
             
             # Analyser le profil complet de l'élève
-            profile = self._analyze_comprehensive_profile(student, subject, average, period)
+            if profile is None:
+                profile = self._analyze_comprehensive_profile(student, subject, average, period)
             
             # Adapter selon les options
             appreciation_type = options.get('type', 'bulletin')
@@ -71,56 +78,86 @@ class AppreciationGenerator(BaseAIModule):
             logger.error(f"Erreur génération appréciation pour {student}: {e}")
             return self._get_fallback_appreciation(student, subject, average, period)
     
-    def generate_multiple_appreciations(self, students_data, options=None):
-        """Générer des appréciations pour plusieurs élèves"""
-        results = []
+    def generate_multiple_appreciations(self, students_data, options=None, max_workers=None):
+        """
+        Générer des appréciations pour plusieurs élèves
         
-        for data in students_data:
+        Les appels à l'API sont faits en parallèle (voir ``executor``) ;
+        les résultats sont renvoyés dans l'ordre de ``students_data``.
+        """
+        from .executor import map_concurrently
+        
+        # Profils de toute la classe calculés en quelques requêtes
+        profiles = self._build_batch_profiles(students_data)
+        
+        def generate_one(data):
             try:
                 result = self.generate_appreciation(
                     data['student'],
                     data['subject'], 
                     data['average'],
                     data['period'],
-                    options
+                    options,
+                    profile=profiles.get(self._profile_key(data))
                 )
-                results.append({
+                return {
                     'student_id': str(data['student'].id),
                     'appreciation': result,
                     'status': 'success'
-                })
+                }
             except Exception as e:
                 logger.error(f"Erreur génération pour {data['student']}: {e}")
-                results.append({
+                return {
                     'student_id': str(data['student'].id),
                     'appreciation': None,
                     'status': 'error',
                     'error': str(e)
-                })
+                }
         
-        return results
+        return map_concurrently(generate_one, students_data, max_workers=max_workers)
+    
+    def _profile_key(self, data):
+        subject_id = data['subject'].id if data['subject'] else None
+        return (data['student'].id, subject_id, data['period'].id)
+    
+    def _build_batch_profiles(self, students_data):
+        """
+        Calculer les profils par lot, groupés par (matière, période)
+        
+        En cas d'échec, renvoie les profils déjà calculés : les élèves
+        restants sont analysés individuellement.
+        """
+        from .profiling import ClassProfiler
+        
+        groups = {}
+        for data in students_data:
+            subject_id = data['subject'].id if data['subject'] else None
+            groups.setdefault((subject_id, data['period'].id), []).append(data)
+        
+        profiles = {}
+        for (subject_id, period_id), group in groups.items():
+            try:
+                profiler = ClassProfiler(
+                    self,
+                    [data['student'] for data in group],
+                    group[0]['subject'],
+                    group[0]['period'],
+                    averages={data['student'].id: data['average'] for data in group}
+                )
+                for student_id, profile in profiler.build_profiles().items():
+                    profiles[(student_id, subject_id, period_id)] = profile
+            except Exception as e:
+                logger.error(f"Erreur profilage par lot: {e}")
+        
+        return profiles
     
     def _analyze_comprehensive_profile(self, student, subject, average, period):
         """Analyser le profil complet de l'élève avec plus de données"""
         from apps.grades.models import Grade, SubjectAverage, Evaluation
         from apps.attendance.models import Attendance, StudentBehavior
         from apps.homework.models import StudentWork
-        from django.db.models import Avg, Count
         
-        profile = {
-            'name': student.first_name,
-            'subject': subject.name if subject else 'Matière générale',
-            'average': float(average) if average else None,
-            'level': self._get_level(average),
-            'progression': 'stable',
-            'behavior': 'correct',
-            'participation': 'moyenne',
-            'homework': 'régulier',
-            'attendance': 'satisfaisante',
-            'strengths': [],
-            'areas_for_improvement': [],
-            'recent_trend': 'stable'
-        }
+        profile = self._base_profile(student, subject, average)
         
         # Analyser la progression sur plusieurs périodes
         if subject:
@@ -130,19 +167,18 @@ class AppreciationGenerator(BaseAIModule):
                 grading_period__academic_year=period.academic_year
             ).order_by('grading_period__number')
             
-            if previous_averages.count() >= 2:
-                trend = self._calculate_trend(previous_averages)
-                profile['progression'] = trend['label']
-                profile['recent_trend'] = trend['direction']
+            trend = self._calculate_trend(previous_averages)
+            profile['progression'] = trend['label']
+            profile['recent_trend'] = trend['direction']
         
         # Analyser les évaluations récentes
-        recent_grades = Grade.objects.filter(
+        recent_grades = list(Grade.objects.filter(
             student=student,
             evaluation__subject=subject,
             evaluation__date__range=[period.start_date, period.end_date]
-        ).order_by('-evaluation__date')
+        ).select_related('evaluation').order_by('-evaluation__date'))
         
-        if recent_grades.exists():
+        if recent_grades:
             profile['recent_performance'] = self._analyze_recent_performance(recent_grades)
         
         # Analyser le comportement et la participation
@@ -167,24 +203,35 @@ class AppreciationGenerator(BaseAIModule):
         
         return profile
     
+    def _base_profile(self, student, subject, average):
+        """Profil par défaut, complété par les analyses"""
+        return {
+            'name': student.first_name,
+            'subject': subject.name if subject else 'Matière générale',
+            'average': float(average) if average else None,
+            'level': self._get_level(average),
+            'progression': 'stable',
+            'behavior': 'correct',
+            'participation': 'moyenne',
+            'homework': 'régulier',
+            'attendance': 'satisfaisante',
+            'strengths': [],
+            'areas_for_improvement': [],
+            'recent_trend': 'stable'
+        }
+    
     def _calculate_trend(self, averages):
         """Calculer la tendance sur plusieurs périodes"""
-        if averages.count() < 2:
-            return {'label': 'stable', 'direction': 'stable'}
-        
-        values = [float(avg.average) for avg in averages if avg.average]
+        values = np.array([float(avg.average) for avg in averages if avg.average], dtype=float)
         if len(values) < 2:
             return {'label': 'stable', 'direction': 'stable'}
         
-        # Calculer la pente de régression linéaire simple
-        n = len(values)
-        x_sum = sum(range(n))
-        y_sum = sum(values)
-        xy_sum = sum(i * values[i] for i in range(n))
-        x2_sum = sum(i**2 for i in range(n))
-        
-        slope = (n * xy_sum - x_sum * y_sum) / (n * x2_sum - x_sum**2)
-        
+        # Pente de la régression linéaire (moindres carrés)
+        slope = np.polyfit(np.arange(len(values)), values, 1)[0]
+        return self._classify_trend(slope)
+    
+    def _classify_trend(self, slope):
+        """Qualifier la tendance à partir de la pente"""
         if slope > 0.5:
             return {'label': 'en nette progression', 'direction': 'rising'}
         elif slope > 0.2:
@@ -198,29 +245,40 @@ class AppreciationGenerator(BaseAIModule):
     
     def _analyze_recent_performance(self, grades):
         """Analyser les performances récentes"""
-        scores = [float(grade.normalized_score) for grade in grades if grade.normalized_score]
+        scores = np.array(
+            [float(grade.normalized_score) for grade in grades if grade.normalized_score is not None],
+            dtype=float
+        )
         
-        if not scores:
+        if not len(scores):
             return {'consistency': 'indéterminée', 'recent_average': None}
         
-        recent_avg = sum(scores) / len(scores)
-        variance = sum((score - recent_avg)**2 for score in scores) / len(scores)
-        
-        consistency = 'régulière' if variance < 4 else 'irrégulière'
-        
+        return self._classify_performance(
+            scores.mean(), scores.var(), scores.max(), scores.min()
+        )
+    
+    def _classify_performance(self, recent_avg, variance, best, worst):
+        """Qualifier la régularité des résultats"""
         return {
-            'consistency': consistency,
-            'recent_average': recent_avg,
-            'variance': variance,
-            'best_grade': max(scores),
-            'worst_grade': min(scores)
+            'consistency': 'régulière' if variance < 4 else 'irrégulière',
+            'recent_average': float(recent_avg),
+            'variance': float(variance),
+            'best_grade': float(best),
+            'worst_grade': float(worst)
         }
     
     def _analyze_behavior(self, behaviors):
         """Analyser le comportement de l'élève"""
-        positive_count = behaviors.filter(behavior_type='positive').count()
-        negative_count = behaviors.filter(behavior_type='negative').count()
+        from django.db.models import Count, Q
         
+        counts = behaviors.aggregate(
+            positive=Count('id', filter=Q(behavior_type='positive')),
+            negative=Count('id', filter=Q(behavior_type='negative'))
+        )
+        return self._classify_behavior(counts['positive'], counts['negative'])
+    
+    def _classify_behavior(self, positive_count, negative_count):
+        """Qualifier le comportement selon les observations"""
         if positive_count > negative_count * 2:
             behavior = 'exemplaire'
             participation = 'très active'
@@ -259,6 +317,13 @@ class AppreciationGenerator(BaseAIModule):
             status__in=['submitted', 'returned']
         ).count()
         
+        return self._classify_homework(homework_assigned, homework_done)
+    
+    def _classify_homework(self, homework_assigned, homework_done):
+        """Qualifier le travail personnel selon le taux de rendu"""
+        if not homework_assigned:
+            return {'homework': 'non applicable', 'homework_rate': None}
+        
         completion_rate = homework_done / homework_assigned * 100
         
         if completion_rate >= 90:
@@ -279,16 +344,23 @@ class AppreciationGenerator(BaseAIModule):
         """Analyser l'assiduité"""
         from apps.attendance.models import Attendance
         
-        attendances = Attendance.objects.filter(
+        from django.db.models import Count, Q
+        
+        counts = Attendance.objects.filter(
             student=student,
             date__range=[period.start_date, period.end_date]
+        ).aggregate(
+            total=Count('id'),
+            absences=Count('id', filter=Q(status='absent'))
         )
         
-        total = attendances.count()
-        if total == 0:
+        return self._classify_attendance(counts['total'], counts['absences'])
+    
+    def _classify_attendance(self, total, absences):
+        """Qualifier l'assiduité selon le taux d'absence"""
+        if not total:
             return {'attendance': 'indéterminée', 'absence_rate': None}
         
-        absences = attendances.filter(status='absent').count()
         absence_rate = absences / total * 100
         
         if absence_rate <= 2:
@@ -422,13 +494,19 @@ L'appréciation doit être prête à être copiée directement dans un bulletin.
     def _call_api_with_retry(self, messages, options):
         """Appeler l'API avec retry et fallback"""
         max_retries = options.get('max_retries', 2)
+        # Une régénération demande explicitement un nouveau texte
+        use_cache = options.get('use_cache', not options.get('regenerate', False))
         
         for attempt in range(max_retries + 1):
             try:
                 temperature = options.get('temperature', 0.7)
                 max_tokens = options.get('max_tokens', 200)
                 
-                result = self._call_api(messages, temperature=temperature, max_tokens=max_tokens)
+                # Les nouvelles tentatives ne doivent pas relire une réponse rejetée
+                result = self._call_api(
+                    messages, temperature=temperature, max_tokens=max_tokens,
+                    use_cache=use_cache and attempt == 0
+                )
                 
                 if result and len(result.strip()) > 20:
                     return result
@@ -1,21 +1,61 @@
 """
 Classes de base pour les modules IA
 """
+import httpx
 import openai
 from django.conf import settings
 from abc import ABC, abstractmethod
 import logging
+import threading
+
+from . import cache as response_cache
+from .executor import call_with_backoff, get_max_concurrency
 
 logger = logging.getLogger(__name__)
 
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, base_url=None):
+    """
+    Client OpenAI partagé par processus (sûr entre threads)
+
+    ``base_url`` permet de viser un serveur compatible (proxy, serveur
+    local de test). Les nouvelles tentatives sont gérées par
+    ``call_with_backoff`` et non par le client ; le pool de connexions
+    HTTP est dimensionné pour les appels concurrents.
+    """
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                timeout = getattr(settings, 'AI_REQUEST_TIMEOUT', 30)
+                client = openai.OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    max_retries=0,
+                    timeout=timeout,
+                    http_client=httpx.Client(
+                        timeout=timeout,
+                        limits=httpx.Limits(max_connections=max(get_max_concurrency(), 10))
+                    )
+                )
+                _clients[key] = client
+    return client
+
 
 class BaseAIModule(ABC):
     """Classe de base pour tous les modules IA"""
     
+    # Réponses mises en cache par défaut (voir ``cache.py``)
+    cache_responses = True
+    
     def __init__(self):
         self.api_key = getattr(settings, 'OPENAI_API_KEY', None)
-        if self.api_key:
-            openai.api_key = self.api_key
+        self.api_base_url = getattr(settings, 'AI_API_BASE_URL', None)
         self.model = getattr(settings, 'AI_MODEL', 'gpt-3.5-turbo')
         
     @abstractmethod
@@ -23,26 +63,79 @@ class BaseAIModule(ABC):
         """Méthode principale de génération"""
         pass
     
-    def _call_api(self, messages, temperature=0.7, max_tokens=1000):
-        """Appeler l'API OpenAI"""
+    def _call_api(self, messages, temperature=0.7, max_tokens=1000, use_cache=None):
+        """
+        Appeler l'API OpenAI
+        
+        Une requête identique déjà traitée est servie depuis le cache ;
+        ``use_cache=False`` force un nouvel appel (régénération).
+        """
         try:
             if not self.api_key:
                 # Mode démo sans API
                 return self._demo_response()
             
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
+            if use_cache is None:
+                use_cache = self.cache_responses
+            use_cache = use_cache and response_cache.is_enabled()
+            
+            if use_cache:
+                key = response_cache.response_key(self.model, messages, temperature, max_tokens)
+                cached = response_cache.get_response(key)
+                if cached is not None:
+                    return cached
+            
+            response = call_with_backoff(
+                lambda: self._create_completion(messages, temperature, max_tokens)
             )
             
-            return response.choices[0].message.content
+            if use_cache:
+                response_cache.set_response(key, response)
+            return response
             
         except Exception as e:
             logger.error(f"Erreur API IA: {str(e)}")
             return self._fallback_response()
     
+    def _stream_api(self, messages, temperature=0.7, max_tokens=1000):
+        """
+        Fragments de texte de la réponse, au fur et à mesure de leur arrivée
+        
+        Seule l'ouverture du flux est retentée (limite de débit, erreurs
+        transitoires) ; une erreur en cours de flux est propagée à
+        l'appelant, qui a déjà pu transmettre une partie de la réponse.
+        """
+        if not self.api_key:
+            # Mode démo sans API
+            yield self._demo_response()
+            return
+        
+        stream = call_with_backoff(lambda: self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        ))
+        
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    @property
+    def client(self):
+        return get_client(self.api_key, self.api_base_url)
+    
+    def _create_completion(self, messages, temperature, max_tokens):
+        """Un appel à l'API, sans gestion d'erreur"""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content
+    
     @abstractmethod
     def _demo_response(self):
         """Réponse de démonstration si pas d'API"""
@@ -0,0 +1,97 @@
+"""
+Cache des réponses de l'API IA, adressé par contenu
+
+La clé est l'empreinte SHA-256 de la requête complète (modèle, messages,
+température, nombre maximal de jetons) : une requête identique renvoie la
+réponse déjà payée. Le stockage utilise l'alias de cache
+``AI_RESPONSE_CACHE_ALIAS`` (sur disque par défaut, Redis possible, voir
+``settings.CACHES``) qui gère la durée de vie et l'éviction par taille.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'ai_response'
+STATS_KEYS = {
+    'hits': f'{CACHE_KEY_PREFIX}:stats:hits',
+    'misses': f'{CACHE_KEY_PREFIX}:stats:misses',
+}
+
+
+def is_enabled():
+    return getattr(settings, 'AI_RESPONSE_CACHE_ENABLED', True)
+
+
+def get_backend():
+    """Cache dédié s'il est configuré, sinon le cache par défaut"""
+    alias = getattr(settings, 'AI_RESPONSE_CACHE_ALIAS', 'ai_responses')
+    if alias not in settings.CACHES:
+        alias = 'default'
+    return caches[alias]
+
+
+def response_key(model, messages, temperature, max_tokens):
+    """Empreinte stable d'une requête à l'API"""
+    content = json.dumps(
+        {
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    return f'{CACHE_KEY_PREFIX}:{digest}'
+
+
+def _count(stat):
+    backend = get_backend()
+    key = STATS_KEYS[stat]
+    try:
+        backend.add(key, 0, timeout=None)
+        backend.incr(key)
+    except Exception as e:
+        logger.debug(f"Compteur du cache IA indisponible: {e}")
+
+
+def get_response(key):
+    """Réponse en cache, ou ``None`` ; met à jour les compteurs"""
+    try:
+        response = get_backend().get(key)
+    except Exception as e:
+        logger.warning(f"Lecture du cache IA impossible: {e}")
+        return None
+
+    _count('hits' if response is not None else 'misses')
+    return response
+
+
+def set_response(key, response, timeout=None):
+    """Mettre en cache une réponse de l'API (durée de vie de l'alias par défaut)"""
+    if not response:
+        return
+    kwargs = {'timeout': timeout} if timeout is not None else {}
+    try:
+        get_backend().set(key, response, **kwargs)
+    except Exception as e:
+        logger.warning(f"Écriture du cache IA impossible: {e}")
+
+
+def get_stats():
+    """Nombre de réponses servies depuis le cache et d'appels effectifs"""
+    values = get_backend().get_many(STATS_KEYS.values())
+    stats = {stat: values.get(key, 0) for stat, key in STATS_KEYS.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / total, 3) if total else None
+    return stats
+
+
+def reset_stats():
+    get_backend().delete_many(STATS_KEYS.values())
@@ -0,0 +1,164 @@
+"""
+Exécution concurrente des appels au modèle de langage
+
+Les appels à l'API sont dominés par la latence réseau : une classe entière
+peut être traitée en parallèle par un pool de threads borné. Chaque tenant
+dispose de sa propre limite de débit (seau à jetons) et les erreurs
+transitoires (limite de débit, délai dépassé, erreur serveur) sont
+retentées avec un délai exponentiel.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def get_max_concurrency():
+    """Nombre maximal d'appels simultanés à l'API"""
+    return getattr(settings, 'AI_MAX_CONCURRENCY', 8)
+
+
+def current_tenant():
+    """Schéma du tenant actif sur la connexion du thread courant"""
+    return (
+        getattr(connection, '_schema_name', None)
+        or getattr(connection, 'schema_name', None)
+        or 'public'
+    )
+
+
+class TenantRateLimiter:
+    """
+    Limiteur de débit par tenant (seau à jetons)
+
+    ``rate_per_minute`` jetons sont rechargés par minute, avec une réserve
+    maximale de ``burst`` jetons. ``acquire`` bloque jusqu'à disposer d'un
+    jeton ; un débit nul ou négatif désactive la limitation.
+    """
+
+    def __init__(self, rate_per_minute, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, rate_per_minute // 6))
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, key):
+        """Prendre un jeton ; renvoie le temps d'attente nécessaire"""
+        with self._lock:
+            now = self._clock()
+            tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+    def acquire(self, key='public'):
+        if self.rate <= 0:
+            return 0.0
+        wait = self._reserve(key)
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Limiteur partagé par tous les modules IA du processus"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = TenantRateLimiter(
+                    getattr(settings, 'AI_RATE_LIMIT_PER_MINUTE', 120),
+                    burst=getattr(settings, 'AI_RATE_LIMIT_BURST', None)
+                )
+    return _rate_limiter
+
+
+def is_retryable(error):
+    """Erreurs transitoires de l'API méritant une nouvelle tentative"""
+    import openai
+
+    return isinstance(error, (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    ))
+
+
+def backoff_delay(attempt, base_delay=None, max_delay=None):
+    """Délai exponentiel avec gigue avant la tentative ``attempt + 1``"""
+    base_delay = base_delay if base_delay is not None else getattr(settings, 'AI_BACKOFF_BASE_DELAY', 1.0)
+    max_delay = max_delay if max_delay is not None else getattr(settings, 'AI_BACKOFF_MAX_DELAY', 30.0)
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def call_with_backoff(func, tenant=None, max_retries=None, retryable=is_retryable,
+                      limiter=None, sleep=time.sleep):
+    """
+    Appeler ``func`` en respectant la limite de débit du tenant
+
+    Les erreurs reconnues par ``retryable`` sont retentées jusqu'à
+    ``max_retries`` fois ; les autres sont propagées immédiatement.
+    """
+    if max_retries is None:
+        max_retries = getattr(settings, 'AI_MAX_RETRIES', 3)
+    limiter = limiter or get_rate_limiter()
+    tenant = tenant or current_tenant()
+
+    attempt = 0
+    while True:
+        limiter.acquire(tenant)
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(
+                f"Appel IA en échec ({e.__class__.__name__}), "
+                f"nouvelle tentative dans {delay:.1f}s"
+            )
+            sleep(delay)
+            attempt += 1
+
+
+def map_concurrently(func, items, max_workers=None):
+    """
+    Appliquer ``func`` à chaque élément dans un pool de threads borné
+
+    Les résultats sont renvoyés dans l'ordre des éléments. Chaque thread
+    travaille sur le schéma du tenant appelant et ferme sa connexion à la
+    base à la fin de chaque tâche. ``func`` doit gérer ses propres
+    erreurs : une exception est propagée à l'appelant.
+    """
+    items = list(items)
+    max_workers = min(max_workers or get_max_concurrency(), len(items))
+    if max_workers <= 1:
+        return [func(item) for item in items]
+
+    tenant = current_tenant()
+
+    def run(item):
+        try:
+            if tenant != 'public' and hasattr(connection, 'set_schema'):
+                connection.set_schema(tenant)
+            return func(item)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-call') as executor:
+        return list(executor.map(run, items))
@@ -9,6 +9,10 @@ import random
 class HomeworkSuggester(BaseAIModule):
     """Générateur de suggestions de devoirs"""
     
+    def generate(self, **kwargs):
+        """Méthode principale de génération"""
+        return self.generate_suggestions(**kwargs)
+    
     def generate_suggestions(self, chapter, subject_id, class_level, 
                            lesson_objectives=None, key_concepts=None, 
                            difficulty='medium', count=3):
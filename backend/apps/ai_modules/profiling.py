@@ -0,0 +1,233 @@
+"""
+Profilage par lot des élèves d'une classe pour une matière
+
+Charge toutes les données nécessaires aux appréciations (moyennes des
+périodes, notes, comportement, devoirs, assiduité) en quelques requêtes
+groupées, puis calcule tendances et variances avec NumPy pour l'ensemble
+des élèves à la fois.
+"""
+import numpy as np
+from django.db.models import Count, Q
+
+
+def grouped_linear_slopes(groups, x, y, n_groups):
+    """
+    Pente de la régression linéaire de ``y`` sur ``x`` pour chaque groupe
+
+    Renvoie ``(effectifs, pentes)`` ; la pente vaut 0 pour les groupes de
+    moins de deux points.
+    """
+    n = np.bincount(groups, minlength=n_groups).astype(float)
+    sum_x = np.bincount(groups, weights=x, minlength=n_groups)
+    sum_y = np.bincount(groups, weights=y, minlength=n_groups)
+    sum_xy = np.bincount(groups, weights=x * y, minlength=n_groups)
+    sum_xx = np.bincount(groups, weights=x * x, minlength=n_groups)
+
+    denominator = n * sum_xx - sum_x ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.where(denominator > 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+    return n, slopes
+
+
+def grouped_statistics(groups, values, n_groups):
+    """
+    Moyenne, variance (population), maximum et minimum par groupe
+
+    Les groupes vides ont une moyenne et une variance NaN.
+    """
+    n = np.bincount(groups, minlength=n_groups).astype(float)
+    sums = np.bincount(groups, weights=values, minlength=n_groups)
+    squares = np.bincount(groups, weights=values * values, minlength=n_groups)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / n
+        variances = np.maximum(squares / n - means ** 2, 0.0)
+
+    maxima = np.full(n_groups, -np.inf)
+    minima = np.full(n_groups, np.inf)
+    np.maximum.at(maxima, groups, values)
+    np.minimum.at(minima, groups, values)
+
+    return n, means, variances, maxima, minima
+
+
+class ClassProfiler:
+    """
+    Profils d'appréciation pour un groupe d'élèves, une matière et une période
+
+    Les règles de qualification (seuils de tendance, d'assiduité, etc.)
+    sont celles de ``AppreciationGenerator`` : seul le chargement des
+    données et les calculs numériques sont faits par lot.
+    """
+
+    def __init__(self, generator, students, subject, period, averages=None):
+        self.generator = generator
+        self.students = list(students)
+        self.subject = subject
+        self.period = period
+        self.averages = averages or {}
+        self.index = {student.id: i for i, student in enumerate(self.students)}
+
+    def build_profiles(self):
+        """Renvoie un dictionnaire {identifiant d'élève: profil}"""
+        if not self.students:
+            return {}
+
+        profiles = [
+            self.generator._base_profile(student, self.subject, self.averages.get(student.id))
+            for student in self.students
+        ]
+
+        if self.subject:
+            self._apply_trends(profiles)
+            self._apply_recent_performance(profiles)
+        self._apply_behaviors(profiles)
+        self._apply_homework(profiles)
+        self._apply_attendance(profiles)
+
+        for profile in profiles:
+            profile['strengths'], profile['areas_for_improvement'] = (
+                self.generator._identify_strengths_and_improvements(profile)
+            )
+
+        return {student.id: profiles[i] for i, student in enumerate(self.students)}
+
+    @property
+    def _student_ids(self):
+        return list(self.index)
+
+    @property
+    def _date_range(self):
+        return [self.period.start_date, self.period.end_date]
+
+    def _apply_trends(self, profiles):
+        """Tendance sur les moyennes des périodes de l'année"""
+        from apps.grades.models import SubjectAverage
+
+        rows = SubjectAverage.objects.filter(
+            student_id__in=self._student_ids,
+            subject=self.subject,
+            grading_period__academic_year_id=self.period.academic_year_id,
+            average__isnull=False
+        ).exclude(average=0).order_by(
+            'student_id', 'grading_period__number'
+        ).values_list('student_id', 'average')
+
+        groups, positions, values = [], [], []
+        counters = {}
+        for student_id, average in rows:
+            position = counters.get(student_id, 0)
+            counters[student_id] = position + 1
+            groups.append(self.index[student_id])
+            positions.append(position)
+            values.append(float(average))
+
+        if not groups:
+            return
+
+        counts, slopes = grouped_linear_slopes(
+            np.array(groups), np.array(positions, dtype=float),
+            np.array(values), len(self.students)
+        )
+        for i in np.flatnonzero(counts >= 2):
+            trend = self.generator._classify_trend(slopes[i])
+            profiles[i]['progression'] = trend['label']
+            profiles[i]['recent_trend'] = trend['direction']
+
+    def _apply_recent_performance(self, profiles):
+        """Régularité des notes de la période (ramenées sur 20)"""
+        from apps.grades.models import Grade
+
+        rows = Grade.objects.filter(
+            student_id__in=self._student_ids,
+            evaluation__subject=self.subject,
+            evaluation__date__range=self._date_range
+        ).order_by().values_list('student_id', 'score', 'evaluation__max_score')
+
+        has_grades = np.zeros(len(self.students), dtype=bool)
+        groups, scores = [], []
+        for student_id, score, max_score in rows:
+            has_grades[self.index[student_id]] = True
+            if score is not None and max_score:
+                groups.append(self.index[student_id])
+                scores.append(float(score) * 20 / float(max_score))
+
+        if groups:
+            counts, means, variances, maxima, minima = grouped_statistics(
+                np.array(groups), np.array(scores), len(self.students)
+            )
+        else:
+            counts = np.zeros(len(self.students))
+
+        for i in np.flatnonzero(has_grades):
+            if counts[i]:
+                profiles[i]['recent_performance'] = self.generator._classify_performance(
+                    means[i], variances[i], maxima[i], minima[i]
+                )
+            else:
+                profiles[i]['recent_performance'] = {
+                    'consistency': 'indéterminée', 'recent_average': None
+                }
+
+    def _apply_behaviors(self, profiles):
+        from apps.attendance.models import StudentBehavior
+
+        counts = {
+            row['student_id']: row
+            for row in StudentBehavior.objects.filter(
+                student_id__in=self._student_ids,
+                date__range=self._date_range
+            ).values('student_id').annotate(
+                positive=Count('id', filter=Q(behavior_type='positive')),
+                negative=Count('id', filter=Q(behavior_type='negative'))
+            )
+        }
+        for student in self.students:
+            row = counts.get(student.id, {})
+            profiles[self.index[student.id]].update(self.generator._classify_behavior(
+                row.get('positive', 0), row.get('negative', 0)
+            ))
+
+    def _apply_homework(self, profiles):
+        from apps.homework.models import Homework, StudentWork
+
+        assigned = dict(
+            Homework.objects.filter(
+                class_group__students__student_id__in=self._student_ids,
+                due_date__range=self._date_range
+            ).values('class_group__students__student_id').annotate(
+                count=Count('id')
+            ).values_list('class_group__students__student_id', 'count')
+        )
+        done = dict(
+            StudentWork.objects.filter(
+                student_id__in=self._student_ids,
+                homework__due_date__range=self._date_range,
+                status__in=['submitted', 'returned']
+            ).values('student_id').annotate(
+                count=Count('id')
+            ).values_list('student_id', 'count')
+        )
+        for student in self.students:
+            profiles[self.index[student.id]].update(self.generator._classify_homework(
+                assigned.get(student.id, 0), done.get(student.id, 0)
+            ))
+
+    def _apply_attendance(self, profiles):
+        from apps.attendance.models import Attendance
+
+        counts = {
+            row['student_id']: row
+            for row in Attendance.objects.filter(
+                student_id__in=self._student_ids,
+                date__range=self._date_range
+            ).values('student_id').annotate(
+                total=Count('id'),
+                absences=Count('id', filter=Q(status='absent'))
+            )
+        }
+        for student in self.students:
+            row = counts.get(student.id, {})
+            profiles[self.index[student.id]].update(self.generator._classify_attendance(
+                row.get('total', 0), row.get('absences', 0)
+            ))
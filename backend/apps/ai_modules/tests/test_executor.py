@@ -0,0 +1,168 @@
+"""
+Tests de l'exécution concurrente des appels IA, contre un serveur local
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from apps.ai_modules.base import BaseAIModule
+from apps.ai_modules.executor import TenantRateLimiter, call_with_backoff, map_concurrently
+
+
+STUB_LATENCY = 0.2
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Répond à /chat/completions en renvoyant le dernier message"""
+
+    failures = {}
+    prompts = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][-1]['content']
+        self.prompts.append(prompt)
+        time.sleep(STUB_LATENCY)
+
+        if self.failures.get(prompt, 0) > 0:
+            self.failures[prompt] -= 1
+            self._send(429, {'error': {'message': 'rate limited', 'type': 'rate_limit'}})
+            return
+
+        if body.get('stream'):
+            self._send_stream(body['model'], f"écho : {prompt}")
+            return
+
+        self._send(200, {
+            'id': 'stub',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': body['model'],
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': f"écho : {prompt}"},
+            }],
+        })
+
+    def _send_stream(self, model, text):
+        """Réponse en flux : un fragment par mot, au format server-sent events"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for word in text.split(' '):
+            chunk = {
+                'id': 'stub',
+                'object': 'chat.completion.chunk',
+                'created': 0,
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _send(self, status, payload):
+        content = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class EchoModule(BaseAIModule):
+    def generate(self, prompt):
+        return self._call_api([{'role': 'user', 'content': prompt}])
+
+    def _demo_response(self):
+        return 'démo'
+
+    def _fallback_response(self):
+        return 'secours'
+
+
+@pytest.fixture
+def stub_llm(settings):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubLLMHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    settings.OPENAI_API_KEY = 'test'
+    settings.AI_API_BASE_URL = f'http://127.0.0.1:{server.server_port}/v1'
+    settings.AI_RATE_LIMIT_PER_MINUTE = 0
+    settings.AI_BACKOFF_BASE_DELAY = 0.01
+    # Cache propre à chaque test : aucune réponse ne provient d'un test précédent
+    settings.CACHES = {
+        **settings.CACHES,
+        'ai_responses': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'test-executor-{server.server_port}',
+        },
+    }
+
+    yield StubLLMHandler
+    server.shutdown()
+    StubLLMHandler.failures.clear()
+    StubLLMHandler.prompts.clear()
+
+
+def test_concurrent_calls_keep_order(stub_llm):
+    """Huit appels en parallèle prennent le temps de quelques appels"""
+    module = EchoModule()
+    prompts = [f'élève {i}' for i in range(8)]
+
+    start = time.monotonic()
+    results = map_concurrently(module.generate, prompts, max_workers=8)
+    elapsed = time.monotonic() - start
+
+    assert results == [f'écho : {prompt}' for prompt in prompts]
+    assert sorted(stub_llm.prompts) == sorted(prompts)
+    assert elapsed < STUB_LATENCY * 4
+
+
+def test_rate_limited_call_is_retried(stub_llm):
+    """Une réponse 429 est retentée avec un délai exponentiel"""
+    stub_llm.failures['élève 0'] = 2
+
+    assert EchoModule().generate('élève 0') == 'écho : élève 0'
+    assert stub_llm.prompts == ['élève 0'] * 3
+
+
+def test_streamed_response_arrives_in_fragments(stub_llm):
+    """Les fragments sont transmis au fil de l'eau"""
+    fragments = list(EchoModule()._stream_api([{'role': 'user', 'content': 'élève 3'}]))
+
+    assert fragments == ['écho ', ': ', 'élève ', '3 ']
+    assert ''.join(fragments).strip() == 'écho : élève 3'
+
+
+def test_backoff_gives_up_on_permanent_errors():
+    """Les erreurs non transitoires ne sont pas retentées"""
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ValueError('invalide')
+
+    with pytest.raises(ValueError):
+        call_with_backoff(failing, limiter=TenantRateLimiter(0), sleep=lambda delay: None)
+    assert len(calls) == 1
+
+
+def test_rate_limiter_is_per_tenant():
+    """Chaque tenant dispose de sa propre réserve de jetons"""
+    now = [0.0]
+    waits = []
+    limiter = TenantRateLimiter(60, burst=2, clock=lambda: now[0], sleep=waits.append)
+
+    assert limiter.acquire('lycee_a') == 0
+    assert limiter.acquire('lycee_a') == 0
+    assert limiter.acquire('lycee_b') == 0
+    assert limiter.acquire('lycee_a') == pytest.approx(1.0)
+    assert waits == [pytest.approx(1.0)]
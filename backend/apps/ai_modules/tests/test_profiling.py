@@ -0,0 +1,48 @@
+"""
+Tests pour les calculs par lot du profilage des appréciations
+"""
+import numpy as np
+import pytest
+from apps.ai_modules.profiling import grouped_linear_slopes, grouped_statistics
+
+
+class TestGroupedLinearSlopes:
+    """Tests des pentes de régression par groupe"""
+    
+    def test_matches_polyfit(self):
+        """Chaque pente correspond à une régression individuelle"""
+        groups = np.array([0, 0, 0, 1, 1])
+        x = np.array([0, 1, 2, 0, 1], dtype=float)
+        y = np.array([10, 11, 13, 15, 12], dtype=float)
+        
+        counts, slopes = grouped_linear_slopes(groups, x, y, 2)
+        
+        assert list(counts) == [3, 2]
+        assert slopes[0] == pytest.approx(np.polyfit([0, 1, 2], [10, 11, 13], 1)[0])
+        assert slopes[1] == pytest.approx(-3.0)
+    
+    def test_single_point_and_empty_groups(self):
+        """Pas de pente sans au moins deux points"""
+        counts, slopes = grouped_linear_slopes(
+            np.array([0]), np.array([0.0]), np.array([12.0]), 3
+        )
+        
+        assert list(counts) == [1, 0, 0]
+        assert list(slopes) == [0.0, 0.0, 0.0]
+
+
+class TestGroupedStatistics:
+    """Tests des statistiques par groupe"""
+    
+    def test_mean_variance_extremes(self):
+        """Moyenne, variance de population, min et max par élève"""
+        groups = np.array([0, 0, 1])
+        values = np.array([10.0, 14.0, 9.0])
+        
+        counts, means, variances, maxima, minima = grouped_statistics(groups, values, 2)
+        
+        assert list(counts) == [2, 1]
+        assert means[0] == pytest.approx(12.0)
+        assert variances[0] == pytest.approx(np.var([10.0, 14.0]))
+        assert variances[1] == pytest.approx(0.0)
+        assert (maxima[0], minima[0]) == (14.0, 10.0)
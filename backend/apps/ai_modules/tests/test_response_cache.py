@@ -0,0 +1,71 @@
+"""
+Tests du cache des réponses de l'API IA
+"""
+import pytest
+from apps.ai_modules import cache as response_cache
+from apps.ai_modules.base import BaseAIModule
+
+
+class CountingModule(BaseAIModule):
+    """Module dont chaque appel « réseau » est compté"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def generate(self, prompt, **kwargs):
+        return self._call_api([{'role': 'user', 'content': prompt}], **kwargs)
+
+    def _create_completion(self, messages, temperature, max_tokens):
+        self.calls += 1
+        return f"réponse {self.calls}"
+
+    def _demo_response(self):
+        return 'démo'
+
+    def _fallback_response(self):
+        return 'secours'
+
+
+@pytest.fixture
+def module(settings):
+    settings.OPENAI_API_KEY = 'test'
+    settings.AI_RATE_LIMIT_PER_MINUTE = 0
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        'ai_responses': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'test-ai-responses',
+        },
+    }
+    response_cache.get_backend().clear()
+    return CountingModule()
+
+
+def test_identical_requests_hit_cache(module):
+    """Une requête identique n'est payée qu'une fois"""
+    assert module.generate('chapitre 3') == 'réponse 1'
+    assert module.generate('chapitre 3') == 'réponse 1'
+    assert module.generate('chapitre 3', temperature=0.2) == 'réponse 2'
+    assert module.calls == 2
+
+    stats = response_cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+
+def test_opt_out_bypasses_cache(module):
+    """``use_cache=False`` force un nouvel appel"""
+    module.generate('chapitre 3')
+
+    assert module.generate('chapitre 3', use_cache=False) == 'réponse 2'
+    assert module.calls == 2
+
+
+def test_key_depends_on_model_and_messages():
+    messages = [{'role': 'user', 'content': 'bonjour'}]
+    key = response_cache.response_key('gpt-3.5-turbo', messages, 0.7, 100)
+
+    assert key == response_cache.response_key('gpt-3.5-turbo', list(messages), 0.7, 100)
+    assert key != response_cache.response_key('gpt-4', messages, 0.7, 100)
+    assert key != response_cache.response_key('gpt-3.5-turbo', messages, 0.7, 200)
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:29
+
+import apps.tenants.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='absenceperiod',
+            name='justification_document',
+            field=models.FileField(blank=True, null=True, storage=apps.tenants.storage.get_content_storage, upload_to='absence_periods/%Y/%m/', verbose_name='Justificatif'),
+        ),
+        migrations.AlterField(
+            model_name='attendance',
+            name='justification_document',
+            field=models.FileField(blank=True, null=True, storage=apps.tenants.storage.get_content_storage, upload_to='justifications/%Y/%m/', verbose_name='Document justificatif'),
+        ),
+    ]
@@ -7,6 +7,7 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from datetime import datetime, time
 from apps.core.models import BaseModel
+from apps.tenants.storage import get_content_storage
 from apps.authentication.models import User
 from apps.schools.models import Class, AcademicYear
 from apps.timetable.models import Schedule, TimeSlot
@@ -62,6 +63,7 @@ class Attendance(BaseModel):
     )
     justification_document = models.FileField(
         upload_to='justifications/%Y/%m/',
+        storage=get_content_storage,
         null=True,
         blank=True,
         verbose_name=_("Document justificatif")
@@ -153,6 +155,7 @@ class AbsencePeriod(BaseModel):
     )
     justification_document = models.FileField(
         upload_to='absence_periods/%Y/%m/',
+        storage=get_content_storage,
         null=True,
         blank=True,
         verbose_name=_("Justificatif")
@@ -1,17 +1,17 @@
-import re
 import json
 import logging
-import openai
+import threading
+import time
 import requests
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-from .models import ChatbotIntent, ChatbotKnowledgeBase, ChatbotMessage
+from .models import ChatbotMessage
+from .intent_matcher import get_intent_matcher
+from .knowledge_index import get_index, rebuild_index
 from ..ai_modules.base import BaseAIModule
+from ..ai_modules.executor import call_with_backoff, current_tenant
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -24,27 +24,30 @@ class ChatbotAIEngine(BaseAIModule):
     
     def __init__(self):
         super().__init__()
-        self.model_name = "gpt-3.5-turbo"
+        self.model_name = self.model
         self.max_tokens = 150
         self.temperature = 0.7
-        self.vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
-        self.knowledge_vectors = None
-        self.knowledge_items = []
-        self._load_knowledge_base()
+        self.tenant = current_tenant()
     
-    def _load_knowledge_base(self):
-        """Charge et vectorise la base de connaissances"""
-        try:
-            knowledge_items = ChatbotKnowledgeBase.objects.filter(status='active')
-            if knowledge_items.exists():
-                self.knowledge_items = list(knowledge_items)
-                texts = [item.content for item in self.knowledge_items]
-                self.knowledge_vectors = self.vectorizer.fit_transform(texts)
-                logger.info(f"Base de connaissances chargée: {len(self.knowledge_items)} éléments")
-            else:
-                logger.warning("Aucun élément actif dans la base de connaissances")
-        except Exception as e:
-            logger.error(f"Erreur lors du chargement de la base de connaissances: {e}")
+    @property
+    def knowledge_index(self):
+        """Index TF-IDF du tenant, rechargé s'il a été reconstruit"""
+        return get_index(self.tenant)
+    
+    @property
+    def openai_available(self) -> bool:
+        return bool(self.api_key)
+    
+    def generate(self, message: str, user: User, conversation_id: str) -> Dict:
+        """Méthode principale de génération"""
+        return self.process_message(message, user, conversation_id)
+    
+    def _demo_response(self) -> str:
+        return ''
+    
+    def _fallback_response(self) -> str:
+        # Les appelants basculent sur leurs réponses prédéfinies
+        return ''
     
     def process_message(self, message: str, user: User, conversation_id: str) -> Dict:
         """
@@ -84,26 +87,17 @@ class ChatbotAIEngine(BaseAIModule):
             # Normaliser le message
             normalized_message = message.lower().strip()
             
-            # Rechercher des correspondances avec les intentions prédéfinies
-            intents = ChatbotIntent.objects.filter(is_active=True).order_by('-priority')
-            
-            best_match = None
-            best_score = 0.0
-            
-            for intent in intents:
-                score = self._calculate_intent_score(normalized_message, intent)
-                if score > best_score:
-                    best_score = score
-                    best_match = intent
+            # Toutes les intentions prédéfinies sont évaluées en un seul parcours
+            best_match, best_score = get_intent_matcher(self.tenant).match(normalized_message)
             
-            if best_match and best_score > 0.6:
+            if best_match:
                 return {
-                    'intent': best_match.name,
+                    'intent': best_match['name'],
                     'confidence_score': best_score,
-                    'action_type': best_match.action_type,
-                    'action_parameters': best_match.action_parameters,
-                    'requires_auth': best_match.requires_authentication,
-                    'requires_admin': best_match.requires_admin
+                    'action_type': best_match['action_type'],
+                    'action_parameters': best_match['action_parameters'],
+                    'requires_auth': best_match['requires_auth'],
+                    'requires_admin': best_match['requires_admin']
                 }
             
             # Utiliser l'IA pour analyser l'intention si aucune correspondance
@@ -113,26 +107,6 @@ class ChatbotAIEngine(BaseAIModule):
             logger.error(f"Erreur lors de l'analyse d'intention: {e}")
             return {'intent': 'unknown', 'confidence_score': 0.0}
     
-    def _calculate_intent_score(self, message: str, intent: ChatbotIntent) -> float:
-        """Calcule le score de correspondance pour une intention"""
-        score = 0.0
-        pattern_count = len(intent.patterns)
-        
-        if pattern_count == 0:
-            return 0.0
-        
-        for pattern in intent.patterns:
-            # Recherche de mots-clés
-            if isinstance(pattern, str):
-                if pattern.lower() in message:
-                    score += 1.0
-            # Recherche par expression régulière
-            elif isinstance(pattern, dict) and pattern.get('type') == 'regex':
-                if re.search(pattern['pattern'], message, re.IGNORECASE):
-                    score += pattern.get('weight', 1.0)
-        
-        return score / pattern_count
-    
     def _analyze_intent_with_ai(self, message: str) -> Dict:
         """Utilise l'IA pour analyser l'intention"""
         try:
@@ -156,14 +130,14 @@ class ChatbotAIEngine(BaseAIModule):
             Répondez en JSON avec l'intention et un score de confiance (0-1).
             """
             
-            response = openai.ChatCompletion.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=100,
-                temperature=0.3
+            # Réponse en cache pour un message identique (voir ai_modules.cache)
+            response = self._call_api(
+                [{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=100
             )
             
-            result = json.loads(response.choices[0].message.content.strip())
+            result = json.loads(response.strip())
             return {
                 'intent': result.get('intent', 'general'),
                 'confidence_score': result.get('confidence', 0.5)
@@ -173,35 +147,25 @@ class ChatbotAIEngine(BaseAIModule):
             logger.error(f"Erreur lors de l'analyse IA: {e}")
             return {'intent': 'general', 'confidence_score': 0.3}
     
-    def _search_knowledge_base(self, message: str, limit: int = 3) -> List[Dict]:
-        """Recherche dans la base de connaissances"""
+    def _search_knowledge_base(self, message: str, limit: int = 3, **filters) -> List[Dict]:
+        """
+        Recherche dans la base de connaissances
+        
+        ``filters`` : ``knowledge_type``, ``category`` et ``scorer`` (voir
+        ``KnowledgeIndex.search``).
+        """
         try:
-            if not self.knowledge_vectors or not self.knowledge_items:
-                return []
-            
-            # Vectoriser la requête
-            query_vector = self.vectorizer.transform([message])
-            
-            # Calculer les similarités
-            similarities = cosine_similarity(query_vector, self.knowledge_vectors).flatten()
-            
-            # Trouver les meilleurs résultats
-            top_indices = np.argsort(similarities)[::-1][:limit]
-            
-            results = []
-            for idx in top_indices:
-                if similarities[idx] > 0.3:  # Seuil minimum de similarité
-                    knowledge_item = self.knowledge_items[idx]
-                    results.append({
-                        'title': knowledge_item.title,
-                        'content': knowledge_item.content,
-                        'knowledge_type': knowledge_item.knowledge_type,
-                        'category': knowledge_item.category,
-                        'similarity_score': float(similarities[idx]),
-                        'id': str(knowledge_item.id)
-                    })
-            
-            return results
+            return [
+                {
+                    'title': item['title'],
+                    'content': item['content'],
+                    'knowledge_type': item['knowledge_type'],
+                    'category': item['category'],
+                    'similarity_score': score,
+                    'id': item['id']
+                }
+                for item, score in self.knowledge_index.search(message, limit, **filters)
+            ]
             
         except Exception as e:
             logger.error(f"Erreur lors de la recherche dans la base de connaissances: {e}")
@@ -234,23 +198,20 @@ class ChatbotAIEngine(BaseAIModule):
             if not intent_name:
                 return None
             
-            # Chercher l'intention dans la base
-            try:
-                intent_obj = ChatbotIntent.objects.get(name=intent_name, is_active=True)
-                if intent_obj.responses:
-                    import random
-                    response_text = random.choice(intent_obj.responses)
-                    
-                    return {
-                        'message': response_text,
-                        'message_type': 'text',
-                        'intent': intent_name,
-                        'confidence_score': intent['confidence_score'],
-                        'quick_replies': self._get_quick_replies(intent_name),
-                        'needs_human': False
-                    }
-            except ChatbotIntent.DoesNotExist:
-                pass
+            # Chercher l'intention dans l'index du tenant
+            intent_obj = get_intent_matcher(self.tenant).get(intent_name)
+            if intent_obj and intent_obj['responses']:
+                import random
+                response_text = random.choice(intent_obj['responses'])
+                
+                return {
+                    'message': response_text,
+                    'message_type': 'text',
+                    'intent': intent_name,
+                    'confidence_score': intent['confidence_score'],
+                    'quick_replies': self._get_quick_replies(intent_name),
+                    'needs_human': False
+                }
             
             return None
             
@@ -258,56 +219,124 @@ class ChatbotAIEngine(BaseAIModule):
             logger.error(f"Erreur lors de la récupération de réponse prédéfinie: {e}")
             return None
     
+    def _build_ai_messages(self, message: str, user: User, 
+                           intent: Dict, knowledge: List[Dict]) -> List[Dict]:
+        """Messages envoyés au modèle pour une réponse contextuelle"""
+        # Construire le contexte
+        context = self._build_context(user, intent, knowledge)
+        
+        prompt = f"""
+        Tu es un assistant IA pour PeproScolaire, un système de gestion scolaire.
+        Tu aides les étudiants, parents et enseignants.
+        
+        Contexte utilisateur:
+        {context}
+        
+        Message de l'utilisateur: "{message}"
+        
+        Base de connaissances pertinente:
+        {self._format_knowledge_for_prompt(knowledge)}
+        
+        Intention détectée: {intent.get('intent', 'inconnue')}
+        
+        Réponds de manière helpful, précise et bienveillante.
+        Si tu ne peux pas répondre, propose de contacter un humain.
+        Limite ta réponse à 200 mots maximum.
+        """
+        
+        return [{"role": "user", "content": prompt}]
+    
+    def _build_ai_response(self, response_text: str, intent: Dict, 
+                           knowledge: List[Dict], tokens_used=None) -> Dict:
+        return {
+            'message': response_text,
+            'message_type': 'text',
+            'intent': intent.get('intent'),
+            'confidence_score': intent.get('confidence_score'),
+            'quick_replies': self._get_quick_replies(intent.get('intent')),
+            'suggestions': self._get_suggestions(knowledge),
+            'needs_human': self._needs_human_assistance(intent, response_text),
+            'tokens_used': tokens_used
+        }
+    
     def _generate_ai_response(self, message: str, user: User, 
                             intent: Dict, knowledge: List[Dict]) -> Dict:
         """Génère une réponse avec l'IA"""
         try:
-            # Construire le contexte
-            context = self._build_context(user, intent, knowledge)
-            
-            prompt = f"""
-            Tu es un assistant IA pour PeproScolaire, un système de gestion scolaire.
-            Tu aides les étudiants, parents et enseignants.
-            
-            Contexte utilisateur:
-            {context}
-            
-            Message de l'utilisateur: "{message}"
-            
-            Base de connaissances pertinente:
-            {self._format_knowledge_for_prompt(knowledge)}
-            
-            Intention détectée: {intent.get('intent', 'inconnue')}
-            
-            Réponds de manière helpful, précise et bienveillante.
-            Si tu ne peux pas répondre, propose de contacter un humain.
-            Limite ta réponse à 200 mots maximum.
-            """
+            messages = self._build_ai_messages(message, user, intent, knowledge)
             
-            response = openai.ChatCompletion.create(
+            # Réponse propre à l'utilisateur : pas de cache
+            response = call_with_backoff(lambda: self.client.chat.completions.create(
                 model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
+                messages=messages,
                 max_tokens=self.max_tokens,
                 temperature=self.temperature
-            )
-            
-            response_text = response.choices[0].message.content.strip()
+            ))
             
-            return {
-                'message': response_text,
-                'message_type': 'text',
-                'intent': intent.get('intent'),
-                'confidence_score': intent.get('confidence_score'),
-                'quick_replies': self._get_quick_replies(intent.get('intent')),
-                'suggestions': self._get_suggestions(knowledge),
-                'needs_human': self._needs_human_assistance(intent, response_text),
-                'tokens_used': response.usage.total_tokens
-            }
+            return self._build_ai_response(
+                response.choices[0].message.content.strip(),
+                intent,
+                knowledge,
+                tokens_used=response.usage.total_tokens if response.usage else None
+            )
             
         except Exception as e:
             logger.error(f"Erreur lors de la génération IA: {e}")
             return self._get_fallback_response(intent, knowledge)
     
+    def stream_message(self, message: str, user: User, conversation_id: str) -> Iterator[Tuple[str, object]]:
+        """
+        Variante de ``process_message`` qui produit la réponse au fil de l'eau
+        
+        Génère des couples ``('token', texte)`` dès que le modèle les
+        envoie, puis ``('done', réponse)`` où la réponse complète porte
+        ``time_to_first_token_ms`` et ``response_time_ms``. Les réponses
+        prédéfinies ou de secours sont envoyées en un seul fragment.
+        """
+        start_time = time.monotonic()
+        first_token_ms = None
+        
+        def elapsed_ms():
+            return int((time.monotonic() - start_time) * 1000)
+        
+        try:
+            intent = self._analyze_intent(message)
+            knowledge = self._search_knowledge_base(message)
+            response = self._get_predefined_response(intent, knowledge)
+            
+            if response is None and self.openai_available:
+                parts = []
+                try:
+                    for text in self._stream_api(
+                        self._build_ai_messages(message, user, intent, knowledge),
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens
+                    ):
+                        if first_token_ms is None:
+                            first_token_ms = elapsed_ms()
+                        parts.append(text)
+                        yield 'token', text
+                except Exception as e:
+                    logger.error(f"Erreur lors de la génération IA en flux: {e}")
+                
+                if parts:
+                    response = self._build_ai_response(''.join(parts).strip(), intent, knowledge)
+            
+            if response is None:
+                response = self._get_fallback_response(intent, knowledge)
+                
+        except Exception as e:
+            logger.error(f"Erreur lors du traitement du message: {e}")
+            response = self._get_error_response()
+        
+        if first_token_ms is None:
+            first_token_ms = elapsed_ms()
+            yield 'token', response['message']
+        
+        response['time_to_first_token_ms'] = first_token_ms
+        response['response_time_ms'] = elapsed_ms()
+        yield 'done', response
+    
     def _build_context(self, user: User, intent: Dict, knowledge: List[Dict]) -> str:
         """Construit le contexte pour l'IA"""
         context_parts = []
@@ -427,10 +456,9 @@ class ChatbotAIEngine(BaseAIModule):
         
         return False
     
-    def update_knowledge_base(self):
-        """Met à jour la base de connaissances vectorisée"""
-        self._load_knowledge_base()
-        logger.info("Base de connaissances mise à jour")
+    def update_knowledge_base(self, full=False):
+        """Met à jour l'index de la base de connaissances du tenant"""
+        rebuild_index(self.tenant, full=full)
     
     def get_conversation_summary(self, conversation_id: str) -> str:
         """Génère un résumé de conversation"""
@@ -458,17 +486,39 @@ class ChatbotAIEngine(BaseAIModule):
                 Résumé en 2-3 phrases maximum, en français.
                 """
                 
-                response = openai.ChatCompletion.create(
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=100,
-                    temperature=0.3
+                response = self._call_api(
+                    [{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=100
                 )
                 
-                return response.choices[0].message.content.strip()
+                if response.strip():
+                    return response.strip()
             
             return f"Conversation avec {len(recent_messages)} messages échangés."
             
         except Exception as e:
             logger.error(f"Erreur lors de la génération du résumé: {e}")
-            return "Erreur lors de la génération du résumé."
\ No newline at end of file
+            return "Erreur lors de la génération du résumé."
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_chatbot_engine() -> ChatbotAIEngine:
+    """
+    Moteur du tenant courant, unique par processus
+    
+    Le moteur ne garde aucun état propre à une conversation : il est
+    partagé entre les requêtes (et les threads) d'un même tenant.
+    """
+    tenant = current_tenant()
+    engine = _engines.get(tenant)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(tenant)
+            if engine is None:
+                engine = ChatbotAIEngine()
+                _engines[tenant] = engine
+    return engine
@@ -0,0 +1,175 @@
+"""
+Agrégats quotidiens du chatbot
+
+Toutes les métriques d'une plage de dates sont calculées en quatre
+requêtes groupées par jour (quelle que soit la longueur de la plage), puis
+enregistrées en une seule insertion avec mise à jour des jours existants.
+Le rattrapage d'une période passée utilise le même chemin, par tranches.
+
+Les percentiles des temps de réponse sont calculés par PostgreSQL
+(``percentile_cont``) ; ils restent vides sur les autres bases.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import Aggregate, Avg, Count, FloatField, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ChatbotAnalytics, ChatbotConversation, ChatbotMessage
+
+# Nombre de jours traités par tranche lors d'un rattrapage
+BACKFILL_CHUNK_DAYS = 31
+
+TOP_INTENTS_COUNT = 10
+
+ESCALATION_KEYWORDS = ['assistance', 'humain', 'conseiller', 'urgent']
+
+METRIC_FIELDS = [
+    'total_conversations', 'new_conversations', 'closed_conversations',
+    'total_messages', 'user_messages', 'bot_messages',
+    'avg_response_time_ms', 'p50_response_time_ms', 'p95_response_time_ms',
+    'successful_resolutions', 'escalations_to_human',
+    'avg_satisfaction_rating', 'total_ratings', 'top_intents',
+]
+
+
+class PercentileCont(Aggregate):
+    """``percentile_cont(fraction) WITHIN GROUP (ORDER BY ...)`` (PostgreSQL)"""
+    function = 'percentile_cont'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+def _datetime_range(start_date, end_date):
+    """Bornes [début, fin[ en heure locale, exploitables par les index"""
+    current = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start_date, time.min), current),
+        timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), current),
+    )
+
+
+def _empty_metrics():
+    metrics = {field: 0 for field in METRIC_FIELDS}
+    metrics.update({
+        'avg_response_time_ms': None,
+        'p50_response_time_ms': None,
+        'p95_response_time_ms': None,
+        'avg_satisfaction_rating': None,
+        'top_intents': {},
+    })
+    return metrics
+
+
+def compute_daily_metrics(start_date, end_date):
+    """
+    Métriques de chaque jour de ``start_date`` à ``end_date`` inclus
+
+    Renvoie un dictionnaire {date: métriques} contenant tous les jours de
+    la plage, y compris ceux sans activité.
+    """
+    start, end = _datetime_range(start_date, end_date)
+    days = {
+        start_date + timedelta(days=offset): _empty_metrics()
+        for offset in range((end_date - start_date).days + 1)
+    }
+
+    # Conversations créées
+    for row in ChatbotConversation.objects.filter(
+        created_at__gte=start, created_at__lt=end
+    ).annotate(day=TruncDate('created_at')).values('day').annotate(
+        count=Count('id')
+    ).order_by():
+        days[row['day']]['total_conversations'] = row['count']
+        days[row['day']]['new_conversations'] = row['count']
+
+    # Conversations fermées, résolues et évaluées (date de dernière mise à jour)
+    for row in ChatbotConversation.objects.filter(
+        updated_at__gte=start, updated_at__lt=end
+    ).annotate(day=TruncDate('updated_at')).values('day').annotate(
+        closed=Count('id', filter=Q(status='closed')),
+        resolved=Count('id', filter=Q(status='closed', satisfaction_rating__gte=4)),
+        avg_rating=Avg('satisfaction_rating'),
+        ratings=Count('satisfaction_rating')
+    ).order_by():
+        metrics = days[row['day']]
+        metrics['closed_conversations'] = row['closed']
+        metrics['successful_resolutions'] = row['resolved']
+        metrics['avg_satisfaction_rating'] = row['avg_rating']
+        metrics['total_ratings'] = row['ratings']
+
+    messages = ChatbotMessage.objects.filter(
+        timestamp__gte=start, timestamp__lt=end
+    ).annotate(day=TruncDate('timestamp'))
+
+    # Volumes de messages, temps de réponse et escalades vers un humain
+    escalation = Q(content__iregex=r'(' + '|'.join(ESCALATION_KEYWORDS) + ')')
+    bot = Q(sender='bot')
+    aggregates = {
+        'total': Count('id'),
+        'user': Count('id', filter=Q(sender='user')),
+        'bot': Count('id', filter=bot),
+        'avg_response_time': Avg('response_time_ms', filter=bot),
+        'escalations': Count('conversation', filter=escalation, distinct=True),
+    }
+    if connection.vendor == 'postgresql':
+        aggregates['p50'] = PercentileCont('response_time_ms', 0.5, filter=bot)
+        aggregates['p95'] = PercentileCont('response_time_ms', 0.95, filter=bot)
+
+    for row in messages.values('day').annotate(**aggregates).order_by():
+        metrics = days[row['day']]
+        metrics['total_messages'] = row['total']
+        metrics['user_messages'] = row['user']
+        metrics['bot_messages'] = row['bot']
+        metrics['avg_response_time_ms'] = row['avg_response_time']
+        metrics['p50_response_time_ms'] = row.get('p50')
+        metrics['p95_response_time_ms'] = row.get('p95')
+        metrics['escalations_to_human'] = row['escalations']
+
+    # Intentions les plus fréquentes
+    intents = defaultdict(list)
+    for row in messages.filter(intent__isnull=False).exclude(intent='').values(
+        'day', 'intent'
+    ).annotate(count=Count('id')).order_by():
+        intents[row['day']].append((row['count'], row['intent']))
+    for day, counts in intents.items():
+        counts.sort(key=lambda item: (-item[0], item[1]))
+        days[day]['top_intents'] = {
+            intent: count for count, intent in counts[:TOP_INTENTS_COUNT]
+        }
+
+    return days
+
+
+def save_daily_analytics(start_date, end_date):
+    """
+    Calculer et enregistrer les agrégats d'une plage de dates
+
+    Une insertion groupée met à jour les jours déjà présents. Renvoie le
+    nombre de jours traités.
+    """
+    metrics = compute_daily_metrics(start_date, end_date)
+
+    ChatbotAnalytics.objects.bulk_create(
+        [ChatbotAnalytics(date=day, **values) for day, values in metrics.items()],
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=METRIC_FIELDS + ['updated_at']
+    )
+    return len(metrics)
+
+
+def backfill_daily_analytics(start_date, end_date, chunk_days=BACKFILL_CHUNK_DAYS):
+    """Recalculer une période passée par tranches de ``chunk_days`` jours"""
+    processed = 0
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        processed += save_daily_analytics(chunk_start, chunk_end)
+        chunk_start = chunk_end + timedelta(days=1)
+    return processed
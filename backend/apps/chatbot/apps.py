@@ -0,0 +1,19 @@
+"""
+Configuration de l'application chatbot
+"""
+from django.apps import AppConfig
+
+
+class ChatbotConfig(AppConfig):
+    """
+    Configuration de l'application chatbot
+    """
+    name = 'apps.chatbot'
+    verbose_name = 'Chatbot'
+    
+    def ready(self):
+        """
+        Initialisation de l'application
+        """
+        # Importer les signaux
+        from . import signals
@@ -0,0 +1,251 @@
+"""
+Archivage des conversations du chatbot
+
+Les conversations et leurs messages sont lus par tranches (pagination par
+clé primaire, sans OFFSET) et écrits en JSON Lines compressé (gzip), une
+conversation par ligne avec ses messages. Chaque tranche forme un fichier
+enregistré dans le stockage par défaut, sous le répertoire du tenant ;
+lorsque l'archive sert de purge, les lignes ne sont supprimées qu'une fois
+le fichier de leur tranche enregistré.
+
+``restore_archive`` réinsère le contenu d'un fichier (commande
+``restore_chatbot_archive``).
+"""
+import datetime
+import gzip
+import json
+import logging
+import os
+import tempfile
+from itertools import groupby
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from apps.ai_modules.executor import current_tenant
+from .models import ChatbotConversation, ChatbotMessage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = '.jsonl.gz'
+
+CONVERSATION_FIELDS = [field.attname for field in ChatbotConversation._meta.concrete_fields]
+MESSAGE_FIELDS = [field.attname for field in ChatbotMessage._meta.concrete_fields]
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """
+    Dates et heures au format ISO complet
+
+    ``DjangoJSONEncoder`` tronque les microsecondes à la milliseconde :
+    une conversation restaurée ne serait plus identique à l'originale.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def get_chunk_size():
+    """Nombre de conversations par tranche (et par fichier)"""
+    return getattr(settings, 'CHATBOT_ARCHIVE_CHUNK_SIZE', 500)
+
+
+def get_delete_batch_size():
+    return getattr(settings, 'CHATBOT_ARCHIVE_DELETE_BATCH_SIZE', 100)
+
+
+def get_archive_dir(tenant=None):
+    return os.path.join(
+        getattr(settings, 'CHATBOT_ARCHIVE_DIR', 'chatbot_archives'),
+        tenant or current_tenant()
+    )
+
+
+def iter_conversation_chunks(queryset, chunk_size=None):
+    """
+    Conversations de ``queryset`` par tranches, avec leurs messages
+
+    Chaque tranche coûte deux requêtes : les conversations suivant la
+    dernière clé vue, puis tous leurs messages. Les tranches peuvent être
+    supprimées au fil de l'eau sans perturber la pagination.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    queryset = queryset.order_by('pk')
+    last_pk = None
+
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        conversations = list(page.values(*CONVERSATION_FIELDS)[:chunk_size])
+        if not conversations:
+            return
+
+        messages = ChatbotMessage.objects.filter(
+            conversation_id__in=[conversation['id'] for conversation in conversations]
+        ).order_by('conversation_id', 'timestamp').values(*MESSAGE_FIELDS)
+        by_conversation = {
+            conversation_id: list(rows)
+            for conversation_id, rows in groupby(messages, key=lambda row: row['conversation_id'])
+        }
+        for conversation in conversations:
+            conversation['messages'] = by_conversation.get(conversation['id'], [])
+
+        yield conversations
+        last_pk = conversations[-1]['id']
+
+
+def write_archive(conversations, name):
+    """
+    Écrire une tranche dans le stockage, renvoie le nom enregistré
+
+    La compression se fait dans un fichier temporaire, copié ensuite
+    par blocs vers le stockage.
+    """
+    with tempfile.TemporaryFile() as temporary:
+        with gzip.GzipFile(fileobj=temporary, mode='wb') as archive:
+            for conversation in conversations:
+                line = json.dumps(conversation, cls=ArchiveJSONEncoder, ensure_ascii=False)
+                archive.write(line.encode('utf-8') + b'\n')
+        temporary.seek(0)
+        return default_storage.save(name, File(temporary))
+
+
+def delete_conversations(conversation_ids, batch_size=None):
+    """Supprimer des conversations et leurs messages, par lots"""
+    batch_size = batch_size or get_delete_batch_size()
+    for start in range(0, len(conversation_ids), batch_size):
+        batch = conversation_ids[start:start + batch_size]
+        with transaction.atomic():
+            # Les messages d'abord, en une requête : la cascade de l'ORM
+            # les chargerait un par un
+            ChatbotMessage.objects.filter(conversation_id__in=batch).delete()
+            ChatbotConversation.objects.filter(id__in=batch).delete()
+
+
+def archive_conversations(queryset, prefix, delete=False, chunk_size=None, tenant=None):
+    """
+    Archiver les conversations de ``queryset``, un fichier par tranche
+
+    ``delete=True`` supprime chaque tranche une fois son fichier
+    enregistré. Renvoie le nombre de conversations et les noms des
+    fichiers écrits.
+    """
+    directory = get_archive_dir(tenant)
+    run = timezone.now().strftime('%Y%m%dT%H%M%S')
+    count = 0
+    names = []
+
+    for part, conversations in enumerate(iter_conversation_chunks(queryset, chunk_size), start=1):
+        name = write_archive(
+            conversations,
+            os.path.join(directory, f'{prefix}-{run}-{part:05d}{ARCHIVE_SUFFIX}')
+        )
+        names.append(name)
+        count += len(conversations)
+
+        if delete:
+            delete_conversations([conversation['id'] for conversation in conversations])
+
+    logger.info(f"{count} conversations archivées dans {len(names)} fichier(s) ({directory})")
+    return count, names
+
+
+def list_archives(tenant=None):
+    """Fichiers d'archive du tenant, du plus ancien au plus récent"""
+    directory = get_archive_dir(tenant)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in files if name.endswith(ARCHIVE_SUFFIX)
+    )
+
+
+def _instances(model, rows):
+    """Instances non enregistrées, valeurs JSON reconverties par leurs champs"""
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    return [
+        model(**{
+            name: fields[name].to_python(value)
+            for name, value in row.items() if name in fields
+        })
+        for row in rows
+    ]
+
+
+def restore_archive(name, batch_size=None):
+    """
+    Réinsérer les conversations d'un fichier d'archive
+
+    Les conversations déjà présentes et celles dont l'utilisateur
+    n'existe plus sont ignorées. Renvoie le nombre de conversations
+    restaurées.
+    """
+    from django.contrib.auth import get_user_model
+
+    batch_size = batch_size or get_chunk_size()
+    restored = 0
+
+    with default_storage.open(name, 'rb') as stored, gzip.GzipFile(fileobj=stored) as archive:
+        batch = []
+        for line in archive:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                restored += _restore_batch(batch, get_user_model())
+                batch = []
+        if batch:
+            restored += _restore_batch(batch, get_user_model())
+
+    logger.info(f"{restored} conversations restaurées depuis {name}")
+    return restored
+
+
+def _restore_batch(records, user_model):
+    ids = [record['id'] for record in records]
+    existing = {
+        str(pk) for pk in ChatbotConversation.objects.filter(id__in=ids).values_list('id', flat=True)
+    }
+    users = {
+        str(pk) for pk in user_model.objects.filter(
+            id__in={record['user_id'] for record in records}
+        ).values_list('id', flat=True)
+    }
+    records = [
+        record for record in records
+        if record['id'] not in existing and str(record['user_id']) in users
+    ]
+    if not records:
+        return 0
+
+    conversations = _instances(ChatbotConversation, records)
+    messages = _instances(
+        ChatbotMessage,
+        [message for record in records for message in record['messages']]
+    )
+
+    with transaction.atomic():
+        _bulk_insert(ChatbotConversation, conversations, ['created_at', 'updated_at'])
+        _bulk_insert(ChatbotMessage, messages, ['timestamp'])
+
+    return len(conversations)
+
+
+def _bulk_insert(model, objects, date_fields):
+    """
+    Insertion groupée conservant les dates d'origine
+
+    ``bulk_create`` remplace les champs ``auto_now`` / ``auto_now_add``
+    par l'heure courante ; ``bulk_update`` rétablit les valeurs archivées.
+    """
+    originals = [[getattr(obj, field) for field in date_fields] for obj in objects]
+    model.objects.bulk_create(objects)
+    for obj, values in zip(objects, originals):
+        for field, value in zip(date_fields, values):
+            setattr(obj, field, value)
+    model.objects.bulk_update(objects, date_fields)
@@ -0,0 +1,195 @@
+"""
+Reconnaissance des intentions prédéfinies du chatbot
+
+Les intentions actives d'un tenant sont compilées une fois : tous les
+mots-clés forment une seule alternance d'expressions régulières et les
+expressions régulières sont précompilées avec leur poids. Un message est
+ainsi comparé à toutes les intentions en un seul parcours (plus un
+passage par expression régulière déclarée).
+
+L'index est conservé par processus et reconstruit lorsque la version des
+intentions du tenant change (voir ``signals.py``).
+"""
+import logging
+import re
+import threading
+
+import numpy as np
+from django.core.cache import cache
+
+from apps.ai_modules.executor import current_tenant
+
+logger = logging.getLogger(__name__)
+
+# Score minimum pour retenir une intention sans recourir à l'IA
+MIN_INTENT_SCORE = 0.6
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def intents_version_key(tenant):
+    return f'chatbot_intents_version:{tenant}'
+
+
+def invalidate_intent_matcher(tenant=None):
+    """Signaler à tous les processus que les intentions du tenant ont changé"""
+    tenant = tenant or current_tenant()
+    _matchers.pop(tenant, None)
+
+    key = intents_version_key(tenant)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def keyword_trie_pattern(keywords):
+    """
+    Alternance de mots-clés factorisée par préfixes communs
+
+    Équivalente à ``a|b|c`` mais parcourue comme un arbre : le coût en
+    chaque position ne dépend plus du nombre de mots-clés. Le mot-clé le
+    plus long est préféré (quantificateurs gourmands).
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        alternation = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if '' in node:
+            return f'(?:{alternation})?' if len(branches) == 1 else f'{alternation}?'
+        return alternation
+
+    return build(trie)
+
+
+class IntentMatcher:
+    """
+    Score de toutes les intentions pour un message
+
+    Le score d'une intention est la somme des poids de ses motifs trouvés
+    dans le message (1 par mot-clé présent), divisée par son nombre de
+    motifs.
+    """
+
+    def __init__(self, intents):
+        # Ordre de départage à score égal : priorité décroissante, puis nom
+        self.intents = sorted(intents, key=lambda intent: (-intent['priority'], intent['name']))
+        self.by_name = {intent['name']: intent for intent in self.intents}
+        self.pattern_counts = np.array(
+            [len(intent['patterns']) for intent in self.intents], dtype=float
+        )
+
+        keywords = {}
+        self.regexes = []
+        for position, intent in enumerate(self.intents):
+            for pattern in intent['patterns']:
+                if isinstance(pattern, str):
+                    if pattern:
+                        keywords.setdefault(pattern.lower(), []).append(position)
+                elif isinstance(pattern, dict) and pattern.get('type') == 'regex':
+                    try:
+                        compiled = re.compile(pattern['pattern'], re.IGNORECASE)
+                    except (re.error, KeyError, TypeError) as e:
+                        logger.warning(f"Motif invalide pour l'intention {intent['name']}: {e}")
+                        continue
+                    self.regexes.append((compiled, position, float(pattern.get('weight', 1.0))))
+
+        self.keywords = {
+            keyword: np.array(positions) for keyword, positions in keywords.items()
+        }
+
+        # Un mot-clé est présent si le plus long mot-clé trouvé à sa position
+        # commence par lui : on précalcule ces préfixes
+        self.prefixes = {
+            keyword: [keyword[:length] for length in range(1, len(keyword) + 1)
+                      if keyword[:length] in self.keywords]
+            for keyword in self.keywords
+        }
+
+        if self.keywords:
+            # Recherche anticipée : les occurrences qui se chevauchent sont vues
+            self.keyword_regex = re.compile(f'(?=({keyword_trie_pattern(self.keywords)}))')
+        else:
+            self.keyword_regex = None
+
+    def __len__(self):
+        return len(self.intents)
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        return cls([
+            {
+                'name': intent.name,
+                'patterns': intent.patterns or [],
+                'responses': intent.responses or [],
+                'priority': intent.priority,
+                'action_type': intent.action_type,
+                'action_parameters': intent.action_parameters,
+                'requires_auth': intent.requires_authentication,
+                'requires_admin': intent.requires_admin,
+            }
+            for intent in queryset
+        ])
+
+    def scores(self, message):
+        """Scores de toutes les intentions (message déjà normalisé)"""
+        scores = np.zeros(len(self.intents))
+
+        if self.keyword_regex is not None:
+            found = set()
+            for match in self.keyword_regex.finditer(message):
+                found.update(self.prefixes[match.group(1)])
+            for keyword in found:
+                np.add.at(scores, self.keywords[keyword], 1.0)
+
+        for regex, position, weight in self.regexes:
+            if regex.search(message):
+                scores[position] += weight
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.pattern_counts > 0, scores / self.pattern_counts, 0.0)
+
+    def match(self, message, min_score=MIN_INTENT_SCORE):
+        """Meilleure intention et son score, ou ``(None, score)``"""
+        if not self.intents:
+            return None, 0.0
+
+        scores = self.scores(message)
+        best = int(np.argmax(scores))
+        if scores[best] > min_score:
+            return self.intents[best], float(scores[best])
+        return None, float(scores[best])
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+
+def get_intent_matcher(tenant=None):
+    """Index des intentions actives du tenant, reconstruit s'il est périmé"""
+    from .models import ChatbotIntent
+
+    tenant = tenant or current_tenant()
+    version = cache.get(intents_version_key(tenant), 0)
+
+    cached = _matchers.get(tenant)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _matchers_lock:
+        cached = _matchers.get(tenant)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        matcher = IntentMatcher.from_queryset(ChatbotIntent.objects.filter(is_active=True))
+        _matchers[tenant] = (version, matcher)
+        return matcher
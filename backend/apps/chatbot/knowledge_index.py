@@ -0,0 +1,351 @@
+"""
+Index TF-IDF de la base de connaissances du chatbot
+
+L'index (vocabulaire, matrice creuse des occurrences, métadonnées des
+éléments) est construit hors requête par la tâche
+``update_knowledge_base_vectors`` et enregistré sur disque, un fichier par
+tenant. Les processus web le chargent une fois et ne le relisent que si le
+fichier a changé. Une mise à jour ne re-tokenise que les éléments créés ou
+modifiés depuis la construction précédente.
+
+La recherche (moteur du chatbot et point d'accès de recherche) fait un
+produit creux avec la matrice normalisée puis une sélection partielle des
+meilleurs éléments ; le score BM25 peut remplacer la similarité cosinus
+(``CHATBOT_SEARCH_SCORER``).
+"""
+import logging
+import os
+import tempfile
+import threading
+
+import joblib
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, strip_accents_unicode
+
+from apps.ai_modules.executor import current_tenant
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 2
+
+# Seuil minimum de similarité cosinus pour proposer un élément
+MIN_SIMILARITY = 0.3
+
+SCORERS = ('tfidf', 'bm25')
+
+# Paramètres usuels d'Okapi BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Mots vides français (sans accents : le filtrage suit le repliement)
+FRENCH_STOP_WORDS = frozenset(strip_accents_unicode(word) for word in """
+    a afin ai aie aient aies ait alors as au aucun aucune aupres aura aurai
+    auraient aurais aurait auras aurez auriez aurions aurons auront aussi
+    autre autres aux avaient avais avait avant avec avez aviez avions avoir
+    avons ayant ayez ayons bon c ca car ce ceci cela celle celles celui cependant
+    ces cet cette ceux chaque chez ci comme comment d dans de des deja depuis
+    dont du donc elle elles en encore entre est et etaient etais etait etant
+    ete etes etiez etions etre eu eue eues eurent eus eusse eut eux fait
+    faire fois font furent fut ici il ils j je jusqu l la le les leur leurs
+    lors lui m ma mais me meme memes mes moi mon n ne ni nos notre nous on
+    ont ou par parce pas peu peut plus pour pourquoi qu quand que quel quelle
+    quelles quels qui quoi s sa sans se sera serai seraient serais serait
+    seras serez seriez serions serons seront ses si sien soi soient sois soit
+    sommes son sont sous suis sur t ta te tes toi ton tous tout toute toutes
+    tres tu un une unes uns vos votre vous vu y
+""".split())
+
+
+def get_index_dir():
+    return getattr(
+        settings, 'CHATBOT_INDEX_DIR',
+        os.path.join(settings.BASE_DIR, 'cache', 'chatbot_index')
+    )
+
+
+def get_index_path(tenant):
+    return os.path.join(get_index_dir(), f'{tenant}.joblib')
+
+
+def get_default_scorer():
+    scorer = getattr(settings, 'CHATBOT_SEARCH_SCORER', 'tfidf')
+    return scorer if scorer in SCORERS else 'tfidf'
+
+
+def build_analyzer():
+    """
+    Découpage d'un texte en termes (identique à l'indexation et à la recherche)
+
+    Minuscules, accents repliés (« élève » et « eleve » se confondent),
+    mots vides français retirés.
+    """
+    return CountVectorizer(
+        strip_accents='unicode',
+        stop_words=list(FRENCH_STOP_WORDS)
+    ).build_analyzer()
+
+
+def top_k(scores, k):
+    """Indices des ``k`` meilleurs scores, triés (sélection partielle)"""
+    if k <= 0 or not len(scores):
+        return np.array([], dtype=int)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class KnowledgeIndex:
+    """
+    Index des éléments actifs de ``ChatbotKnowledgeBase``
+
+    ``counts`` contient les occurrences brutes des termes (une ligne par
+    élément) : c'est ce qui permet de ne recalculer que les lignes
+    modifiées. Les pondérations TF-IDF et BM25 sont dérivées de ``counts``
+    à chaque construction, ce qui est peu coûteux.
+    """
+
+    def __init__(self, vocabulary=None, counts=None, items=None):
+        self.vocabulary = vocabulary or {}
+        self.items = items or []
+        self.counts = counts if counts is not None else sparse.csr_matrix((0, len(self.vocabulary)))
+        self._analyzer = build_analyzer()
+        self._compute_weights()
+
+    def __len__(self):
+        return len(self.items)
+
+    # Construction
+
+    def _compute_weights(self):
+        """IDF lissé et matrice TF-IDF normalisée (mêmes formules que scikit-learn)"""
+        n_items, n_terms = self.counts.shape
+        document_frequency = np.bincount(self.counts.indices, minlength=n_terms)
+        self.idf = np.log((1 + n_items) / (1 + document_frequency)) + 1
+
+        matrix = self.counts @ sparse.diags(self.idf) if n_terms else self.counts
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        self.matrix = sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+        # BM25 : poids de chaque (élément, terme) précalculés, la requête
+        # n'a plus qu'à sommer les colonnes de ses termes
+        lengths = np.asarray(self.counts.sum(axis=1)).ravel()
+        average_length = lengths.mean() if n_items else 0.0
+        self.bm25_idf = np.log(1 + (n_items - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        bm25 = self.counts.tocoo()
+        normalization = BM25_K1 * (1 - BM25_B + BM25_B * lengths[bm25.row] / (average_length or 1))
+        bm25.data = self.bm25_idf[bm25.col] * bm25.data * (BM25_K1 + 1) / (bm25.data + normalization)
+        self.bm25_matrix = bm25.tocsr()
+
+    def _count_terms(self, texts):
+        """Occurrences des termes de ``texts``, en enrichissant le vocabulaire"""
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            terms = {}
+            for term in self._analyzer(text):
+                column = self.vocabulary.setdefault(term, len(self.vocabulary))
+                terms[column] = terms.get(column, 0) + 1
+            rows.extend([row] * len(terms))
+            columns.extend(terms.keys())
+            values.extend(terms.values())
+
+        return sparse.csr_matrix(
+            (values, (rows, columns)),
+            shape=(len(texts), len(self.vocabulary)),
+            dtype=float
+        )
+
+    def update(self, queryset, full=False):
+        """
+        Synchroniser l'index avec les éléments de ``queryset``
+
+        Seuls les éléments nouveaux ou modifiés (``updated_at``) sont
+        relus et re-tokenisés ; les éléments disparus sont retirés.
+        ``full=True`` reconstruit tout, vocabulaire compris.
+        Renvoie le nombre d'éléments re-tokenisés.
+        """
+        if full:
+            self.vocabulary = {}
+            self.items = []
+            self.counts = sparse.csr_matrix((0, 0))
+
+        current = {
+            str(item_id): updated_at.isoformat()
+            for item_id, updated_at in queryset.values_list('id', 'updated_at')
+        }
+
+        kept = [
+            row for row, item in enumerate(self.items)
+            if current.get(item['id']) == item['updated_at']
+        ]
+        kept_ids = {self.items[row]['id'] for row in kept}
+        changed_ids = [item_id for item_id in current if item_id not in kept_ids]
+
+        changed_items = [
+            {
+                'id': str(item.id),
+                'title': item.title,
+                'content': item.content,
+                'knowledge_type': item.knowledge_type,
+                'category': item.category,
+                'updated_at': item.updated_at.isoformat(),
+            }
+            for item in queryset.filter(id__in=changed_ids)
+        ]
+
+        new_counts = self._count_terms([item['content'] for item in changed_items])
+        kept_counts = self.counts[kept] if kept else sparse.csr_matrix((0, 0))
+        kept_counts.resize((len(kept), len(self.vocabulary)))
+
+        self.items = [self.items[row] for row in kept] + changed_items
+        self.counts = sparse.vstack([kept_counts, new_counts], format='csr')
+        self._compute_weights()
+
+        return len(changed_items)
+
+    # Recherche
+
+    def search(self, text, limit=3, min_similarity=MIN_SIMILARITY, scorer=None,
+               knowledge_type=None, category=None):
+        """
+        Éléments les plus proches de ``text`` : liste de (élément, score)
+
+        ``scorer`` vaut ``'tfidf'`` (similarité cosinus, filtrée par
+        ``min_similarity``) ou ``'bm25'`` (score non borné, seuls les
+        scores positifs sont retenus). Les filtres de type et de catégorie
+        sont appliqués avant la sélection des meilleurs éléments.
+        """
+        if not self.items:
+            return []
+
+        columns = [
+            self.vocabulary[term] for term in self._analyzer(text)
+            if term in self.vocabulary
+        ]
+        if not columns:
+            return []
+
+        query = np.bincount(columns, minlength=len(self.vocabulary)).astype(float)
+        if (scorer or get_default_scorer()) == 'bm25':
+            # Chaque terme de la requête compte une fois
+            scores = self.bm25_matrix @ (query > 0).astype(float)
+            threshold = 0.0
+        else:
+            query *= self.idf
+            query /= np.linalg.norm(query)
+            scores = self.matrix @ query
+            threshold = min_similarity
+
+        if knowledge_type or category:
+            mask = np.array([
+                (not knowledge_type or item['knowledge_type'] == knowledge_type)
+                and (not category or item['category'] == category)
+                for item in self.items
+            ])
+            scores = np.where(mask, scores, -np.inf)
+
+        return [
+            (self.items[row], float(scores[row]))
+            for row in top_k(scores, limit)
+            if scores[row] > threshold
+        ]
+
+    # Persistance
+
+    def save(self, path):
+        """Écriture atomique : les lecteurs voient l'ancien ou le nouveau fichier"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(descriptor)
+        try:
+            joblib.dump({
+                'version': INDEX_FORMAT_VERSION,
+                'vocabulary': self.vocabulary,
+                'counts': self.counts,
+                'items': self.items,
+            }, temporary)
+            os.replace(temporary, path)
+        except Exception:
+            os.unlink(temporary)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Index enregistré, ou ``None`` s'il est absent ou d'un autre format"""
+        try:
+            data = joblib.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Index de la base de connaissances illisible ({path}): {e}")
+            return None
+
+        if data.get('version') != INDEX_FORMAT_VERSION:
+            return None
+        return cls(data['vocabulary'], data['counts'], data['items'])
+
+
+def active_knowledge():
+    from .models import ChatbotKnowledgeBase
+
+    return ChatbotKnowledgeBase.objects.filter(status='active')
+
+
+def rebuild_index(tenant=None, full=False):
+    """Mettre à jour et enregistrer l'index du tenant courant"""
+    tenant = tenant or current_tenant()
+    path = get_index_path(tenant)
+
+    index = None if full else KnowledgeIndex.load(path)
+    if index is None:
+        index, full = KnowledgeIndex(), True
+
+    changed = index.update(active_knowledge(), full=full)
+    index.save(path)
+    logger.info(
+        f"Index de la base de connaissances ({tenant}) : "
+        f"{len(index)} éléments, {changed} re-tokenisés"
+    )
+    return index
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(tenant=None):
+    """
+    Index du tenant pour ce processus
+
+    Rechargé seulement si le fichier a été réécrit depuis le dernier
+    chargement ; construit à la première utilisation s'il n'existe pas.
+    """
+    tenant = tenant or current_tenant()
+    path = get_index_path(tenant)
+
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        modified = None
+
+    cached = _indexes.get(tenant)
+    if cached is not None and modified is not None and cached[0] == modified:
+        return cached[1]
+
+    with _indexes_lock:
+        cached = _indexes.get(tenant)
+        if cached is not None and modified is not None and cached[0] == modified:
+            return cached[1]
+
+        index = KnowledgeIndex.load(path) if modified is not None else None
+        if index is None:
+            index = rebuild_index(tenant)
+            modified = os.stat(path).st_mtime_ns
+
+        _indexes[tenant] = (modified, index)
+        return index
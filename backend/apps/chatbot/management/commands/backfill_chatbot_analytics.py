@@ -0,0 +1,43 @@
+"""
+Commande pour recalculer les analytiques quotidiennes du chatbot
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.chatbot.analytics import BACKFILL_CHUNK_DAYS, backfill_daily_analytics
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les analytiques du chatbot sur une plage de dates (par tranches)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'start_date',
+            type=date.fromisoformat,
+            help='Premier jour (AAAA-MM-JJ)'
+        )
+        
+        parser.add_argument(
+            'end_date',
+            type=date.fromisoformat,
+            nargs='?',
+            help='Dernier jour inclus (AAAA-MM-JJ), la veille par défaut'
+        )
+        
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=BACKFILL_CHUNK_DAYS,
+            help='Nombre de jours calculés par tranche'
+        )
+    
+    def handle(self, *args, **options):
+        start_date = options['start_date']
+        end_date = options['end_date'] or date.today() - timedelta(days=1)
+        
+        if end_date < start_date:
+            raise CommandError('La date de fin précède la date de début')
+        
+        count = backfill_daily_analytics(start_date, end_date, chunk_days=options['chunk_days'])
+        
+        self.stdout.write(self.style.SUCCESS(f'{count} jour(s) recalculé(s)'))
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark de la reconnaissance des intentions du chatbot
+"""
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from apps.chatbot.intent_matcher import IntentMatcher
+
+
+WORDS = [
+    'note', 'notes', 'moyenne', 'bulletin', 'absence', 'retard', 'devoir',
+    'emploi', 'temps', 'cantine', 'menu', 'inscription', 'orientation',
+    'stage', 'examen', 'brevet', 'bac', 'professeur', 'classe', 'mot',
+    'passe', 'compte', 'connexion', 'parent', 'réunion', 'sortie',
+    'voyage', 'bourse', 'transport', 'bus', 'infirmerie', 'harcèlement',
+]
+
+
+def legacy_score(message, patterns):
+    """Score d'une intention tel qu'il était calculé avant l'index compilé"""
+    score = 0.0
+    if not patterns:
+        return 0.0
+    for pattern in patterns:
+        if isinstance(pattern, str):
+            if pattern.lower() in message:
+                score += 1.0
+        elif isinstance(pattern, dict) and pattern.get('type') == 'regex':
+            if re.search(pattern['pattern'], message, re.IGNORECASE):
+                score += pattern.get('weight', 1.0)
+    return score / len(patterns)
+
+
+def synthetic_intents(count, rng):
+    intents = []
+    for i in range(count):
+        patterns = [
+            f"{rng.choice(WORDS)} {rng.choice(WORDS)}{i}" if rng.random() < 0.5 else rng.choice(WORDS)
+            for _ in range(rng.randint(3, 8))
+        ]
+        if rng.random() < 0.3:
+            patterns.append({'type': 'regex', 'pattern': rf"\b{rng.choice(WORDS)}s?\b.*{i}", 'weight': 2.0})
+        intents.append({
+            'name': f'intent_{i}',
+            'patterns': patterns,
+            'responses': [],
+            'priority': rng.randint(0, 5),
+            'action_type': '',
+            'action_parameters': {},
+            'requires_auth': False,
+            'requires_admin': False,
+        })
+    return intents
+
+
+class Command(BaseCommand):
+    help = "Compare l'ancien score intention par intention et l'index compilé"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--intents', type=int, default=500, help="Nombre d'intentions")
+        parser.add_argument('--messages', type=int, default=1000, help='Nombre de messages')
+        parser.add_argument('--seed', type=int, default=42)
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        intents = synthetic_intents(options['intents'], rng)
+        messages = [
+            ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 20))) + f" {rng.randint(0, options['intents'])}"
+            for _ in range(options['messages'])
+        ]
+        
+        start = time.perf_counter()
+        matcher = IntentMatcher(intents)
+        build_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for message in messages:
+            [legacy_score(message, intent['patterns']) for intent in intents]
+        legacy_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for message in messages:
+            matcher.scores(message)
+        compiled_time = time.perf_counter() - start
+        
+        count = len(messages)
+        self.stdout.write(f"{len(intents)} intentions, {count} messages")
+        self.stdout.write(f"Construction de l'index : {build_time * 1000:.1f} ms")
+        self.stdout.write(f"Ancien score : {legacy_time / count * 1000:.3f} ms/message")
+        self.stdout.write(f"Index compilé : {compiled_time / count * 1000:.3f} ms/message")
+        self.stdout.write(self.style.SUCCESS(f"Gain : x{legacy_time / compiled_time:.1f}"))
@@ -0,0 +1,49 @@
+"""
+Commande pour restaurer des conversations archivées du chatbot
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.chatbot.archive import list_archives, restore_archive
+
+
+class Command(BaseCommand):
+    help = 'Restaure des conversations du chatbot depuis leurs archives compressées'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'archives',
+            nargs='*',
+            help="Fichiers d'archive à restaurer (chemins dans le stockage)"
+        )
+
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Lister les archives du tenant courant'
+        )
+
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Restaurer toutes les archives du tenant courant'
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in list_archives():
+                self.stdout.write(name)
+            return
+
+        archives = list_archives() if options['all'] else options['archives']
+        if not archives:
+            raise CommandError('Aucune archive indiquée (utilisez --list pour les afficher)')
+
+        total = 0
+        for name in archives:
+            try:
+                restored = restore_archive(name)
+            except FileNotFoundError:
+                raise CommandError(f'Archive introuvable : {name}')
+            total += restored
+            self.stdout.write(f'{name} : {restored} conversation(s)')
+
+        self.stdout.write(self.style.SUCCESS(f'{total} conversation(s) restaurée(s)'))
@@ -105,6 +105,10 @@ class ChatbotMessage(models.Model):
     
     # Réponse du chatbot
     response_time_ms = models.PositiveIntegerField(null=True, blank=True)
+    time_to_first_token_ms = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Délai avant le premier fragment envoyé (réponses en flux)"
+    )
     tokens_used = models.PositiveIntegerField(null=True, blank=True)
     
     class Meta:
@@ -236,6 +240,8 @@ class ChatbotAnalytics(models.Model):
     
     # Performance
     avg_response_time_ms = models.FloatField(null=True, blank=True)
+    p50_response_time_ms = models.FloatField(null=True, blank=True)
+    p95_response_time_ms = models.FloatField(null=True, blank=True)
     successful_resolutions = models.PositiveIntegerField(default=0)
     escalations_to_human = models.PositiveIntegerField(default=0)
     
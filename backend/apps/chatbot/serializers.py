@@ -16,11 +16,11 @@ class ChatbotMessageSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'sender', 'message_type', 'content', 'timestamp',
             'is_read', 'intent', 'confidence_score', 'entities',
-            'response_time_ms'
+            'response_time_ms', 'time_to_first_token_ms'
         ]
         read_only_fields = [
             'id', 'timestamp', 'intent', 'confidence_score', 'entities',
-            'response_time_ms'
+            'response_time_ms', 'time_to_first_token_ms'
         ]
 
 
@@ -117,7 +117,8 @@ class ChatbotAnalyticsSerializer(serializers.ModelSerializer):
         fields = [
             'date', 'total_conversations', 'new_conversations',
             'closed_conversations', 'total_messages', 'user_messages',
-            'bot_messages', 'avg_response_time_ms', 'successful_resolutions',
+            'bot_messages', 'avg_response_time_ms', 'p50_response_time_ms',
+            'p95_response_time_ms', 'successful_resolutions',
             'escalations_to_human', 'avg_satisfaction_rating',
             'total_ratings', 'top_intents'
         ]
@@ -165,6 +166,10 @@ class ChatbotSearchSerializer(serializers.Serializer):
     )
     category = serializers.CharField(max_length=100, required=False)
     limit = serializers.IntegerField(min_value=1, max_value=20, default=5)
+    scorer = serializers.ChoiceField(
+        choices=[('tfidf', 'TF-IDF'), ('bm25', 'BM25')],
+        required=False
+    )
 
 
 class ChatbotSuggestionSerializer(serializers.Serializer):
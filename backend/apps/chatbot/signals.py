@@ -0,0 +1,41 @@
+"""
+Signaux Django pour le chatbot
+
+Toute modification de la base de connaissances déclenche la mise à jour
+incrémentale de l'index du tenant, et toute modification d'une intention
+périme l'index des intentions, après validation de la transaction.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .intent_matcher import invalidate_intent_matcher
+from .models import ChatbotIntent, ChatbotKnowledgeBase
+from apps.ai_modules.executor import current_tenant
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=ChatbotKnowledgeBase)
+def schedule_knowledge_index_update(sender, instance, **kwargs):
+    """Planifier la reconstruction de l'index de la base de connaissances"""
+    from .tasks import update_knowledge_base_vectors
+
+    schema_name = current_tenant()
+
+    def schedule():
+        try:
+            update_knowledge_base_vectors.delay(schema_name)
+        except Exception as e:
+            logger.error(f"Impossible de planifier la mise à jour de l'index: {e}")
+
+    transaction.on_commit(schedule)
+
+
+@receiver([post_save, post_delete], sender=ChatbotIntent)
+def invalidate_intents_on_change(sender, instance, **kwargs):
+    """Les processus reconstruiront l'index des intentions au prochain message"""
+    schema_name = current_tenant()
+    transaction.on_commit(lambda: invalidate_intent_matcher(schema_name))
@@ -1,115 +1,39 @@
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 from django.db.models import Count, Avg, Q
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import logging
 
 from .models import (
-    ChatbotConversation, ChatbotMessage, ChatbotAnalytics,
-    ChatbotKnowledgeBase
+    ChatbotConversation, ChatbotMessage, ChatbotKnowledgeBase
 )
-from .ai_engine import ChatbotAIEngine
+from .ai_engine import get_chatbot_engine
+from .analytics import backfill_daily_analytics
+from .archive import archive_conversations
+from .knowledge_index import rebuild_index
+from .text_analytics import classify_low_satisfaction_messages, summarize_user_messages
 
 logger = logging.getLogger(__name__)
 
 
 @shared_task
-def generate_daily_analytics():
+def generate_daily_analytics(start_date=None, end_date=None):
     """
     Génère les analytiques quotidiennes du chatbot
+    
+    Par défaut la veille ; ``start_date``/``end_date`` (ISO) permettent de
+    recalculer une période passée.
     """
     try:
         yesterday = (timezone.now() - timedelta(days=1)).date()
+        start = date.fromisoformat(start_date) if start_date else yesterday
+        end = date.fromisoformat(end_date) if end_date else start
         
-        # Vérifier si les analytiques existent déjà
-        analytics, created = ChatbotAnalytics.objects.get_or_create(
-            date=yesterday,
-            defaults={}
-        )
-        
-        if not created:
-            logger.info(f"Analytiques pour {yesterday} déjà existantes, mise à jour...")
-        
-        # Conversations du jour
-        conversations = ChatbotConversation.objects.filter(
-            created_at__date=yesterday
-        )
-        
-        messages = ChatbotMessage.objects.filter(
-            timestamp__date=yesterday
-        )
+        count = backfill_daily_analytics(start, end)
         
-        # Statistiques des conversations
-        analytics.total_conversations = ChatbotConversation.objects.filter(
-            created_at__date=yesterday
-        ).count()
-        
-        analytics.new_conversations = conversations.count()
-        
-        analytics.closed_conversations = ChatbotConversation.objects.filter(
-            updated_at__date=yesterday,
-            status='closed'
-        ).count()
-        
-        # Statistiques des messages
-        analytics.total_messages = messages.count()
-        analytics.user_messages = messages.filter(sender='user').count()
-        analytics.bot_messages = messages.filter(sender='bot').count()
-        
-        # Performance
-        bot_messages_with_time = messages.filter(
-            sender='bot',
-            response_time_ms__isnull=False
-        )
-        
-        if bot_messages_with_time.exists():
-            analytics.avg_response_time_ms = bot_messages_with_time.aggregate(
-                avg=Avg('response_time_ms')
-            )['avg']
-        
-        # Résolutions réussies (conversations fermées avec satisfaction >= 4)
-        analytics.successful_resolutions = ChatbotConversation.objects.filter(
-            updated_at__date=yesterday,
-            status='closed',
-            satisfaction_rating__gte=4
-        ).count()
-        
-        # Escalations vers humain (conversations avec besoin d'assistance)
-        escalation_keywords = ['assistance', 'humain', 'conseiller', 'urgent']
-        analytics.escalations_to_human = messages.filter(
-            timestamp__date=yesterday,
-            content__iregex=r'(' + '|'.join(escalation_keywords) + ')'
-        ).values('conversation').distinct().count()
-        
-        # Satisfaction moyenne
-        satisfaction_data = ChatbotConversation.objects.filter(
-            updated_at__date=yesterday,
-            satisfaction_rating__isnull=False
-        ).aggregate(
-            avg=Avg('satisfaction_rating'),
-            count=Count('satisfaction_rating')
-        )
-        
-        analytics.avg_satisfaction_rating = satisfaction_data['avg']
-        analytics.total_ratings = satisfaction_data['count']
-        
-        # Top intentions
-        top_intents = messages.filter(
-            timestamp__date=yesterday,
-            intent__isnull=False
-        ).values('intent').annotate(
-            count=Count('intent')
-        ).order_by('-count')[:10]
-        
-        analytics.top_intents = {
-            intent['intent']: intent['count']
-            for intent in top_intents
-        }
-        
-        analytics.save()
-        
-        logger.info(f"Analytiques générées pour {yesterday}")
-        return f"Analytiques générées pour {yesterday}"
+        logger.info(f"Analytiques générées du {start} au {end}")
+        return f"Analytiques générées pour {count} jour(s)"
         
     except Exception as e:
         logger.error(f"Erreur lors de la génération des analytiques: {e}")
@@ -130,11 +54,24 @@ def cleanup_old_conversations():
             status='active'
         )
         
-        count = old_conversations.count()
-        old_conversations.update(status='archived')
+        count = old_conversations.update(status='archived')
         
-        logger.info(f"{count} conversations archivées")
-        return f"{count} conversations archivées"
+        # Purger les conversations terminées depuis longtemps, après les
+        # avoir écrites dans l'archive compressée du tenant
+        purge_cutoff = timezone.now() - timedelta(
+            days=getattr(settings, 'CHATBOT_ARCHIVE_AFTER_DAYS', 180)
+        )
+        purged, files = archive_conversations(
+            ChatbotConversation.objects.filter(
+                last_activity__lt=purge_cutoff,
+                status__in=['archived', 'closed']
+            ),
+            prefix='purge',
+            delete=True
+        )
+        
+        logger.info(f"{count} conversations archivées, {purged} purgées ({len(files)} fichiers)")
+        return f"{count} conversations archivées, {purged} purgées"
         
     except Exception as e:
         logger.error(f"Erreur lors de l'archivage: {e}")
@@ -142,16 +79,22 @@ def cleanup_old_conversations():
 
 
 @shared_task
-def update_knowledge_base_vectors():
+def update_knowledge_base_vectors(schema_name=None, full=False):
     """
-    Met à jour les vecteurs de la base de connaissances
+    Met à jour l'index de la base de connaissances
+    
+    Seuls les éléments modifiés depuis la dernière construction sont
+    re-tokenisés, sauf si ``full`` est vrai.
     """
+    from django.db import connection
+    
     try:
-        ai_engine = ChatbotAIEngine()
-        ai_engine.update_knowledge_base()
+        if schema_name and hasattr(connection, 'set_schema'):
+            connection.set_schema(schema_name)
         
-        logger.info("Base de connaissances mise à jour")
-        return "Base de connaissances mise à jour"
+        index = rebuild_index(schema_name, full=full)
+        
+        return f"Base de connaissances mise à jour ({len(index)} éléments)"
         
     except Exception as e:
         logger.error(f"Erreur lors de la mise à jour de la base de connaissances: {e}")
@@ -173,7 +116,7 @@ def process_conversation_summaries():
             context_data__has_key='summary'
         )
         
-        ai_engine = ChatbotAIEngine()
+        ai_engine = get_chatbot_engine()
         count = 0
         
         for conversation in recent_conversations:
@@ -210,53 +153,23 @@ def analyze_user_satisfaction():
         # Conversations avec faible satisfaction (< 3) des 7 derniers jours
         cutoff_date = timezone.now() - timedelta(days=7)
         
-        low_satisfaction = ChatbotConversation.objects.filter(
-            updated_at__gte=cutoff_date,
-            satisfaction_rating__lt=3,
-            satisfaction_rating__isnull=False
+        # Messages des utilisateurs dans ces conversations, lus par lots
+        messages = ChatbotMessage.objects.filter(
+            sender='user',
+            conversation__updated_at__gte=cutoff_date,
+            conversation__satisfaction_rating__lt=3,
+            conversation__satisfaction_rating__isnull=False
         )
+        problem_summary, issues = classify_low_satisfaction_messages(messages)
+        total_issues = sum(problem_summary.values())
         
-        issues = []
-        
-        for conversation in low_satisfaction:
-            # Analyser les messages pour identifier les problèmes
-            messages = conversation.messages.filter(sender='user')
-            
-            problem_keywords = {
-                'technical': ['bug', 'erreur', 'problème', 'ne marche pas', 'cassé'],
-                'response_quality': ['pas utile', 'incompréhensible', 'mauvaise réponse'],
-                'speed': ['lent', 'long', 'attente', 'délai'],
-                'missing_feature': ['manque', 'absent', 'devrait', 'pourquoi pas']
-            }
-            
-            for message in messages:
-                content_lower = message.content.lower()
-                for category, keywords in problem_keywords.items():
-                    if any(keyword in content_lower for keyword in keywords):
-                        issues.append({
-                            'conversation_id': str(conversation.id),
-                            'category': category,
-                            'satisfaction_rating': conversation.satisfaction_rating,
-                            'timestamp': conversation.updated_at.isoformat(),
-                            'message_sample': message.content[:200]
-                        })
-                        break
-        
-        # Grouper les problèmes par catégorie
-        problem_summary = {}
-        for issue in issues:
-            category = issue['category']
-            if category not in problem_summary:
-                problem_summary[category] = 0
-            problem_summary[category] += 1
-        
-        logger.info(f"Analyse de satisfaction terminée: {len(issues)} problèmes identifiés")
+        logger.info(f"Analyse de satisfaction terminée: {total_issues} problèmes identifiés")
         logger.info(f"Résumé des problèmes: {problem_summary}")
         
         return {
-            'total_issues': len(issues),
+            'total_issues': total_issues,
             'problem_summary': problem_summary,
-            'issues': issues[:10]  # Limiter pour les logs
+            'issues': issues  # Limités pour les logs
         }
         
     except Exception as e:
@@ -277,32 +190,12 @@ def backup_conversations():
             updated_at__gte=timezone.now() - timedelta(days=1)
         )
         
-        backup_data = []
-        
-        for conversation in important_conversations:
-            messages_data = []
-            for message in conversation.messages.all():
-                messages_data.append({
-                    'sender': message.sender,
-                    'content': message.content,
-                    'timestamp': message.timestamp.isoformat(),
-                    'intent': message.intent,
-                    'confidence_score': message.confidence_score
-                })
-            
-            backup_data.append({
-                'conversation_id': str(conversation.id),
-                'user_id': conversation.user.id,
-                'conversation_type': conversation.conversation_type,
-                'satisfaction_rating': conversation.satisfaction_rating,
-                'created_at': conversation.created_at.isoformat(),
-                'messages': messages_data
-            })
-        
-        # Ici vous pourriez sauvegarder vers S3, un fichier JSON, etc.
-        logger.info(f"{len(backup_data)} conversations sauvegardées")
-        
-        return f"{len(backup_data)} conversations sauvegardées"
+        # Écriture par tranches dans l'archive compressée du tenant
+        count, files = archive_conversations(important_conversations, prefix='backup')
+        
+        logger.info(f"{count} conversations sauvegardées ({len(files)} fichiers)")
+        
+        return f"{count} conversations sauvegardées"
         
     except Exception as e:
         logger.error(f"Erreur lors de la sauvegarde: {e}")
@@ -371,23 +264,17 @@ def generate_conversation_insights():
             'conversation_types': dict(conversations.values('conversation_type').annotate(
                 count=Count('conversation_type')
             ).values_list('conversation_type', 'count')),
-            'peak_hours': {},
             'avg_satisfaction': conversations.filter(
                 satisfaction_rating__isnull=False
             ).aggregate(avg=Avg('satisfaction_rating'))['avg'] or 0
         }
         
-        # Analyser les heures de pic
+        # Heures de pic et problèmes signalés : un seul parcours des messages
         messages = ChatbotMessage.objects.filter(
             timestamp__gte=cutoff_date,
             sender='user'
         )
-        
-        for hour in range(24):
-            hour_messages = messages.filter(
-                timestamp__hour=hour
-            ).count()
-            insights['peak_hours'][str(hour)] = hour_messages
+        insights['peak_hours'], insights['problem_categories'] = summarize_user_messages(messages)
         
         logger.info(f"Insights générés: {insights}")
         
@@ -0,0 +1,93 @@
+"""
+Tests de l'archivage des conversations du chatbot
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import pytest
+from apps.authentication.models import User
+from apps.chatbot.archive import (
+    CONVERSATION_FIELDS, MESSAGE_FIELDS, archive_conversations, restore_archive
+)
+from apps.chatbot.models import ChatbotConversation, ChatbotMessage
+
+START = datetime(2026, 3, 2, 8, 15, 30, 123456, tzinfo=dt_timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.CHATBOT_ARCHIVE_DIR = 'archives'
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(
+        email='eleve@test.com', username='eleve', password='testpass123', user_type='student'
+    )
+
+
+@pytest.fixture
+def conversations(user):
+    created = []
+    for index in range(3):
+        conversation = ChatbotConversation.objects.create(
+            user=user,
+            title=f'Révisions {index}',
+            satisfaction_rating=4 if index else None,
+            context_data={'matiere': 'histoire', 'chapitres': [index, index + 1]}
+        )
+        for offset, sender in enumerate(['user', 'bot']):
+            message = ChatbotMessage.objects.create(
+                conversation=conversation,
+                sender=sender,
+                content=f'Message {offset} « accentué »',
+                confidence_score=0.875 if sender == 'bot' else None,
+                entities=[{'type': 'date', 'valeur': '1789'}]
+            )
+            ChatbotMessage.objects.filter(pk=message.pk).update(
+                timestamp=START + timedelta(days=index, seconds=offset, microseconds=offset)
+            )
+        ChatbotConversation.objects.filter(pk=conversation.pk).update(
+            created_at=START + timedelta(days=index),
+            updated_at=START + timedelta(days=index, minutes=5),
+            last_activity=START + timedelta(days=index, minutes=5, microseconds=7)
+        )
+        created.append(conversation)
+    return created
+
+
+def snapshot():
+    return (
+        list(ChatbotConversation.objects.order_by('pk').values(*CONVERSATION_FIELDS)),
+        list(ChatbotMessage.objects.order_by('pk').values(*MESSAGE_FIELDS)),
+    )
+
+
+@pytest.mark.django_db
+class TestArchiveRoundtrip:
+
+    def test_restored_conversations_are_identical(self, conversations):
+        before = snapshot()
+
+        count, names = archive_conversations(
+            ChatbotConversation.objects.all(), 'test', delete=True, chunk_size=2
+        )
+
+        assert count == 3
+        assert len(names) == 2
+        assert not ChatbotConversation.objects.exists()
+        assert not ChatbotMessage.objects.exists()
+
+        assert sum(restore_archive(name) for name in names) == 3
+        assert snapshot() == before
+
+        # Une seconde restauration ne duplique rien
+        assert sum(restore_archive(name) for name in names) == 0
+        assert snapshot() == before
+
+    def test_conversations_of_deleted_users_are_skipped(self, user, conversations):
+        _, names = archive_conversations(ChatbotConversation.objects.all(), 'test', delete=True)
+        user.delete()
+
+        assert restore_archive(names[0]) == 0
+        assert not ChatbotMessage.objects.exists()
@@ -0,0 +1,133 @@
+"""
+Tests des agrégats quotidiens du chatbot
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from django.utils import timezone
+from apps.authentication.models import User
+from apps.chatbot import analytics
+from apps.chatbot.analytics import (
+    backfill_daily_analytics, compute_daily_metrics, save_daily_analytics
+)
+from apps.chatbot.models import ChatbotAnalytics, ChatbotConversation, ChatbotMessage
+
+DAY = date(2026, 3, 2)
+
+
+def at(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(
+        email='eleve@test.com', username='eleve', password='testpass123', user_type='student'
+    )
+
+
+def conversation(user, day, status='active', rating=None):
+    created = ChatbotConversation.objects.create(user=user, status=status, satisfaction_rating=rating)
+    ChatbotConversation.objects.filter(pk=created.pk).update(created_at=at(day), updated_at=at(day))
+    return created
+
+
+def message(conversation, day, sender='user', response_time=None, intent='', content='Bonjour'):
+    created = ChatbotMessage.objects.create(
+        conversation=conversation,
+        sender=sender,
+        content=content,
+        response_time_ms=response_time,
+        intent=intent
+    )
+    ChatbotMessage.objects.filter(pk=created.pk).update(timestamp=at(day))
+    return created
+
+
+@pytest.fixture
+def activity(user):
+    first = conversation(user, DAY, status='closed', rating=5)
+    second = conversation(user, DAY, status='closed', rating=2)
+    message(first, DAY, intent='devoirs')
+    message(first, DAY, content="Je veux parler à un conseiller", intent='devoirs')
+    message(second, DAY, intent='absences')
+    for response_time in [400, 100, 300, 200]:
+        message(first, DAY, sender='bot', response_time=response_time)
+    message(second, DAY, sender='bot')
+
+    later = conversation(user, DAY + timedelta(days=2))
+    message(later, DAY + timedelta(days=2), sender='bot', response_time=50)
+
+
+@pytest.mark.django_db
+class TestDailyMetrics:
+
+    def test_metrics_grouped_by_day(self, activity, django_assert_num_queries):
+        with django_assert_num_queries(4):
+            days = compute_daily_metrics(DAY, DAY + timedelta(days=2))
+
+        assert list(days) == [DAY, DAY + timedelta(days=1), DAY + timedelta(days=2)]
+
+        metrics = days[DAY]
+        assert metrics['new_conversations'] == 2
+        assert metrics['closed_conversations'] == 2
+        assert metrics['successful_resolutions'] == 1
+        assert (metrics['avg_satisfaction_rating'], metrics['total_ratings']) == (3.5, 2)
+        assert (metrics['total_messages'], metrics['user_messages'], metrics['bot_messages']) == (8, 3, 5)
+        assert metrics['escalations_to_human'] == 1
+        assert metrics['avg_response_time_ms'] == 250
+        # Interpolation linéaire entre les valeurs triées
+        assert metrics['p50_response_time_ms'] == pytest.approx(250)
+        assert metrics['p95_response_time_ms'] == pytest.approx(385)
+        assert metrics['top_intents'] == {'devoirs': 2, 'absences': 1}
+
+        empty = days[DAY + timedelta(days=1)]
+        assert empty['total_messages'] == 0
+        assert empty['p50_response_time_ms'] is None
+
+        single = days[DAY + timedelta(days=2)]
+        assert single['p50_response_time_ms'] == single['p95_response_time_ms'] == 50
+
+    def test_saving_again_updates_existing_days(self, user, activity):
+        assert save_daily_analytics(DAY, DAY + timedelta(days=2)) == 3
+        first = ChatbotAnalytics.objects.get(date=DAY)
+
+        assert save_daily_analytics(DAY, DAY + timedelta(days=2)) == 3
+        assert ChatbotAnalytics.objects.count() == 3
+        assert ChatbotAnalytics.objects.get(date=DAY).total_messages == first.total_messages
+
+        # Nouvelle activité : la ligne existante est mise à jour
+        message(ChatbotConversation.objects.first(), DAY, sender='bot', response_time=1000)
+        save_daily_analytics(DAY, DAY)
+
+        updated = ChatbotAnalytics.objects.get(date=DAY)
+        assert updated.pk == first.pk
+        assert updated.bot_messages == first.bot_messages + 1
+        assert updated.p50_response_time_ms == pytest.approx(300)
+
+    def test_backfill_in_chunks(self, activity, monkeypatch):
+        chunks = []
+        compute = analytics.compute_daily_metrics
+
+        def recording_compute(start_date, end_date):
+            chunks.append((start_date, end_date))
+            return compute(start_date, end_date)
+
+        monkeypatch.setattr(analytics, 'compute_daily_metrics', recording_compute)
+
+        assert backfill_daily_analytics(DAY, DAY + timedelta(days=4), chunk_days=2) == 5
+
+        assert chunks == [
+            (DAY, DAY + timedelta(days=1)),
+            (DAY + timedelta(days=2), DAY + timedelta(days=3)),
+            (DAY + timedelta(days=4), DAY + timedelta(days=4)),
+        ]
+        assert list(
+            ChatbotAnalytics.objects.order_by('date').values_list('date', 'total_messages')
+        ) == [
+            (DAY, 8),
+            (DAY + timedelta(days=1), 0),
+            (DAY + timedelta(days=2), 1),
+            (DAY + timedelta(days=3), 0),
+            (DAY + timedelta(days=4), 0),
+        ]
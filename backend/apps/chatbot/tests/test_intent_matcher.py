@@ -0,0 +1,51 @@
+"""
+Tests de l'index compilé des intentions
+"""
+import random
+
+import numpy as np
+import pytest
+from apps.chatbot.intent_matcher import IntentMatcher
+from apps.chatbot.management.commands.benchmark_intent_matcher import (
+    WORDS, legacy_score, synthetic_intents
+)
+
+
+def intent(name, patterns, priority=0):
+    return {
+        'name': name, 'patterns': patterns, 'responses': [], 'priority': priority,
+        'action_type': '', 'action_parameters': {},
+        'requires_auth': False, 'requires_admin': False,
+    }
+
+
+def test_overlapping_keywords_and_regex_weights():
+    """Les mots-clés imbriqués et les poids des expressions sont comptés"""
+    matcher = IntentMatcher([
+        intent('notes', ['note', 'notes', 'bulletin']),
+        intent('absence', ['absent', {'type': 'regex', 'pattern': r'\bjustifi', 'weight': 2.0}]),
+    ])
+
+    scores = dict(zip([item['name'] for item in matcher.intents], matcher.scores('mes notes et justificatif')))
+
+    assert scores == pytest.approx({'notes': 2 / 3, 'absence': 1.0})
+    assert matcher.match('mes notes et justificatif')[0]['name'] == 'absence'
+    assert matcher.match('mes notes')[0]['name'] == 'notes'
+
+
+def test_ties_follow_priority():
+    matcher = IntentMatcher([intent('b', ['cantine']), intent('a', ['cantine'], priority=5)])
+
+    assert matcher.match('menu de la cantine')[0]['name'] == 'a'
+
+
+def test_same_scores_as_per_intent_loop():
+    """Mêmes scores que l'ancien calcul intention par intention"""
+    rng = random.Random(7)
+    intents = synthetic_intents(200, rng)
+    matcher = IntentMatcher(intents)
+
+    for _ in range(50):
+        message = ' '.join(rng.choice(WORDS) for _ in range(12)) + f' {rng.randint(0, 200)}'
+        expected = [legacy_score(message, item['patterns']) for item in matcher.intents]
+        assert np.allclose(matcher.scores(message), expected)
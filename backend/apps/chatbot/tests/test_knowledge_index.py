@@ -0,0 +1,95 @@
+"""
+Tests de l'index TF-IDF de la base de connaissances
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from apps.chatbot.knowledge_index import KnowledgeIndex, build_analyzer, top_k
+
+
+class FakeKnowledge:
+    """Sous-ensemble de l'API QuerySet utilisé par ``KnowledgeIndex.update``"""
+
+    def __init__(self, items):
+        self.items = items
+        self.fetched = []
+
+    def values_list(self, *fields):
+        return [(item.id, item.updated_at) for item in self.items]
+
+    def filter(self, id__in):
+        ids = set(id__in)
+        fetched = [item for item in self.items if str(item.id) in ids]
+        self.fetched.extend(str(item.id) for item in fetched)
+        return fetched
+
+
+def knowledge(item_id, content, updated_at=datetime(2024, 9, 1)):
+    return SimpleNamespace(
+        id=item_id, title=f'Fiche {item_id}', content=content,
+        knowledge_type='faq', category='', updated_at=updated_at
+    )
+
+
+def test_weights_match_scikit_learn():
+    """Mêmes similarités qu'un TfidfVectorizer réentraîné"""
+    texts = ['réinitialiser le mot de passe du compte', 'menu de la cantine', 'carte de cantine et mot de passe']
+    index = KnowledgeIndex()
+    index.update(FakeKnowledge([knowledge(str(i), text) for i, text in enumerate(texts)]))
+
+    vectorizer = TfidfVectorizer(analyzer=build_analyzer())
+    expected = (vectorizer.fit_transform(texts) @ vectorizer.transform(['mot de passe']).T).toarray().ravel()
+
+    scores = {item['id']: score for item, score in index.search('mot de passe', limit=3, min_similarity=0)}
+    assert np.allclose([scores.get(str(i), 0) for i in range(3)], expected)
+
+
+def test_french_analyzer_folds_accents_and_drops_stop_words():
+    assert build_analyzer()("L'élève a déjà rendu ses DEVOIRS") == ['eleve', 'rendu', 'devoirs']
+
+
+def test_top_k_matches_full_sort():
+    scores = np.random.default_rng(0).random(100)
+
+    assert list(top_k(scores, 5)) == list(np.argsort(scores)[::-1][:5])
+    assert list(top_k(scores[:3], 5)) == list(np.argsort(scores[:3])[::-1])
+
+
+def test_bm25_and_filters():
+    """BM25 classe d'abord l'élément court et ciblé ; les filtres précèdent le top-k"""
+    items = [
+        knowledge('a', 'horaires de la cantine'),
+        knowledge('b', 'cantine ' + ' '.join(f'sujet{i}' for i in range(30))),
+        knowledge('c', 'inscription au bus scolaire'),
+    ]
+    items[0].category = 'vie scolaire'
+    items[1].category = 'menus'
+    index = KnowledgeIndex()
+    index.update(FakeKnowledge(items))
+
+    results = index.search('cantine', limit=3, scorer='bm25')
+    assert [item['id'] for item, _ in results] == ['a', 'b']
+
+    results = index.search('cantine', limit=1, scorer='bm25', category='menus')
+    assert [item['id'] for item, _ in results] == ['b']
+    results = index.search('cantine', limit=1, scorer='bm25', knowledge_type='faq', category='vie scolaire')
+    assert [item['id'] for item, _ in results] == ['a']
+
+
+def test_update_only_retokenizes_changed_items(tmp_path):
+    """Seuls les éléments modifiés ou nouveaux sont relus"""
+    items = [knowledge('a', 'mot de passe oublié'), knowledge('b', 'menu de la cantine')]
+    index = KnowledgeIndex()
+    index.update(FakeKnowledge(items))
+    index.save(tmp_path / 'tenant.joblib')
+
+    index = KnowledgeIndex.load(tmp_path / 'tenant.joblib')
+    items[1] = knowledge('b', 'horaires du bus scolaire', updated_at=datetime(2024, 9, 1) + timedelta(days=1))
+    items.append(knowledge('c', 'menu de la cantine et allergies'))
+    source = FakeKnowledge(items[1:])
+
+    assert index.update(source) == 2
+    assert sorted(source.fetched) == ['b', 'c']
+    assert [item['id'] for item, _ in index.search('menu cantine')] == ['c']
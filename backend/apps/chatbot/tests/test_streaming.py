@@ -0,0 +1,47 @@
+"""
+Tests des réponses du chatbot en flux
+"""
+import time
+
+from apps.chatbot.ai_engine import ChatbotAIEngine
+
+
+def test_stream_message_reports_time_to_first_token(settings, monkeypatch):
+    """Le premier fragment arrive avant la fin, et ce délai est mesuré"""
+    settings.OPENAI_API_KEY = 'test'
+    engine = ChatbotAIEngine()
+    intent = {'intent': 'general', 'confidence_score': 0.5}
+
+    def slow_stream(messages, temperature, max_tokens):
+        for word in ['Bonjour', ' et', ' bienvenue.']:
+            time.sleep(0.05)
+            yield word
+
+    monkeypatch.setattr(engine, '_analyze_intent', lambda message: intent)
+    monkeypatch.setattr(engine, '_search_knowledge_base', lambda message: [])
+    monkeypatch.setattr(engine, '_get_predefined_response', lambda intent, knowledge: None)
+    monkeypatch.setattr(engine, '_build_ai_messages', lambda *args: [])
+    monkeypatch.setattr(engine, '_stream_api', slow_stream)
+
+    events = list(engine.stream_message('bonjour', user=None, conversation_id='c'))
+
+    assert [data for event, data in events if event == 'token'] == ['Bonjour', ' et', ' bienvenue.']
+    event, response = events[-1]
+    assert event == 'done'
+    assert response['message'] == 'Bonjour et bienvenue.'
+    assert 0 < response['time_to_first_token_ms'] < response['response_time_ms']
+
+
+def test_stream_message_falls_back_in_one_fragment(settings, monkeypatch):
+    """Sans API, la réponse de secours est envoyée en un seul fragment"""
+    settings.OPENAI_API_KEY = None
+    engine = ChatbotAIEngine()
+
+    monkeypatch.setattr(engine, '_analyze_intent', lambda message: {'intent': 'unknown', 'confidence_score': 0.0})
+    monkeypatch.setattr(engine, '_search_knowledge_base', lambda message: [])
+    monkeypatch.setattr(engine, '_get_predefined_response', lambda intent, knowledge: None)
+
+    events = list(engine.stream_message('bonjour', user=None, conversation_id='c'))
+
+    assert [event for event, _ in events] == ['token', 'done']
+    assert events[0][1] == events[1][1]['message']
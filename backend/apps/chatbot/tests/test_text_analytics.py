@@ -0,0 +1,42 @@
+"""
+Tests de la classification des messages par mots-clés
+"""
+import random
+
+from apps.chatbot.text_analytics import PROBLEM_KEYWORDS, KeywordClassifier
+
+
+def legacy_classify(text):
+    """Ancienne boucle catégorie par catégorie, mot-clé par mot-clé"""
+    content_lower = text.lower()
+    for category, keywords in PROBLEM_KEYWORDS.items():
+        if any(keyword in content_lower for keyword in keywords):
+            return category
+    return None
+
+
+def test_first_category_wins_and_overlaps_are_seen():
+    classifier = KeywordClassifier(PROBLEM_KEYWORDS)
+
+    assert classifier.classify("C'est LENT et ça ne marche pas utile") == 'technical'
+    assert classifier.classify('ne marche pas utile') == 'technical'
+    assert classifier.classify('réponse pas utile') == 'response_quality'
+    assert classifier.classify('longtemps') == 'speed'
+    assert classifier.classify('merci beaucoup') is None
+
+
+def test_same_categories_as_keyword_loop():
+    rng = random.Random(3)
+    words = [keyword for keywords in PROBLEM_KEYWORDS.values() for keyword in keywords]
+    words += ['bonjour', 'mes notes', 'la cantine', 'pas', 'marche', 'mauvaise']
+    texts = [' '.join(rng.choice(words) for _ in range(rng.randint(0, 6))) for _ in range(500)]
+    classifier = KeywordClassifier(PROBLEM_KEYWORDS)
+
+    assert [classifier.classify(text) for text in texts] == [legacy_classify(text) for text in texts]
+
+    expected = {}
+    for text in texts:
+        category = legacy_classify(text)
+        if category:
+            expected[category] = expected.get(category, 0) + 1
+    assert classifier.count(texts) == expected
@@ -0,0 +1,156 @@
+"""
+Classification des messages du chatbot par mots-clés
+
+La taxonomie (catégorie -> mots-clés) est compilée en une seule expression
+régulière factorisée (voir ``keyword_trie_pattern``) : chaque message est
+parcouru une fois, quel que soit le nombre de catégories et de mots-clés.
+Les messages sont lus par lots avec ``.iterator()``, ce qui permet
+d'analyser de longues périodes sans charger tout l'historique en mémoire.
+"""
+import re
+from collections import Counter
+
+from django.utils import timezone
+
+from .intent_matcher import keyword_trie_pattern
+
+# Taille des lots lus en base lors des analyses
+ITERATOR_CHUNK_SIZE = 2000
+
+# Nombre de caractères conservés pour les exemples de messages
+SAMPLE_LENGTH = 200
+
+PROBLEM_KEYWORDS = {
+    'technical': ['bug', 'erreur', 'problème', 'ne marche pas', 'cassé'],
+    'response_quality': ['pas utile', 'incompréhensible', 'mauvaise réponse'],
+    'speed': ['lent', 'long', 'attente', 'délai'],
+    'missing_feature': ['manque', 'absent', 'devrait', 'pourquoi pas'],
+}
+
+
+class KeywordClassifier:
+    """
+    Catégories d'un texte selon une taxonomie de mots-clés
+
+    Un mot-clé est reconnu comme sous-chaîne du texte en minuscules (les
+    occurrences qui se chevauchent sont vues). Lorsqu'un texte relève de
+    plusieurs catégories, ``classify`` retient la première dans l'ordre
+    de la taxonomie.
+    """
+
+    def __init__(self, taxonomy):
+        self.categories = list(taxonomy)
+
+        keywords = {}
+        for position, category in enumerate(self.categories):
+            for keyword in taxonomy[category]:
+                if keyword:
+                    keywords.setdefault(keyword.lower(), set()).add(position)
+        self.keywords = keywords
+
+        # Le plus long mot-clé trouvé à une position couvre aussi ses préfixes
+        self.prefixes = {
+            keyword: [keyword[:length] for length in range(1, len(keyword) + 1)
+                      if keyword[:length] in keywords]
+            for keyword in keywords
+        }
+        self.regex = (
+            re.compile(f'(?=({keyword_trie_pattern(keywords)}))') if keywords else None
+        )
+
+    def positions(self, text):
+        """Positions (dans la taxonomie) des catégories présentes dans ``text``"""
+        found = set()
+        if self.regex is None or not text:
+            return found
+        for longest in set(self.regex.findall(text.lower())):
+            for keyword in self.prefixes[longest]:
+                found |= self.keywords[keyword]
+        return found
+
+    def classify(self, text):
+        """Première catégorie présente dans ``text``, ou ``None``"""
+        found = self.positions(text)
+        return self.categories[min(found)] if found else None
+
+    def count(self, texts):
+        """Nombre de textes par catégorie (une catégorie par texte), en un passage"""
+        counts = Counter()
+        for text in texts:
+            category = self.classify(text)
+            if category is not None:
+                counts[category] += 1
+        return self.ordered(counts)
+
+    def ordered(self, counts):
+        """Compteurs non nuls, dans l'ordre de la taxonomie"""
+        return {category: counts[category] for category in self.categories if counts[category]}
+
+
+_problem_classifier = None
+
+
+def get_problem_classifier():
+    global _problem_classifier
+    if _problem_classifier is None:
+        _problem_classifier = KeywordClassifier(PROBLEM_KEYWORDS)
+    return _problem_classifier
+
+
+def classify_low_satisfaction_messages(messages, classifier=None, max_issues=10):
+    """
+    Problèmes signalés dans les messages des conversations mal notées
+
+    ``messages`` est un QuerySet de ``ChatbotMessage`` ; il est lu par lots
+    en une requête. Renvoie le nombre de messages par catégorie et les
+    ``max_issues`` premiers problèmes (un par message classé).
+    """
+    classifier = classifier or get_problem_classifier()
+    counts = Counter()
+    issues = []
+
+    rows = messages.values_list(
+        'conversation_id', 'content',
+        'conversation__satisfaction_rating', 'conversation__updated_at'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+    for conversation_id, content, rating, updated_at in rows:
+        category = classifier.classify(content)
+        if category is None:
+            continue
+        counts[category] += 1
+        if len(issues) >= max_issues:
+            continue
+        issues.append({
+            'conversation_id': str(conversation_id),
+            'category': category,
+            'satisfaction_rating': rating,
+            'timestamp': updated_at.isoformat(),
+            'message_sample': content[:SAMPLE_LENGTH]
+        })
+
+    return classifier.ordered(counts), issues
+
+
+def summarize_user_messages(messages, classifier=None):
+    """
+    Heures d'activité et catégories de problèmes des messages utilisateurs
+
+    Un seul parcours par lots du QuerySet ``messages`` : renvoie le nombre
+    de messages par heure locale (0 à 23) et par catégorie.
+    """
+    classifier = classifier or get_problem_classifier()
+    hours = [0] * 24
+    categories = Counter()
+    current = timezone.get_current_timezone()
+
+    rows = messages.values_list('timestamp', 'content').iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE
+    )
+    for timestamp, content in rows:
+        hours[timezone.localtime(timestamp, current).hour] += 1
+        category = classifier.classify(content)
+        if category is not None:
+            categories[category] += 1
+
+    return {str(hour): count for hour, count in enumerate(hours)}, classifier.ordered(categories)
@@ -3,9 +3,15 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Avg, Sum
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import json
 import logging
 
 from .models import (
@@ -19,12 +25,33 @@ from .serializers import (
     ChatbotAnalyticsSerializer, ChatbotResponseSerializer,
     ChatbotFeedbackSerializer, ChatbotSearchSerializer
 )
-from .ai_engine import ChatbotAIEngine
+from .ai_engine import get_chatbot_engine
+from ..ai_modules.executor import current_tenant
 from ..core.permissions import IsStudentOrParentOrTeacher
 
 logger = logging.getLogger(__name__)
 
 
+def sse_event(event, data):
+    """Un événement server-sent events encodé en JSON"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@contextmanager
+def tenant_schema(schema_name):
+    """Travailler temporairement sur le schéma d'un tenant"""
+    previous = current_tenant()
+    switch = schema_name != previous and hasattr(connection, 'set_schema')
+    if switch:
+        connection.set_schema(schema_name)
+    try:
+        yield
+    finally:
+        if switch:
+            connection.set_schema(previous)
+
+
 class ChatbotConversationViewSet(viewsets.ModelViewSet):
     """
     ViewSet pour les conversations du chatbot
@@ -63,7 +90,7 @@ class ChatbotConversationViewSet(viewsets.ModelViewSet):
             
             try:
                 # Générer la réponse du chatbot
-                ai_engine = ChatbotAIEngine()
+                ai_engine = get_chatbot_engine()
                 response_data = ai_engine.process_message(
                     message=user_message.content,
                     user=request.user,
@@ -108,6 +135,73 @@ class ChatbotConversationViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['post'])
+    def stream_message(self, request, pk=None):
+        """
+        Envoie un message et reçoit la réponse en flux (server-sent events)
+        
+        Événements : ``user_message`` (message enregistré), ``token``
+        (fragment de réponse), ``done`` (réponse enregistrée, avec
+        ``time_to_first_token_ms``).
+        """
+        conversation = self.get_object()
+        serializer = ChatbotMessageCreateSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        user_message = serializer.save(
+            conversation=conversation,
+            sender='user'
+        )
+        ai_engine = get_chatbot_engine()
+        
+        def events():
+            # Le flux est lu après la fin de la vue : le middleware a déjà
+            # rétabli le schéma public
+            with tenant_schema(ai_engine.tenant):
+                yield sse_event('user_message', ChatbotMessageSerializer(user_message).data)
+                
+                response_data = None
+                for event, data in ai_engine.stream_message(
+                    message=user_message.content,
+                    user=request.user,
+                    conversation_id=str(conversation.id)
+                ):
+                    if event == 'token':
+                        yield sse_event('token', {'text': data})
+                    else:
+                        response_data = data
+                
+                bot_message = ChatbotMessage.objects.create(
+                    conversation=conversation,
+                    sender='bot',
+                    content=response_data['message'],
+                    message_type=response_data.get('message_type', 'text'),
+                    intent=response_data.get('intent'),
+                    confidence_score=response_data.get('confidence_score'),
+                    entities=response_data.get('entities', []),
+                    response_time_ms=response_data.get('response_time_ms'),
+                    time_to_first_token_ms=response_data.get('time_to_first_token_ms'),
+                    tokens_used=response_data.get('tokens_used')
+                )
+                
+                if not conversation.title:
+                    conversation.generate_title()
+                
+                yield sse_event('done', {
+                    'bot_response': ChatbotMessageSerializer(bot_message).data,
+                    'quick_replies': response_data.get('quick_replies', []),
+                    'suggestions': response_data.get('suggestions', []),
+                    'needs_human': response_data.get('needs_human', False)
+                })
+        
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Pas de mise en tampon par nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
     @action(detail=True, methods=['post'])
     def close_conversation(self, request, pk=None):
         """
@@ -159,7 +253,7 @@ class ChatbotConversationViewSet(viewsets.ModelViewSet):
         conversation = self.get_object()
         
         try:
-            ai_engine = ChatbotAIEngine()
+            ai_engine = get_chatbot_engine()
             summary = ai_engine.get_conversation_summary(str(conversation.id))
             
             return Response({
@@ -228,15 +322,15 @@ class ChatbotKnowledgeBaseViewSet(viewsets.ReadOnlyModelViewSet):
             limit = serializer.validated_data.get('limit', 5)
             
             try:
-                ai_engine = ChatbotAIEngine()
-                results = ai_engine._search_knowledge_base(query, limit)
-                
-                # Filtrer par type et catégorie si spécifié
-                if knowledge_type:
-                    results = [r for r in results if r.get('knowledge_type') == knowledge_type]
-                
-                if category:
-                    results = [r for r in results if r.get('category') == category]
+                # Même index que le moteur ; les filtres s'appliquent avant
+                # la sélection des meilleurs résultats
+                ai_engine = get_chatbot_engine()
+                results = ai_engine._search_knowledge_base(
+                    query, limit,
+                    knowledge_type=knowledge_type,
+                    category=category,
+                    scorer=serializer.validated_data.get('scorer')
+                )
                 
                 return Response({
                     'query': query,
@@ -286,36 +380,28 @@ class ChatbotAnalyticsViewSet(viewsets.ReadOnlyModelViewSet):
                 date__range=[start_date, end_date]
             )
             
-            # Calculs agrégés
-            total_conversations = analytics.aggregate(
-                total=Count('total_conversations')
-            )['total'] or 0
-            
-            avg_satisfaction = analytics.aggregate(
-                avg=Avg('avg_satisfaction_rating')
-            )['avg'] or 0
-            
-            avg_response_time = analytics.aggregate(
-                avg=Avg('avg_response_time_ms')
-            )['avg'] or 0
+            # Calculs agrégés en une requête
+            summary = analytics.aggregate(
+                total_conversations=Sum('total_conversations'),
+                avg_satisfaction=Avg('avg_satisfaction_rating'),
+                avg_response_time=Avg('avg_response_time_ms')
+            )
+            total_conversations = summary['total_conversations'] or 0
+            avg_satisfaction = summary['avg_satisfaction'] or 0
+            avg_response_time = summary['avg_response_time'] or 0
             
-            # Conversations par jour
-            daily_stats = list(analytics.values(
+            # Conversations par jour et top intentions (une seule lecture)
+            daily_stats = []
+            all_intents = Counter()
+            for day in analytics.order_by('date').values(
                 'date', 'total_conversations', 'new_conversations',
-                'total_messages', 'avg_satisfaction_rating'
-            ))
-            
-            # Top intentions
-            all_intents = {}
-            for day in analytics:
-                for intent, count in day.top_intents.items():
-                    all_intents[intent] = all_intents.get(intent, 0) + count
+                'total_messages', 'avg_satisfaction_rating',
+                'p50_response_time_ms', 'p95_response_time_ms', 'top_intents'
+            ):
+                all_intents.update(day.pop('top_intents') or {})
+                daily_stats.append(day)
             
-            top_intents = sorted(
-                all_intents.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:10]
+            top_intents = all_intents.most_common(10)
             
             return Response({
                 'period': {
@@ -368,7 +454,7 @@ class ChatbotQuickActionsViewSet(viewsets.ViewSet):
             
             # Générer une réponse
             try:
-                ai_engine = ChatbotAIEngine()
+                ai_engine = get_chatbot_engine()
                 response_data = ai_engine.process_message(
                     message=initial_message,
                     user=request.user,
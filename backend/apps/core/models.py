@@ -14,4 +14,24 @@ class BaseModel(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+
+
+class StoredBlob(BaseModel):
+    """
+    Contenu de fichier stocké une seule fois, adressé par son empreinte
+
+    Les champs fichier utilisant ``ContentAddressedStorage`` partagent le
+    même fichier physique pour un contenu identique ; ``refcount`` compte
+    les références et le fichier est effacé quand il tombe à zéro.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'stored_blobs'
+
+    def __str__(self):
+        return f"{self.sha256} ({self.refcount})"
\ No newline at end of file
@@ -7,7 +7,8 @@ from django.urls import reverse
 from django.db.models import Avg, Count
 from .models import (
     EvaluationType, GradingPeriod, Evaluation, Grade,
-    SubjectAverage, GeneralAverage, Competence, CompetenceEvaluation
+    SubjectAverage, GeneralAverage, Competence, CompetenceEvaluation,
+    ReportCard, ReportCardBatch
 )
 
 
@@ -163,4 +164,26 @@ class CompetenceEvaluationAdmin(admin.ModelAdmin):
         'student__first_name', 'student__last_name',
         'competence__name', 'competence__code'
     ]
-    raw_id_fields = ['student', 'evaluation', 'evaluated_by']
\ No newline at end of file
+    raw_id_fields = ['student', 'evaluation', 'evaluated_by']
+
+
+@admin.register(ReportCard)
+class ReportCardAdmin(admin.ModelAdmin):
+    list_display = ['student', 'grading_period', 'class_group', 'generated_at']
+    list_filter = ['grading_period', 'class_group']
+    search_fields = ['student__first_name', 'student__last_name']
+    raw_id_fields = ['student']
+    readonly_fields = ['generated_at']
+
+
+@admin.register(ReportCardBatch)
+class ReportCardBatchAdmin(admin.ModelAdmin):
+    list_display = [
+        'class_group', 'grading_period', 'status', 'processed_students',
+        'total_students', 'started_at', 'finished_at'
+    ]
+    list_filter = ['status', 'grading_period']
+    readonly_fields = [
+        'total_students', 'processed_students', 'started_at',
+        'finished_at', 'error_message'
+    ]
@@ -0,0 +1,19 @@
+"""
+Configuration de l'application notes et évaluations
+"""
+from django.apps import AppConfig
+
+
+class GradesConfig(AppConfig):
+    """
+    Configuration de l'application de gestion des notes
+    """
+    name = 'apps.grades'
+    verbose_name = 'Notes et évaluations'
+    
+    def ready(self):
+        """
+        Initialisation de l'application
+        """
+        # Importer les signaux
+        from . import signals
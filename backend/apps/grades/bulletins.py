@@ -0,0 +1,313 @@
+"""
+Génération des bulletins PDF
+
+Les données d'une classe sont rassemblées en quelques requêtes groupées,
+puis le rendu PDF (coûteux en CPU, sans accès à la base) est réparti sur
+un pool de processus, y compris depuis un worker Celery. L'avancement est
+suivi classe par classe dans ``ReportCardBatch`` afin de pouvoir reprendre
+une génération interrompue.
+"""
+import logging
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import GeneralAverage, ReportCard, ReportCardBatch, SubjectAverage
+from apps.schools.models import StudentClassEnrollment
+
+logger = logging.getLogger(__name__)
+
+# Fréquence de mise à jour de l'avancement (en nombre de bulletins)
+PROGRESS_UPDATE_STEP = 10
+
+
+def get_worker_count():
+    """Nombre de processus de rendu"""
+    return getattr(settings, 'REPORT_CARD_WORKERS', None) or os.cpu_count() or 1
+
+
+class BilliardExecutor:
+    """``map`` d'un exécuteur sur un pool ``billiard``"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def map(self, func, iterable, chunksize=1):
+        return self.pool.imap(func, iterable, chunksize)
+
+
+def _in_daemon_process():
+    import billiard
+
+    return multiprocessing.current_process().daemon or billiard.current_process().daemon
+
+
+@contextmanager
+def bulletin_executor(max_workers=None):
+    """
+    Pool de processus pour le rendu des PDF
+
+    Un processus démon (worker Celery en prefork) ne peut pas créer de
+    sous-processus avec ``multiprocessing`` : le pool est alors celui de
+    ``billiard`` (bibliothèque de Celery), qui le permet.
+    """
+    max_workers = max_workers or get_worker_count()
+
+    if not _in_daemon_process():
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            yield executor
+        return
+
+    from billiard.pool import Pool
+
+    pool = Pool(processes=max_workers)
+    try:
+        yield BilliardExecutor(pool)
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def _format_average(value):
+    return f"{value:.2f}" if value is not None else '-'
+
+
+def collect_class_bulletin_data(class_obj, period):
+    """
+    Rassembler les données des bulletins d'une classe
+
+    Renvoie une liste de dictionnaires simples (sérialisables par pickle)
+    prêts à être envoyés aux processus de rendu.
+    """
+    from apps.attendance.models import Attendance, AttendanceStatus
+
+    enrollments = StudentClassEnrollment.objects.filter(
+        class_group=class_obj,
+        is_active=True
+    ).select_related('student').order_by('student__last_name', 'student__first_name')
+    students = [enrollment.student for enrollment in enrollments]
+    student_ids = [student.id for student in students]
+
+    general_averages = {
+        avg.student_id: avg
+        for avg in GeneralAverage.objects.filter(
+            grading_period=period,
+            student_id__in=student_ids
+        )
+    }
+
+    subject_averages = defaultdict(list)
+    for avg in SubjectAverage.objects.filter(
+        grading_period=period,
+        student_id__in=student_ids
+    ).select_related('subject').order_by('subject__name'):
+        subject_averages[avg.student_id].append({
+            'subject': avg.subject.name,
+            'average': _format_average(avg.average),
+            'class_average': _format_average(avg.class_average),
+            'min_average': _format_average(avg.min_average),
+            'max_average': _format_average(avg.max_average),
+            'rank': avg.rank,
+            'appreciation': avg.appreciation,
+        })
+
+    attendance = {
+        row['student_id']: row
+        for row in Attendance.objects.filter(
+            student_id__in=student_ids,
+            date__range=[period.start_date, period.end_date]
+        ).values('student_id').annotate(
+            absences=Count('id', filter=Q(status=AttendanceStatus.ABSENT)),
+            justified_absences=Count(
+                'id',
+                filter=Q(status=AttendanceStatus.ABSENT, is_justified=True)
+            ),
+            delays=Count('id', filter=Q(status=AttendanceStatus.LATE))
+        )
+    }
+
+    bulletins = []
+    for student in students:
+        general = general_averages.get(student.id)
+        absences = attendance.get(student.id, {})
+        bulletins.append({
+            'student_id': str(student.id),
+            'student_name': student.get_full_name(),
+            'class_name': str(class_obj),
+            'period_name': str(period),
+            'general_average': _format_average(general.weighted_average if general else None),
+            'class_average': _format_average(general.class_average if general else None),
+            'rank': general.rank if general else None,
+            'class_size': general.class_size if general else None,
+            'honor_roll': general.get_honor_roll_display() if general and general.honor_roll else '',
+            'council_decision': general.get_council_decision_display() if general and general.council_decision else '',
+            'general_appreciation': general.general_appreciation if general else '',
+            'subjects': subject_averages.get(student.id, []),
+            'absences': absences.get('absences', 0),
+            'justified_absences': absences.get('justified_absences', 0),
+            'delays': absences.get('delays', 0),
+        })
+
+    return bulletins
+
+
+def render_bulletin_pdf(data):
+    """
+    Produire le PDF d'un bulletin
+
+    Exécutée dans les processus du pool : ne doit pas accéder à la base.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    buffer = BytesIO()
+    document = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        leftMargin=1.5 * cm,
+        rightMargin=1.5 * cm,
+        topMargin=1.5 * cm,
+        bottomMargin=1.5 * cm,
+        title=f"Bulletin - {data['student_name']}"
+    )
+
+    story = [
+        Paragraph(escape(f"Bulletin - {data['period_name']}"), styles['Title']),
+        Paragraph(escape(f"{data['student_name']} - {data['class_name']}"), styles['Heading2']),
+        Spacer(1, 0.4 * cm),
+    ]
+
+    rows = [['Matière', 'Moyenne', 'Classe', 'Min', 'Max', 'Rang', 'Appréciation']]
+    for subject in data['subjects']:
+        rows.append([
+            subject['subject'],
+            subject['average'],
+            subject['class_average'],
+            subject['min_average'],
+            subject['max_average'],
+            subject['rank'] or '-',
+            Paragraph(escape(subject['appreciation']), styles['BodyText']),
+        ])
+
+    table = Table(rows, colWidths=[3.5 * cm, 1.8 * cm, 1.6 * cm, 1.3 * cm, 1.3 * cm, 1.2 * cm, 7.3 * cm], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ]))
+    story.extend([table, Spacer(1, 0.4 * cm)])
+
+    rank = f" - Rang : {data['rank']}/{data['class_size']}" if data['rank'] else ''
+    story.append(Paragraph(
+        f"Moyenne générale : {data['general_average']} "
+        f"(classe : {data['class_average']}){rank}",
+        styles['Heading3']
+    ))
+    if data['honor_roll']:
+        story.append(Paragraph(f"Mention : {escape(data['honor_roll'])}", styles['BodyText']))
+    if data['council_decision']:
+        story.append(Paragraph(
+            f"Décision du conseil : {escape(data['council_decision'])}",
+            styles['BodyText']
+        ))
+    if data['general_appreciation']:
+        story.append(Paragraph(f"Appréciation générale : {escape(data['general_appreciation'])}", styles['BodyText']))
+
+    story.append(Spacer(1, 0.3 * cm))
+    story.append(Paragraph(
+        f"Absences : {data['absences']} (dont {data['justified_absences']} justifiées) - "
+        f"Retards : {data['delays']}",
+        styles['BodyText']
+    ))
+
+    document.build(story)
+    return buffer.getvalue()
+
+
+def generate_class_bulletins(class_obj, period, executor=None):
+    """
+    Générer et enregistrer les bulletins PDF d'une classe
+
+    Les fichiers sont écrits via le stockage par défaut (isolé par tenant).
+    """
+    batch, _ = ReportCardBatch.objects.get_or_create(
+        grading_period=period,
+        class_group=class_obj
+    )
+    batch.status = 'running'
+    batch.started_at = timezone.now()
+    batch.finished_at = None
+    batch.processed_students = 0
+    batch.error_message = ''
+    batch.save()
+
+    try:
+        bulletins = collect_class_bulletin_data(class_obj, period)
+        batch.total_students = len(bulletins)
+        batch.save(update_fields=['total_students', 'updated_at'])
+
+        if executor is not None:
+            pdfs = executor.map(render_bulletin_pdf, bulletins, chunksize=4)
+        else:
+            pdfs = map(render_bulletin_pdf, bulletins)
+
+        existing = {
+            str(report_card.student_id): report_card
+            for report_card in ReportCard.objects.filter(
+                grading_period=period,
+                student_id__in=[data['student_id'] for data in bulletins]
+            )
+        }
+
+        for data, pdf in zip(bulletins, pdfs):
+            report_card = existing.get(data['student_id']) or ReportCard(
+                student_id=data['student_id'],
+                grading_period=period
+            )
+            report_card.class_group = class_obj
+            if report_card.pdf_file:
+                report_card.pdf_file.delete(save=False)
+            report_card.pdf_file.save(
+                f"bulletin_{period.number}_{data['student_id']}.pdf",
+                ContentFile(pdf),
+                save=False
+            )
+            report_card.generated_at = timezone.now()
+            report_card.save()
+
+            batch.processed_students += 1
+            if batch.processed_students % PROGRESS_UPDATE_STEP == 0:
+                ReportCardBatch.objects.filter(pk=batch.pk).update(
+                    processed_students=batch.processed_students
+                )
+
+    except Exception as e:
+        logger.exception(f"Échec de la génération des bulletins de {class_obj}")
+        batch.status = 'failed'
+        batch.error_message = str(e)
+        batch.save()
+        return batch
+
+    batch.status = 'completed'
+    batch.finished_at = timezone.now()
+    batch.save()
+    return batch
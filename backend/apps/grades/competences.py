@@ -0,0 +1,153 @@
+"""
+Synthèse des compétences par élève
+
+Une seule requête groupée par (élève, compétence, niveau) alimente les
+synthèses d'un ou plusieurs élèves. Les synthèses d'une période sont
+mises en cache et invalidées à chaque évaluation de compétence.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import Competence, CompetenceEvaluation
+
+
+COMPETENCE_SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24  # 24h
+
+# Clés des statistiques par niveau de maîtrise
+MASTERY_STATISTICS = {
+    'e': 'expert',
+    'a': 'acquired',
+    'ec': 'in_progress',
+    'na': 'not_acquired',
+}
+
+
+def competence_summary_cache_key(grading_period_id, student_id):
+    return f'competence_summary:{grading_period_id}:{student_id}'
+
+
+def _empty_statistics():
+    statistics = {'total': 0}
+    statistics.update({key: 0 for key in MASTERY_STATISTICS.values()})
+    return statistics
+
+
+def build_competence_summaries(queryset, student_ids):
+    """
+    Construire les synthèses par domaine et par compétence
+
+    ``queryset`` est un queryset de ``CompetenceEvaluation`` déjà filtré
+    (période, droits d'accès). Renvoie un dictionnaire indexé par
+    identifiant d'élève (chaîne).
+    """
+    domain_labels = dict(Competence._meta.get_field('domain').choices)
+    level_labels = dict(CompetenceEvaluation.MASTERY_LEVELS)
+
+    rows = queryset.filter(student_id__in=student_ids).values(
+        'student_id', 'competence_id', 'competence__domain',
+        'competence__name', 'competence__code', 'mastery_level'
+    ).annotate(
+        count=Count('id'),
+        last_evaluated=Max('evaluated_at')
+    ).order_by()
+
+    summaries = {str(student_id): {} for student_id in student_ids}
+    competences = {}
+    last_evaluated = {}
+
+    for row in rows:
+        student_id = str(row['student_id'])
+        domain = row['competence__domain']
+        level = row['mastery_level']
+
+        summary = summaries.setdefault(student_id, {})
+        if domain not in summary:
+            summary[domain] = {
+                'label': domain_labels.get(domain, domain),
+                'competences': [],
+                'statistics': _empty_statistics(),
+            }
+        domain_summary = summary[domain]
+
+        statistics = domain_summary['statistics']
+        statistics['total'] += row['count']
+        if level in MASTERY_STATISTICS:
+            statistics[MASTERY_STATISTICS[level]] += row['count']
+
+        key = (student_id, row['competence_id'])
+        entry = competences.get(key)
+        if entry is None:
+            entry = {
+                'competence': row['competence__name'],
+                'code': row['competence__code'],
+                'mastery_level': level,
+                'mastery_level_display': level_labels.get(level, level),
+                'counts': {code: 0 for code in MASTERY_STATISTICS},
+            }
+            competences[key] = entry
+            last_evaluated[key] = row['last_evaluated']
+            domain_summary['competences'].append(entry)
+        elif row['last_evaluated'] > last_evaluated[key]:
+            # Le niveau retenu est celui de l'évaluation la plus récente
+            entry['mastery_level'] = level
+            entry['mastery_level_display'] = level_labels.get(level, level)
+            last_evaluated[key] = row['last_evaluated']
+
+        entry['counts'][level] = entry['counts'].get(level, 0) + row['count']
+
+    # Ordre d'affichage : domaines dans l'ordre des choix, compétences par nom
+    for student_id, summary in summaries.items():
+        for domain_summary in summary.values():
+            domain_summary['competences'].sort(key=lambda c: c['competence'])
+        summaries[student_id] = {
+            domain: summary[domain]
+            for domain in domain_labels
+            if domain in summary
+        }
+
+    return summaries
+
+
+def get_competence_summaries(queryset, student_ids, grading_period_id=None, use_cache=False):
+    """
+    Synthèses de plusieurs élèves, servies depuis le cache si possible
+
+    Le cache n'est utilisé que pour une période donnée et un queryset non
+    restreint par utilisateur (la clé ne dépend pas de qui consulte).
+    """
+    student_ids = [str(student_id) for student_id in student_ids]
+
+    if grading_period_id:
+        queryset = queryset.filter(grading_period_id=grading_period_id)
+
+    if not (use_cache and grading_period_id):
+        return build_competence_summaries(queryset, student_ids)
+
+    keys = {
+        student_id: competence_summary_cache_key(grading_period_id, student_id)
+        for student_id in student_ids
+    }
+    cached = cache.get_many(keys.values())
+
+    summaries = {}
+    missing = []
+    for student_id, key in keys.items():
+        if key in cached:
+            summaries[student_id] = cached[key]
+        else:
+            missing.append(student_id)
+
+    if missing:
+        computed = build_competence_summaries(queryset, missing)
+        cache.set_many(
+            {keys[student_id]: summary for student_id, summary in computed.items()},
+            timeout=COMPETENCE_SUMMARY_CACHE_TIMEOUT
+        )
+        summaries.update(computed)
+
+    return {student_id: summaries[student_id] for student_id in student_ids}
+
+
+def invalidate_competence_summary(grading_period_id, student_id):
+    """Supprimer la synthèse en cache d'un élève pour une période"""
+    cache.delete(competence_summary_cache_key(grading_period_id, student_id))
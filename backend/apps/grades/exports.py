@@ -0,0 +1,157 @@
+"""
+Exports en flux des notes (CSV et XLSX)
+
+Les lignes sont lues par paquets avec ``.iterator(chunk_size=...)`` et
+écrites au fil de l'eau : aucun export ne charge l'ensemble des notes en
+mémoire, même pour une période complète de tout l'établissement.
+
+Le CSV est envoyé pendant la lecture. Le classeur XLSX (une archive zip)
+n'est complet qu'une fois toutes les lignes écrites : il est construit
+dans un fichier temporaire, dont l'envoi ne commence qu'à la fin.
+"""
+import csv
+import tempfile
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.text import slugify
+
+from .models import Grade
+
+
+# Nombre de lignes lues par aller-retour avec la base
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+EXPORT_HEADERS = [
+    'Classe', 'Matière', 'Évaluation', 'Date', 'Nom', 'Prénom',
+    'Note', 'Sur', 'Note/20', 'Coefficient', 'Absent', 'Commentaire'
+]
+
+# Colonnes lues en base (pas d'instanciation de modèles)
+EXPORT_FIELDS = (
+    'evaluation__class_group__level__short_name',
+    'evaluation__class_group__name',
+    'evaluation__subject__name',
+    'evaluation__title',
+    'evaluation__date',
+    'student__last_name',
+    'student__first_name',
+    'score',
+    'evaluation__max_score',
+    'evaluation__coefficient',
+    'is_absent',
+    'comment',
+)
+
+
+class Echo:
+    """Pseudo-buffer : ``write`` renvoie la valeur au lieu de la stocker"""
+
+    def write(self, value):
+        return value
+
+
+def get_export_queryset(evaluation=None, class_id=None, grading_period_id=None, teacher=None):
+    """
+    Notes à exporter, pour une évaluation, une classe ou une période entière
+    """
+    queryset = Grade.objects.all()
+
+    if evaluation is not None:
+        queryset = queryset.filter(evaluation=evaluation)
+    if class_id:
+        queryset = queryset.filter(evaluation__class_group_id=class_id)
+    if grading_period_id:
+        queryset = queryset.filter(evaluation__grading_period_id=grading_period_id)
+    if teacher is not None:
+        queryset = queryset.filter(evaluation__teacher=teacher)
+
+    return queryset.order_by(
+        'evaluation__class_group__name',
+        'evaluation__subject__name',
+        'evaluation__date',
+        'evaluation_id',
+        'student__last_name',
+        'student__first_name'
+    )
+
+
+def iter_grade_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Générer les lignes d'export à partir d'un queryset de notes"""
+    values = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+    for (level_name, class_name, subject_name, title, eval_date, last_name,
+         first_name, score, max_score, coefficient, is_absent, comment) in values:
+        normalized = None
+        if score is not None and max_score:
+            normalized = (score * 20 / max_score).quantize(Decimal('0.01'))
+
+        yield [
+            f"{level_name} {class_name}",
+            subject_name,
+            title,
+            eval_date,
+            last_name,
+            first_name,
+            score,
+            max_score,
+            normalized,
+            coefficient,
+            'Oui' if is_absent else 'Non',
+            comment,
+        ]
+
+
+def _csv_value(value):
+    return '' if value is None else value
+
+
+def stream_csv(rows):
+    """Encoder les lignes en CSV au fur et à mesure"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def write_xlsx(rows, sheet_title='Notes'):
+    """
+    Écrire les lignes dans un classeur en mode write-only
+
+    Le classeur est construit dans un fichier temporaire (openpyxl y écrit
+    les lignes au fil de l'eau) qui est ensuite renvoyé par morceaux.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(EXPORT_HEADERS)
+    for row in rows:
+        sheet.append([float(value) if isinstance(value, Decimal) else value for value in row])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def build_export_response(queryset, export_format, filename):
+    """Construire la réponse HTTP en flux pour un export de notes"""
+    filename = slugify(filename) or 'notes'
+    rows = iter_grade_rows(queryset)
+
+    if export_format == 'xlsx':
+        return FileResponse(
+            write_xlsx(rows),
+            as_attachment=True,
+            filename=f"{filename}.xlsx",
+            content_type=XLSX_CONTENT_TYPE
+        )
+
+    response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
@@ -0,0 +1,36 @@
+"""
+Commande pour générer les bulletins PDF d'une période
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.grades.models import GradingPeriod
+from apps.grades.tasks import generate_report_cards
+
+
+class Command(BaseCommand):
+    help = 'Génère les bulletins PDF d\'une période (rendu parallèle, reprise par classe)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'grading_period_id',
+            type=str,
+            help='Identifiant de la période de notation'
+        )
+        
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regénérer aussi les classes déjà terminées'
+        )
+    
+    def handle(self, *args, **options):
+        if not GradingPeriod.objects.filter(id=options['grading_period_id']).exists():
+            raise CommandError('Période de notation introuvable')
+        
+        # Exécution synchrone : hors d'un worker Celery, le rendu utilise
+        # un pool de processus
+        result = generate_report_cards(
+            options['grading_period_id'],
+            force=options['force']
+        )
+        
+        self.stdout.write(self.style.SUCCESS(result))
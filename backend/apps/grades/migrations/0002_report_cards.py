@@ -0,0 +1,60 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0001_initial'),
+        ('schools', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCard',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pdf_file', models.FileField(blank=True, null=True, upload_to='bulletins/%Y/%m/', verbose_name='Bulletin PDF')),
+                ('generated_at', models.DateTimeField(blank=True, null=True, verbose_name='Généré le')),
+                ('class_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_cards', to='schools.class')),
+                ('grading_period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_cards', to='grades.gradingperiod')),
+                ('student', models.ForeignKey(limit_choices_to={'user_type': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='report_cards', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Bulletin',
+                'verbose_name_plural': 'Bulletins',
+                'db_table': 'report_cards',
+                'indexes': [models.Index(fields=['class_group', 'grading_period'], name='report_card_class_g_c5a8fb_idx')],
+                'unique_together': {('student', 'grading_period')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportCardBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('completed', 'Terminé'), ('failed', 'Échec')], default='pending', max_length=20, verbose_name='Statut')),
+                ('total_students', models.PositiveIntegerField(default=0, verbose_name="Nombre d'élèves")),
+                ('processed_students', models.PositiveIntegerField(default=0, verbose_name='Bulletins générés')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('class_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_card_batches', to='schools.class')),
+                ('grading_period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_card_batches', to='grades.gradingperiod')),
+            ],
+            options={
+                'verbose_name': 'Génération de bulletins',
+                'verbose_name_plural': 'Générations de bulletins',
+                'db_table': 'report_card_batches',
+                'unique_together': {('grading_period', 'class_group')},
+            },
+        ),
+    ]
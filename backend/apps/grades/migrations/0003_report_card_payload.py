@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0002_report_cards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportcard',
+            name='payload',
+            field=models.JSONField(blank=True, null=True, verbose_name='Contenu du bulletin'),
+        ),
+        migrations.AddField(
+            model_name='reportcard',
+            name='payload_etag',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Empreinte du contenu'),
+        ),
+        migrations.AddField(
+            model_name='reportcard',
+            name='payload_generated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Contenu calculé le'),
+        ),
+    ]
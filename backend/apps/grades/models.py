@@ -797,4 +797,123 @@ class CompetenceEvaluation(BaseModel):
         unique_together = ['student', 'competence', 'evaluation']
     
     def __str__(self):
-        return f"{self.student.get_full_name()} - {self.competence.code} - {self.get_mastery_level_display()}"
\ No newline at end of file
+        return f"{self.student.get_full_name()} - {self.competence.code} - {self.get_mastery_level_display()}"
+
+class ReportCard(BaseModel):
+    """
+    Bulletin PDF généré pour un élève et une période
+    """
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='report_cards',
+        limit_choices_to={'user_type': 'student'}
+    )
+    grading_period = models.ForeignKey(
+        GradingPeriod,
+        on_delete=models.CASCADE,
+        related_name='report_cards'
+    )
+    class_group = models.ForeignKey(
+        Class,
+        on_delete=models.CASCADE,
+        related_name='report_cards'
+    )
+    pdf_file = models.FileField(
+        upload_to='bulletins/%Y/%m/',
+        null=True,
+        blank=True,
+        verbose_name=_("Bulletin PDF")
+    )
+    generated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Généré le")
+    )
+    
+    # Contenu du bulletin pré-calculé à la publication (servi tel quel)
+    payload = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name=_("Contenu du bulletin")
+    )
+    payload_etag = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name=_("Empreinte du contenu")
+    )
+    payload_generated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Contenu calculé le")
+    )
+    
+    class Meta:
+        db_table = 'report_cards'
+        verbose_name = _("Bulletin")
+        verbose_name_plural = _("Bulletins")
+        unique_together = ['student', 'grading_period']
+        indexes = [
+            models.Index(fields=['class_group', 'grading_period']),
+        ]
+    
+    def __str__(self):
+        return f"Bulletin {self.student.get_full_name()} - {self.grading_period}"
+
+
+class ReportCardBatch(BaseModel):
+    """
+    Suivi de la génération des bulletins d'une classe pour une période
+    
+    Une classe terminée n'est pas regénérée lors d'une reprise.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('completed', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+    
+    grading_period = models.ForeignKey(
+        GradingPeriod,
+        on_delete=models.CASCADE,
+        related_name='report_card_batches'
+    )
+    class_group = models.ForeignKey(
+        Class,
+        on_delete=models.CASCADE,
+        related_name='report_card_batches'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name=_("Statut")
+    )
+    total_students = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Nombre d'élèves")
+    )
+    processed_students = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Bulletins générés")
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    
+    class Meta:
+        db_table = 'report_card_batches'
+        verbose_name = _("Génération de bulletins")
+        verbose_name_plural = _("Générations de bulletins")
+        unique_together = ['grading_period', 'class_group']
+    
+    def __str__(self):
+        return f"{self.class_group} - {self.grading_period} ({self.get_status_display()})"
+    
+    @property
+    def progress(self):
+        """Pourcentage d'avancement"""
+        if not self.total_students:
+            return 100 if self.status == 'completed' else 0
+        return round(self.processed_students / self.total_students * 100)
@@ -0,0 +1,133 @@
+"""
+Bulletins pré-calculés servis aux élèves et aux parents
+
+Le contenu de chaque bulletin (élève, période) est calculé une seule fois
+à la publication et stocké en JSON sur ``ReportCard``. Il n'est recalculé
+que si les notes, les absences ou le comportement de la période changent
+après publication (voir ``signals.py``).
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import ReportCard
+from .serializers import StudentReportCardSerializer
+from apps.schools.models import StudentClassEnrollment
+
+
+def build_report_card_payload(student_id, period):
+    """Calculer le contenu complet du bulletin (sérialisable en JSON)"""
+    serializer = StudentReportCardSerializer(
+        data={'student_id': str(student_id), 'grading_period_id': str(period.id)}
+    )
+    serializer.is_valid(raise_exception=True)
+
+    # Aller-retour JSON : dates et décimaux deviennent des chaînes
+    return json.loads(json.dumps(serializer.data, cls=DjangoJSONEncoder))
+
+
+def compute_etag(payload):
+    """Empreinte stable du contenu d'un bulletin"""
+    content = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def materialize_report_card(student_id, period, class_id=None):
+    """
+    Calculer et enregistrer le contenu du bulletin d'un élève
+
+    Renvoie le ``ReportCard`` mis à jour, ou ``None`` si l'élève n'est
+    inscrit dans aucune classe de l'année (le bulletin n'est alors pas
+    mis en cache).
+    """
+    if class_id is None:
+        class_id = StudentClassEnrollment.objects.filter(
+            student_id=student_id,
+            class_group__academic_year_id=period.academic_year_id
+        ).order_by('-is_active').values_list('class_group_id', flat=True).first()
+        if class_id is None:
+            return None
+
+    payload = build_report_card_payload(student_id, period)
+
+    report_card, _ = ReportCard.objects.update_or_create(
+        student_id=student_id,
+        grading_period=period,
+        defaults={
+            'class_group_id': class_id,
+            'payload': payload,
+            'payload_etag': compute_etag(payload),
+            'payload_generated_at': timezone.now(),
+        }
+    )
+    return report_card
+
+
+def materialize_class_report_cards(class_obj, period):
+    """Pré-calculer les bulletins de tous les élèves d'une classe"""
+    student_ids = StudentClassEnrollment.objects.filter(
+        class_group=class_obj,
+        is_active=True
+    ).values_list('student_id', flat=True)
+
+    count = 0
+    for student_id in student_ids:
+        materialize_report_card(student_id, period, class_id=class_obj.id)
+        count += 1
+    return count
+
+
+def invalidate_report_cards(grading_period_id, student_ids=None):
+    """
+    Marquer comme périmés les bulletins pré-calculés d'une période
+
+    Une seule requête UPDATE ; seuls les bulletins déjà calculés sont
+    touchés.
+    """
+    queryset = ReportCard.objects.filter(
+        grading_period_id=grading_period_id
+    ).exclude(payload_etag='')
+
+    if student_ids is not None:
+        queryset = queryset.filter(student_id__in=student_ids)
+
+    return queryset.update(payload=None, payload_etag='', payload_generated_at=None)
+
+
+def invalidate_student_report_cards(student_id, start_date, end_date=None):
+    """
+    Marquer comme périmés les bulletins d'un élève dont la période
+    recoupe ``start_date`` – ``end_date`` (une requête UPDATE)
+
+    Sert aux données datées hors notes : absences, comportement, sanctions.
+    """
+    return ReportCard.objects.filter(
+        student_id=student_id,
+        grading_period__start_date__lte=end_date or start_date,
+        grading_period__end_date__gte=start_date
+    ).exclude(payload_etag='').update(
+        payload=None, payload_etag='', payload_generated_at=None
+    )
+
+
+def get_cached_report_card(student_id, period):
+    """
+    Contenu pré-calculé du bulletin, recalculé à la volée s'il est périmé
+
+    Renvoie un tuple ``(payload, etag)`` ; ``etag`` vaut ``None`` si le
+    bulletin n'a pas pu être mis en cache.
+    """
+    report_card = ReportCard.objects.filter(
+        student_id=student_id,
+        grading_period=period
+    ).only('payload', 'payload_etag').first()
+
+    if report_card is not None and report_card.payload_etag:
+        return report_card.payload, report_card.payload_etag
+
+    report_card = materialize_report_card(student_id, period)
+    if report_card is None:
+        return build_report_card_payload(student_id, period), None
+    return report_card.payload, report_card.payload_etag
@@ -2,13 +2,15 @@
 Serializers pour la gestion des notes et évaluations
 """
 from rest_framework import serializers
-from django.db import transaction
+from django.db import models, transaction
 from django.db.models import Avg, Count, Q
 from decimal import Decimal
 from .models import (
     EvaluationType, GradingPeriod, Evaluation, Grade,
-    SubjectAverage, GeneralAverage, Competence, CompetenceEvaluation
+    SubjectAverage, GeneralAverage, Competence, CompetenceEvaluation,
+    ReportCardBatch
 )
+from apps.authentication.models import User
 from apps.authentication.serializers import UserSerializer
 from apps.timetable.serializers import SubjectSerializer
 from apps.schools.serializers import ClassSerializer
@@ -351,6 +353,29 @@ class CompetenceEvaluationSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class ReportCardBatchSerializer(serializers.ModelSerializer):
+    """Serializer pour l'avancement de la génération des bulletins"""
+    class_name = serializers.CharField(
+        source='class_group.__str__',
+        read_only=True
+    )
+    status_display = serializers.CharField(
+        source='get_status_display',
+        read_only=True
+    )
+    progress = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = ReportCardBatch
+        fields = [
+            'id', 'grading_period', 'class_group', 'class_name',
+            'status', 'status_display', 'total_students',
+            'processed_students', 'progress', 'started_at',
+            'finished_at', 'error_message'
+        ]
+        read_only_fields = fields
+
+
 class StudentReportCardSerializer(serializers.Serializer):
     """
     Serializer pour générer le bulletin d'un élève
@@ -0,0 +1,116 @@
+"""
+Signaux Django pour les notes
+
+Invalident les bulletins pré-calculés lorsqu'une donnée de la période
+change après leur publication : notes et moyennes, mais aussi absences,
+comportement et sanctions, résumés dans le bulletin.
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from apps.attendance.models import AbsencePeriod, Attendance, Sanction, StudentBehavior
+from .models import Evaluation, Grade, SubjectAverage, GeneralAverage, CompetenceEvaluation
+from .report_cards import invalidate_report_cards, invalidate_student_report_cards
+from .competences import invalidate_competence_summary
+
+
+@receiver([post_save, post_delete], sender=Grade)
+def invalidate_report_card_on_grade_change(sender, instance, **kwargs):
+    """Une note modifiée périme le bulletin de l'élève"""
+    if Grade.evaluation.is_cached(instance):
+        grading_period_id = instance.evaluation.grading_period_id
+    else:
+        # Seule la période est lue, sans charger l'évaluation
+        grading_period_id = Evaluation.objects.filter(
+            pk=instance.evaluation_id
+        ).values_list('grading_period_id', flat=True).first()
+    if grading_period_id:
+        invalidate_report_cards(grading_period_id, student_ids=[instance.student_id])
+
+
+@receiver([post_save, post_delete], sender=SubjectAverage)
+@receiver([post_save, post_delete], sender=GeneralAverage)
+@receiver([post_save, post_delete], sender=CompetenceEvaluation)
+def invalidate_report_card_on_average_change(sender, instance, **kwargs):
+    """Moyennes, appréciations et compétences figurent dans le bulletin"""
+    invalidate_report_cards(
+        instance.grading_period_id,
+        student_ids=[instance.student_id]
+    )
+
+
+@receiver([post_save, post_delete], sender=CompetenceEvaluation)
+def invalidate_competence_summary_on_change(sender, instance, **kwargs):
+    """La synthèse des compétences en cache est périmée"""
+    invalidate_competence_summary(instance.grading_period_id, instance.student_id)
+
+
+# Données datées résumées dans le bulletin : champs de début et de fin
+DATED_SOURCES = {
+    Attendance: ('date', 'date'),
+    AbsencePeriod: ('start_date', 'end_date'),
+    StudentBehavior: ('date', 'date'),
+    Sanction: ('date', 'date'),
+}
+
+
+def _dated_span(instance, saved=None):
+    """
+    (élève, début, fin) de l'enregistrement, sans charger de champ différé
+
+    Les champs différés sont repris de ``saved``, les valeurs en base.
+    """
+    start_field, end_field = DATED_SOURCES[type(instance)]
+    values = {
+        **dict(zip(('student_id', start_field, end_field), saved or ())),
+        **instance.__dict__,
+    }
+    return (
+        values.get('student_id'),
+        values.get(start_field),
+        values.get(end_field) or values.get(start_field)
+    )
+
+
+@receiver(pre_save, sender=Attendance)
+@receiver(pre_save, sender=AbsencePeriod)
+@receiver(pre_save, sender=StudentBehavior)
+@receiver(pre_save, sender=Sanction)
+def remember_dated_span(sender, instance, update_fields=None, **kwargs):
+    """
+    Dates enregistrées : un déplacement hors de la période la périme aussi
+
+    Lues en base avant la mise à jour, sauf à la création ou lorsque
+    ``update_fields`` ne touche ni l'élève ni des dates déjà chargées.
+    """
+    instance._report_card_span = None
+    if instance._state.adding:
+        return
+
+    start_field, end_field = DATED_SOURCES[sender]
+    fields = {'student_id', start_field, end_field}
+    if (
+        update_fields is not None
+        and not (fields | {'student'}) & set(update_fields)
+        and fields <= instance.__dict__.keys()
+    ):
+        return
+
+    instance._report_card_span = sender.objects.filter(pk=instance.pk).values_list(
+        'student_id', start_field, end_field
+    ).first()
+
+
+@receiver([post_save, post_delete], sender=Attendance)
+@receiver([post_save, post_delete], sender=AbsencePeriod)
+@receiver([post_save, post_delete], sender=StudentBehavior)
+@receiver([post_save, post_delete], sender=Sanction)
+def invalidate_report_card_on_dated_change(sender, instance, **kwargs):
+    """Absences, justifications, comportement et sanctions du bulletin"""
+    saved = instance.__dict__.pop('_report_card_span', None)
+    spans = {_dated_span(instance, saved)}
+    if saved:
+        student_id, start_date, end_date = saved
+        spans.add((student_id, start_date, end_date or start_date))
+    for student_id, start_date, end_date in spans:
+        if student_id and start_date:
+            invalidate_student_report_cards(student_id, start_date, end_date)
@@ -6,10 +6,13 @@ from django.db.models import Avg, Count, Q
 from decimal import Decimal
 from .models import (
     Evaluation, Grade, SubjectAverage, GeneralAverage,
-    GradingPeriod
+    GradingPeriod, ReportCardBatch
 )
+from .bulletins import bulletin_executor, generate_class_bulletins
+from .report_cards import materialize_class_report_cards
 from apps.schools.models import Class
 from apps.authentication.models import User
+from apps.timetable.models import Subject
 
 
 @shared_task
@@ -153,26 +156,45 @@ def calculate_class_rankings(class_id, grading_period_id):
 
 
 @shared_task
-def generate_report_cards(grading_period_id):
+def generate_report_cards(grading_period_id, force=False):
     """
     Générer tous les bulletins d'une période
+    
+    Les classes déjà terminées sont ignorées (reprise après interruption),
+    sauf si ``force`` est vrai.
     """
     period = GradingPeriod.objects.get(id=grading_period_id)
     
     # Récupérer toutes les classes de l'année scolaire
     classes = Class.objects.filter(academic_year=period.academic_year)
     
+    if not force:
+        completed = ReportCardBatch.objects.filter(
+            grading_period=period,
+            status='completed'
+        ).values_list('class_group_id', flat=True)
+        classes = classes.exclude(id__in=completed)
+    
     total_bulletins = 0
+    failed_classes = 0
     
-    for class_obj in classes:
-        # S'assurer que les moyennes sont calculées
-        calculate_class_averages(class_obj.id, period.id)
-        
-        # Générer les bulletins PDF
-        # TODO: Implémenter la génération PDF avec ReportLab ou WeasyPrint
-        
-        total_bulletins += class_obj.students.filter(is_active=True).count()
+    with bulletin_executor() as executor:
+        for class_obj in classes.select_related('level'):
+            # S'assurer que les moyennes sont calculées
+            calculate_class_averages(class_obj.id, period.id)
+            
+            # Pré-calculer le contenu des bulletins servi par l'API
+            materialize_class_report_cards(class_obj, period)
+            
+            # Générer les bulletins PDF
+            batch = generate_class_bulletins(class_obj, period, executor)
+            
+            total_bulletins += batch.processed_students
+            if batch.status == 'failed':
+                failed_classes += 1
     
+    if failed_classes:
+        return f"{total_bulletins} bulletins générés, {failed_classes} classe(s) en échec"
     return f"{total_bulletins} bulletins générés"
 
 
@@ -0,0 +1,141 @@
+"""
+Fixtures pour les tests du module notes
+"""
+import pytest
+from datetime import date
+from apps.authentication.models import User
+from apps.schools.models import School, AcademicYear, Level, Class
+from apps.timetable.models import Subject
+from apps.grades.models import EvaluationType, GradingPeriod, Evaluation
+
+
+@pytest.fixture
+def teacher():
+    """Créer un professeur de test"""
+    return User.objects.create_user(
+        email='prof@test.com',
+        username='proftest',
+        password='testpass123',
+        first_name='Prof',
+        last_name='Test',
+        user_type='teacher'
+    )
+
+
+@pytest.fixture
+def school():
+    """Créer un établissement de test"""
+    return School.objects.create(
+        name='Lycée Test',
+        school_type='lycee',
+        address='1 rue du Test',
+        postal_code='75000',
+        city='Paris',
+        phone='0123456789',
+        email='contact@lyceetest.fr',
+        subdomain='lycee-test'
+    )
+
+
+@pytest.fixture
+def academic_year(school):
+    """Créer une année scolaire de test"""
+    return AcademicYear.objects.create(
+        school=school,
+        name='2024-2025',
+        start_date=date(2024, 9, 1),
+        end_date=date(2025, 6, 30),
+        is_current=True
+    )
+
+
+@pytest.fixture
+def class_group(school, academic_year, teacher):
+    """Créer une classe de test"""
+    level = Level.objects.create(
+        name='Seconde',
+        short_name='2nde',
+        order=10,
+        school_type='lycee'
+    )
+    
+    return Class.objects.create(
+        school=school,
+        academic_year=academic_year,
+        level=level,
+        name='A',
+        main_teacher=teacher,
+        max_students=30
+    )
+
+
+@pytest.fixture
+def students(class_group):
+    """Trois élèves inscrits dans la classe"""
+    students = []
+    for i in range(3):
+        student = User.objects.create_user(
+            email=f'student{i}@test.com',
+            username=f'student{i}',
+            password='testpass123',
+            first_name='Student',
+            last_name=f'{i}',
+            user_type='student'
+        )
+        class_group.students.create(student=student, is_active=True)
+        students.append(student)
+    return students
+
+
+@pytest.fixture
+def student(students):
+    return students[0]
+
+
+@pytest.fixture
+def subject():
+    """Créer une matière de test"""
+    return Subject.objects.create(
+        name='Mathématiques',
+        short_name='MATH',
+        coefficient=4.0
+    )
+
+
+@pytest.fixture
+def grading_period(academic_year):
+    """Premier trimestre"""
+    return GradingPeriod.objects.create(
+        academic_year=academic_year,
+        name='Trimestre 1',
+        number=1,
+        start_date=date(2024, 9, 1),
+        end_date=date(2024, 11, 30)
+    )
+
+
+@pytest.fixture
+def next_grading_period(academic_year):
+    """Deuxième trimestre"""
+    return GradingPeriod.objects.create(
+        academic_year=academic_year,
+        name='Trimestre 2',
+        number=2,
+        start_date=date(2024, 12, 1),
+        end_date=date(2025, 3, 15)
+    )
+
+
+@pytest.fixture
+def evaluation(subject, class_group, teacher, grading_period):
+    """Créer une évaluation de test"""
+    evaluation_type = EvaluationType.objects.create(name='Devoir surveillé', short_name='DS')
+    return Evaluation.objects.create(
+        title='Contrôle 1',
+        evaluation_type=evaluation_type,
+        subject=subject,
+        class_group=class_group,
+        teacher=teacher,
+        grading_period=grading_period,
+        date=date(2024, 10, 10)
+    )
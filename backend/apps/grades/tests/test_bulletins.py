@@ -0,0 +1,171 @@
+"""
+Tests de la génération des bulletins PDF
+"""
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pytest
+from apps.grades import bulletins
+from apps.grades.bulletins import (
+    BilliardExecutor, bulletin_executor, collect_class_bulletin_data, render_bulletin_pdf
+)
+from apps.grades.models import GeneralAverage, ReportCard, ReportCardBatch, SubjectAverage
+from apps.grades.tasks import generate_report_cards
+
+
+def bulletin_data(**overrides):
+    return {
+        'student_id': '1',
+        'student_name': 'Élève <Test>',
+        'class_name': '2nde A',
+        'period_name': 'Trimestre 1',
+        'general_average': '12.50',
+        'class_average': '11.00',
+        'rank': 2,
+        'class_size': 3,
+        'honor_roll': 'Compliments',
+        'council_decision': 'Passage',
+        'general_appreciation': 'Bon trimestre & travail sérieux',
+        'subjects': [{
+            'subject': 'Mathématiques',
+            'average': '12.50',
+            'class_average': '11.00',
+            'min_average': '8.00',
+            'max_average': '15.00',
+            'rank': 2,
+            'appreciation': 'Peut mieux faire <encore>',
+        }],
+        'absences': 1,
+        'justified_absences': 1,
+        'delays': 0,
+        **overrides,
+    }
+
+
+@contextmanager
+def serial_executor():
+    yield None
+
+
+@pytest.fixture
+def averages(students, subject, grading_period, class_group):
+    for rank, (student, value) in enumerate(zip(students[:2], ['14.25', '9.5']), start=1):
+        SubjectAverage.objects.create(
+            student=student,
+            subject=subject,
+            grading_period=grading_period,
+            class_group=class_group,
+            average=Decimal(value),
+            class_average=Decimal('11.875'),
+            rank=rank,
+            appreciation='Travail régulier'
+        )
+    GeneralAverage.objects.create(
+        student=students[0],
+        grading_period=grading_period,
+        class_group=class_group,
+        average=Decimal('14.25'),
+        weighted_average=Decimal('14.25'),
+        class_average=Decimal('11.875'),
+        rank=1,
+        class_size=3,
+        honor_roll='compliments',
+        council_decision='passed'
+    )
+
+
+@pytest.mark.django_db
+class TestCollectClassBulletinData:
+
+    def test_collects_class_in_grouped_queries(
+        self, class_group, students, grading_period, averages, django_assert_max_num_queries
+    ):
+        with django_assert_max_num_queries(5):
+            data = collect_class_bulletin_data(class_group, grading_period)
+
+        assert [row['student_id'] for row in data] == [str(student.id) for student in students]
+
+        first, second, third = data
+        assert first['general_average'] == '14.25'
+        assert (first['rank'], first['class_size']) == (1, 3)
+        assert first['honor_roll'] == 'Compliments'
+        assert first['council_decision'] == 'Passage'
+        assert first['subjects'] == [{
+            'subject': 'Mathématiques',
+            'average': '14.25',
+            'class_average': '11.88',
+            'min_average': '-',
+            'max_average': '-',
+            'rank': 1,
+            'appreciation': 'Travail régulier',
+        }]
+        assert first['period_name'] == str(grading_period)
+
+        # Sans moyenne générale : valeurs par défaut
+        assert second['general_average'] == '-'
+        assert second['honor_roll'] == '' and second['rank'] is None
+        assert len(second['subjects']) == 1
+        assert third['subjects'] == []
+        assert third['absences'] == 0
+
+
+class TestRenderBulletinPdf:
+
+    def test_markup_in_text_is_escaped(self):
+        pdf = render_bulletin_pdf(bulletin_data(
+            period_name='Trimestre <b>1',
+            honor_roll='Félicitations & encouragements',
+            council_decision='Passage <i>sous réserve'
+        ))
+
+        assert pdf.startswith(b'%PDF')
+
+    def test_daemon_process_renders_in_billiard_pool(self, monkeypatch):
+        monkeypatch.setattr(bulletins, '_in_daemon_process', lambda: True)
+
+        with bulletin_executor(max_workers=2) as executor:
+            assert isinstance(executor, BilliardExecutor)
+            pdfs = list(executor.map(render_bulletin_pdf, [bulletin_data(), bulletin_data()], chunksize=1))
+
+        assert len(pdfs) == 2
+        assert all(pdf.startswith(b'%PDF') for pdf in pdfs)
+
+
+@pytest.mark.django_db
+class TestGenerateReportCards:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path, monkeypatch):
+        settings.MEDIA_ROOT = str(tmp_path)
+        monkeypatch.setattr('apps.grades.tasks.bulletin_executor', serial_executor)
+
+    def test_completed_classes_are_skipped(self, class_group, students, grading_period):
+        ReportCardBatch.objects.create(
+            grading_period=grading_period, class_group=class_group, status='completed'
+        )
+
+        assert generate_report_cards(grading_period.id) == '0 bulletins générés'
+        assert not ReportCard.objects.exclude(pdf_file='').exists()
+
+        assert generate_report_cards(grading_period.id, force=True) == '3 bulletins générés'
+        assert ReportCard.objects.exclude(pdf_file='').count() == len(students)
+
+    def test_failed_class_is_resumed(self, class_group, students, grading_period, monkeypatch):
+        def failing_render(data):
+            raise RuntimeError('Police introuvable')
+
+        monkeypatch.setattr(bulletins, 'render_bulletin_pdf', failing_render)
+        result = generate_report_cards(grading_period.id)
+
+        assert result == '0 bulletins générés, 1 classe(s) en échec'
+        batch = ReportCardBatch.objects.get(grading_period=grading_period, class_group=class_group)
+        assert batch.status == 'failed'
+        assert batch.error_message == 'Police introuvable'
+
+        monkeypatch.setattr(bulletins, 'render_bulletin_pdf', render_bulletin_pdf)
+        assert generate_report_cards(grading_period.id) == '3 bulletins générés'
+
+        batch.refresh_from_db()
+        assert batch.status == 'completed'
+        assert (batch.total_students, batch.processed_students) == (3, 3)
+        assert generate_report_cards(grading_period.id) == '0 bulletins générés'
@@ -0,0 +1,146 @@
+"""
+Tests des synthèses de compétences
+"""
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.authentication.models import User
+from apps.grades.competences import build_competence_summaries, get_competence_summaries
+from apps.grades.models import Competence, CompetenceEvaluation
+from apps.grades.views import CompetenceEvaluationViewSet
+
+student_summary = CompetenceEvaluationViewSet.as_view({'get': 'student_summary'})
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    from django.core.cache import cache
+    cache.clear()
+    return cache
+
+
+@pytest.fixture
+def competences():
+    return {
+        'lire': Competence.objects.create(name='Lire', code='L1', domain='languages'),
+        'argumenter': Competence.objects.create(name='Argumenter', code='L2', domain='languages'),
+        'cooperer': Competence.objects.create(name='Coopérer', code='C1', domain='citizenship'),
+    }
+
+
+def evaluate(student, competence, period, level, evaluation=None, days_ago=0):
+    competence_evaluation = CompetenceEvaluation.objects.create(
+        student=student,
+        competence=competence,
+        evaluation=evaluation,
+        grading_period=period,
+        mastery_level=level
+    )
+    CompetenceEvaluation.objects.filter(pk=competence_evaluation.pk).update(
+        evaluated_at=timezone.now() - timedelta(days=days_ago)
+    )
+    return competence_evaluation
+
+
+@pytest.fixture
+def evaluations(students, competences, grading_period, evaluation):
+    first, second, _ = students
+    evaluate(first, competences['lire'], grading_period, 'na', days_ago=10)
+    evaluate(first, competences['lire'], grading_period, 'a', evaluation, days_ago=1)
+    evaluate(first, competences['argumenter'], grading_period, 'ec')
+    evaluate(first, competences['cooperer'], grading_period, 'e')
+    evaluate(second, competences['lire'], grading_period, 'e')
+
+
+@pytest.mark.django_db
+class TestCompetenceSummaries:
+
+    def test_grouped_by_domain_and_competence(self, students, evaluations, django_assert_num_queries):
+        ids = [student.id for student in students]
+
+        with django_assert_num_queries(1):
+            summaries = build_competence_summaries(CompetenceEvaluation.objects.all(), ids)
+
+        first = summaries[str(students[0].id)]
+        # Domaines dans l'ordre des choix du modèle
+        assert list(first) == ['languages', 'citizenship']
+
+        languages = first['languages']
+        assert languages['label'] == 'Langages'
+        assert languages['statistics'] == {
+            'total': 3, 'expert': 0, 'acquired': 1, 'in_progress': 1, 'not_acquired': 1
+        }
+        assert [entry['competence'] for entry in languages['competences']] == ['Argumenter', 'Lire']
+
+        lire = languages['competences'][1]
+        # Niveau de l'évaluation la plus récente, historique compté
+        assert lire['mastery_level'] == 'a'
+        assert lire['mastery_level_display'] == 'Acquis'
+        assert lire['counts'] == {'e': 0, 'a': 1, 'ec': 0, 'na': 1}
+
+        assert first['citizenship']['statistics']['expert'] == 1
+        assert list(summaries[str(students[1].id)]) == ['languages']
+        assert summaries[str(students[2].id)] == {}
+
+    def test_cache_is_invalidated_by_new_evaluation(
+        self, locmem_cache, students, competences, grading_period, evaluations,
+        django_assert_num_queries
+    ):
+        student = students[1]
+        queryset = CompetenceEvaluation.objects.all()
+
+        summaries = get_competence_summaries(queryset, [student.id], grading_period.id, use_cache=True)
+        assert summaries[str(student.id)]['languages']['statistics']['total'] == 1
+
+        with django_assert_num_queries(0):
+            get_competence_summaries(queryset, [student.id], grading_period.id, use_cache=True)
+
+        evaluate(student, competences['cooperer'], grading_period, 'a')
+
+        summaries = get_competence_summaries(queryset, [student.id], grading_period.id, use_cache=True)
+        assert list(summaries[str(student.id)]) == ['languages', 'citizenship']
+
+        CompetenceEvaluation.objects.filter(student=student, competence=competences['lire']).get().delete()
+
+        summaries = get_competence_summaries(queryset, [student.id], grading_period.id, use_cache=True)
+        assert list(summaries[str(student.id)]) == ['citizenship']
+
+    def test_class_wide_summary(self, locmem_cache, class_group, students, grading_period, evaluations):
+        admin = User.objects.create_user(
+            email='admin@test.com', username='admintest', password='testpass123', user_type='admin'
+        )
+        request = APIRequestFactory().get('/competence-evaluations/student_summary/', {
+            'class_id': str(class_group.id),
+            'grading_period_id': str(grading_period.id),
+        })
+        force_authenticate(request, user=admin)
+
+        response = student_summary(request)
+
+        assert response.status_code == 200
+        assert response.data['class_id'] == str(class_group.id)
+        assert set(response.data['students']) == {str(student.id) for student in students}
+        assert response.data['students'][str(students[0].id)]['languages']['statistics']['total'] == 3
+        assert response.data['students'][str(students[2].id)] == {}
+
+    def test_class_wide_summary_is_restricted(self, class_group, students):
+        request = APIRequestFactory().get('/competence-evaluations/student_summary/', {
+            'class_id': str(class_group.id)
+        })
+        force_authenticate(request, user=students[0])
+
+        assert student_summary(request).status_code == 403
+
+    def test_invalid_identifiers_are_rejected(self, teacher, class_group, grading_period):
+        for params in [
+            {'class_id': 'pas-un-uuid'},
+            {'class_id': str(class_group.id), 'grading_period_id': '42'},
+            {'student_id': str(teacher.id), 'grading_period_id': 'trimestre-1'},
+        ]:
+            request = APIRequestFactory().get('/competence-evaluations/student_summary/', params)
+            force_authenticate(request, user=teacher)
+
+            assert student_summary(request).status_code == 400
@@ -0,0 +1,122 @@
+"""
+Tests des exports de notes (CSV et XLSX)
+"""
+import csv
+import io
+from decimal import Decimal
+
+import pytest
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.authentication.models import User
+from apps.grades.exports import EXPORT_HEADERS
+from apps.grades.models import Evaluation, Grade
+from apps.grades.views import EvaluationViewSet, GradingPeriodViewSet
+from apps.schools.models import Class
+
+export_evaluation = EvaluationViewSet.as_view({'get': 'export_grades'})
+export_period = GradingPeriodViewSet.as_view({'get': 'export_grades'})
+
+
+def call(view, user, pk, **params):
+    request = APIRequestFactory().get('/export/', params)
+    force_authenticate(request, user=user)
+    return view(request, pk=str(pk))
+
+
+def csv_rows(response):
+    content = b''.join(response.streaming_content).decode()
+    return list(csv.reader(io.StringIO(content)))
+
+
+@pytest.fixture
+def admin():
+    return User.objects.create_user(
+        email='admin@test.com',
+        username='admintest',
+        password='testpass123',
+        user_type='admin'
+    )
+
+
+@pytest.fixture
+def other_class(class_group):
+    return Class.objects.create(
+        school=class_group.school,
+        academic_year=class_group.academic_year,
+        level=class_group.level,
+        name='B',
+        max_students=30
+    )
+
+
+@pytest.fixture
+def graded(evaluation, students, other_class, teacher):
+    """Notes de la classe A et d'une évaluation d'un autre professeur en classe B"""
+    for student, score in zip(students, ['15', '8', None]):
+        Grade.objects.create(
+            evaluation=evaluation,
+            student=student,
+            score=Decimal(score) if score else None,
+            is_absent=score is None
+        )
+
+    colleague = User.objects.create_user(
+        email='collegue@test.com', username='collegue', password='testpass123', user_type='teacher'
+    )
+    other = Evaluation.objects.create(
+        title='Contrôle B',
+        evaluation_type=evaluation.evaluation_type,
+        subject=evaluation.subject,
+        class_group=other_class,
+        teacher=colleague,
+        grading_period=evaluation.grading_period,
+        date=evaluation.date
+    )
+    Grade.objects.create(evaluation=other, student=students[0], score=Decimal('12'))
+    return other
+
+
+@pytest.mark.django_db
+class TestGradeExports:
+
+    def test_evaluation_scope(self, teacher, evaluation, graded):
+        response = call(export_evaluation, teacher, evaluation.id)
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/csv'
+        rows = csv_rows(response)
+        assert rows[0] == EXPORT_HEADERS
+        assert len(rows) == 4
+        assert {row[2] for row in rows[1:]} == {'Contrôle 1'}
+        assert [row[6] for row in rows[1:]] == ['15.00', '8.00', '']
+        assert rows[3][10] == 'Oui'
+
+    def test_class_scope(self, admin, grading_period, other_class, graded):
+        response = call(export_period, admin, grading_period.id, class_id=str(other_class.id))
+
+        rows = csv_rows(response)
+        assert [row[2] for row in rows[1:]] == ['Contrôle B']
+        assert rows[1][0] == '2nde B'
+
+    def test_period_scope(self, admin, teacher, grading_period, graded):
+        rows = csv_rows(call(export_period, admin, grading_period.id))
+        assert len(rows) == 5
+
+        # Un professeur n'exporte que ses propres évaluations
+        rows = csv_rows(call(export_period, teacher, grading_period.id))
+        assert {row[2] for row in rows[1:]} == {'Contrôle 1'}
+
+    def test_xlsx_export(self, admin, grading_period, graded):
+        from openpyxl import load_workbook
+
+        response = call(export_period, admin, grading_period.id, file_format='xlsx')
+
+        assert response.status_code == 200
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook.active.values)
+        assert list(rows[0]) == EXPORT_HEADERS
+        assert len(rows) == 5
+
+    def test_invalid_parameters_are_rejected(self, admin, grading_period):
+        assert call(export_period, admin, grading_period.id, class_id='pas-un-uuid').status_code == 400
+        assert call(export_period, admin, grading_period.id, file_format='pdf').status_code == 400
@@ -0,0 +1,131 @@
+"""
+Tests des bulletins pré-calculés et de leur invalidation
+"""
+import pytest
+from datetime import date
+from decimal import Decimal
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.attendance.models import Sanction, StudentBehavior
+from apps.grades.models import Grade, ReportCard
+from apps.grades.report_cards import get_cached_report_card, materialize_report_card
+from apps.grades.views import student_report_card
+
+
+def cached_etag(student, period):
+    return ReportCard.objects.get(student=student, grading_period=period).payload_etag
+
+
+@pytest.mark.django_db
+class TestReportCardInvalidation:
+    """Les données résumées dans le bulletin le périment"""
+
+    def test_payload_includes_sanctions(self, student, grading_period):
+        Sanction.objects.create(student=student, sanction_type='warning', date=date(2024, 10, 1))
+
+        payload, etag = get_cached_report_card(student.id, grading_period)
+
+        assert etag
+        assert payload['behavior_summary']['sanctions_count'] == 1
+
+    def test_sanction_invalidates_period(self, student, grading_period, next_grading_period):
+        materialize_report_card(student.id, grading_period)
+        materialize_report_card(student.id, next_grading_period)
+
+        Sanction.objects.create(student=student, sanction_type='warning', date=date(2024, 10, 1))
+
+        assert cached_etag(student, grading_period) == ''
+        assert cached_etag(student, next_grading_period) != ''
+        payload, _ = get_cached_report_card(student.id, grading_period)
+        assert payload['behavior_summary']['sanctions_count'] == 1
+
+    def test_moved_record_invalidates_both_periods(self, student, grading_period, next_grading_period):
+        behavior = StudentBehavior.objects.create(
+            student=student,
+            date=date(2024, 10, 1),
+            behavior_type='positive',
+            description='Participation',
+            points=2
+        )
+        materialize_report_card(student.id, grading_period)
+        materialize_report_card(student.id, next_grading_period)
+
+        behavior = StudentBehavior.objects.get(pk=behavior.pk)
+        behavior.date = date(2025, 1, 10)
+        behavior.save()
+
+        assert cached_etag(student, grading_period) == ''
+        assert cached_etag(student, next_grading_period) == ''
+
+    def test_moved_deferred_record_invalidates_both_periods(
+        self, student, grading_period, next_grading_period
+    ):
+        sanction = Sanction.objects.create(
+            student=student, sanction_type='warning', date=date(2024, 10, 1)
+        )
+        materialize_report_card(student.id, grading_period)
+        materialize_report_card(student.id, next_grading_period)
+
+        # Dates non chargées : la date d'origine est lue en base
+        sanction = Sanction.objects.only('id').get(pk=sanction.pk)
+        sanction.date = date(2025, 1, 10)
+        sanction.save(update_fields=['date'])
+
+        assert cached_etag(student, grading_period) == ''
+        assert cached_etag(student, next_grading_period) == ''
+
+    def test_grade_invalidates_its_period(self, student, evaluation, grading_period, next_grading_period):
+        materialize_report_card(student.id, grading_period)
+        materialize_report_card(student.id, next_grading_period)
+
+        grade = Grade(evaluation_id=evaluation.id, student=student, score=Decimal('12'))
+        grade.save()
+
+        assert cached_etag(student, grading_period) == ''
+        assert cached_etag(student, next_grading_period) != ''
+        # La période est lue sans charger l'évaluation
+        assert not Grade.evaluation.is_cached(grade)
+
+    def test_deletion_invalidates(self, student, grading_period):
+        sanction = Sanction.objects.create(
+            student=student, sanction_type='warning', date=date(2024, 10, 1)
+        )
+        materialize_report_card(student.id, grading_period)
+
+        sanction.delete()
+
+        assert cached_etag(student, grading_period) == ''
+
+
+@pytest.mark.django_db
+class TestStudentReportCardView:
+    """Validation des paramètres de la vue"""
+
+    def test_invalid_student_id_is_rejected(self, teacher, grading_period):
+        grading_period.bulletins_published = True
+        grading_period.save()
+
+        request = APIRequestFactory().get('/api/v1/grades/report-card/', {
+            'student_id': 'pas-un-uuid',
+            'grading_period_id': str(grading_period.id)
+        })
+        force_authenticate(request, user=teacher)
+
+        response = student_report_card(request)
+
+        assert response.status_code == 400
+        assert 'student_id' in response.data
+
+    def test_published_card_is_served_with_etag(self, teacher, student, grading_period):
+        grading_period.bulletins_published = True
+        grading_period.save()
+
+        request = APIRequestFactory().get('/api/v1/grades/report-card/', {
+            'student_id': str(student.id),
+            'grading_period_id': str(grading_period.id)
+        })
+        force_authenticate(request, user=teacher)
+
+        response = student_report_card(request)
+
+        assert response.status_code == 200
+        assert response['ETag']
@@ -7,10 +7,10 @@ from rest_framework.response import Response
 from django.db.models import Avg, Count, Q, Prefetch, Min, Max
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
 from django_filters import rest_framework as filters
 from datetime import date
-import csv
-from io import StringIO
+import uuid
 
 from .models import (
     EvaluationType, GradingPeriod, Evaluation, Grade,
@@ -22,8 +22,11 @@ from .serializers import (
     EvaluationCreateSerializer, GradeSerializer, BulkGradeSerializer,
     SubjectAverageSerializer, GeneralAverageSerializer,
     CompetenceSerializer, CompetenceEvaluationSerializer,
-    StudentReportCardSerializer
+    StudentReportCardSerializer, ReportCardBatchSerializer
 )
+from .exports import EXPORT_FORMATS, build_export_response, get_export_queryset
+from .report_cards import get_cached_report_card
+from .competences import get_competence_summaries
 from .tasks import (
     calculate_class_averages, generate_report_cards,
     send_grade_notifications
@@ -94,6 +97,70 @@ class GradingPeriodViewSet(viewsets.ModelViewSet):
             'message': 'Publication des bulletins lancée',
             'period': GradingPeriodSerializer(period).data
         })
+    
+    @action(detail=True, methods=['get'])
+    def bulletin_progress(self, request, pk=None):
+        """Avancement de la génération des bulletins, classe par classe"""
+        period = self.get_object()
+        
+        batches = period.report_card_batches.select_related(
+            'class_group__level'
+        ).order_by('class_group__level__order', 'class_group__name')
+        
+        totals = {
+            'classes': len(batches),
+            'completed_classes': sum(1 for b in batches if b.status == 'completed'),
+            'failed_classes': sum(1 for b in batches if b.status == 'failed'),
+            'total_students': sum(b.total_students for b in batches),
+            'processed_students': sum(b.processed_students for b in batches),
+        }
+        
+        return Response({
+            'period': GradingPeriodSerializer(period).data,
+            'totals': totals,
+            'classes': ReportCardBatchSerializer(batches, many=True).data
+        })
+    
+    @action(detail=True, methods=['get'])
+    def export_grades(self, request, pk=None):
+        """Exporter les notes d'une période, éventuellement limitée à une classe"""
+        period = self.get_object()
+        user = request.user
+        
+        if user.user_type not in ['teacher', 'admin', 'superadmin']:
+            return Response(
+                {'error': 'Export réservé aux professeurs et administrateurs'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Format non supporté. Formats disponibles : {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        class_id = request.query_params.get('class_id')
+        filename = f"notes_{period.name}"
+        if class_id:
+            try:
+                class_id = str(uuid.UUID(class_id.strip()))
+            except ValueError:
+                return Response(
+                    {'error': 'Identifiant de classe invalide'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            class_obj = get_object_or_404(Class, id=class_id)
+            filename = f"{filename}_{class_obj}"
+        
+        queryset = get_export_queryset(
+            class_id=class_id,
+            grading_period_id=period.id,
+            # Un professeur n'exporte que ses propres évaluations
+            teacher=user if user.user_type == 'teacher' else None
+        )
+        
+        return build_export_response(queryset, export_format, filename)
 
 
 class EvaluationFilter(filters.FilterSet):
@@ -272,43 +339,21 @@ class EvaluationViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def export_grades(self, request, pk=None):
-        """Exporter les notes au format CSV"""
+        """Exporter les notes au format CSV ou XLSX"""
         evaluation = self.get_object()
         
-        # Créer le CSV
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # En-têtes
-        writer.writerow([
-            'Nom', 'Prénom', 'Note', 'Sur', 'Note/20',
-            'Absent', 'Commentaire'
-        ])
-        
-        # Données
-        grades = evaluation.grades.select_related('student').order_by(
-            'student__last_name', 'student__first_name'
-        )
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Format non supporté. Formats disponibles : {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        for grade in grades:
-            writer.writerow([
-                grade.student.last_name,
-                grade.student.first_name,
-                grade.score or '',
-                evaluation.max_score,
-                grade.normalized_score or '',
-                'Oui' if grade.is_absent else 'Non',
-                grade.comment
-            ])
-        
-        # Retourner le fichier
-        response = Response(
-            output.getvalue(),
-            content_type='text/csv'
+        return build_export_response(
+            get_export_queryset(evaluation=evaluation),
+            export_format,
+            f"notes_{evaluation.title}"
         )
-        response['Content-Disposition'] = f'attachment; filename="notes_{evaluation.title}.csv"'
-        
-        return response
 
 
 class GradeFilter(filters.FilterSet):
@@ -535,50 +580,99 @@ class CompetenceEvaluationViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def student_summary(self, request):
-        """Résumé des compétences d'un élève"""
-        student_id = request.query_params.get('student_id')
+        """
+        Résumé des compétences d'un ou plusieurs élèves, ou d'une classe
+        
+        Paramètres : student_id, student_ids (séparés par des virgules)
+        ou class_id (professeurs et administrateurs).
+        """
+        user = request.user
         period_id = request.query_params.get('grading_period_id')
+        class_id = request.query_params.get('class_id')
+        raw_ids = request.query_params.get('student_ids') or request.query_params.get('student_id')
+        
+        if class_id:
+            try:
+                class_id = str(uuid.UUID(class_id.strip()))
+            except ValueError:
+                return Response(
+                    {'error': 'Identifiant de classe invalide'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        if period_id:
+            try:
+                period_id = str(uuid.UUID(period_id.strip()))
+            except ValueError:
+                return Response(
+                    {'error': 'Identifiant de période invalide'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
-        if not student_id:
+        # Queryset non restreint : la synthèse peut être mise en cache
+        queryset = CompetenceEvaluation.objects.all()
+        use_cache = True
+        
+        if class_id:
+            if user.user_type not in ['teacher', 'admin', 'superadmin']:
+                return Response(
+                    {'error': 'Synthèse de classe réservée aux professeurs et administrateurs'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            
+            class_obj = get_object_or_404(Class, id=class_id)
+            student_ids = list(class_obj.students.filter(
+                is_active=True
+            ).values_list('student_id', flat=True))
+            
+            # Le professeur principal voit toute la classe, les autres
+            # professeurs uniquement leurs propres évaluations
+            if user.user_type == 'teacher' and class_obj.main_teacher_id != user.id:
+                queryset = self.get_queryset()
+                use_cache = False
+        
+        elif raw_ids:
+            try:
+                student_ids = [
+                    str(uuid.UUID(value.strip()))
+                    for value in raw_ids.split(',') if value.strip()
+                ]
+            except ValueError:
+                return Response(
+                    {'error': 'Identifiant d\'élève invalide'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            if user.user_type == 'student' and student_ids != [str(user.id)]:
+                return Response(
+                    {'error': 'Vous ne pouvez voir que vos propres compétences'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            if user.user_type == 'teacher':
+                queryset = self.get_queryset()
+                use_cache = False
+        
+        else:
             return Response(
-                {'error': 'student_id est requis'},
+                {'error': 'student_id, student_ids ou class_id est requis'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Filtrer les évaluations
-        evaluations = self.get_queryset().filter(student_id=student_id)
+        summaries = get_competence_summaries(
+            queryset,
+            student_ids,
+            grading_period_id=period_id,
+            use_cache=use_cache
+        )
         
-        if period_id:
-            evaluations = evaluations.filter(grading_period_id=period_id)
+        # Un seul élève demandé : format historique
+        if request.query_params.get('student_id') and not class_id and len(summaries) == 1:
+            return Response(next(iter(summaries.values())))
         
-        # Grouper par domaine
-        summary = {}
-        for domain, label in Competence._meta.get_field('domain').choices:
-            domain_evals = evaluations.filter(competence__domain=domain)
-            
-            if domain_evals.exists():
-                summary[domain] = {
-                    'label': label,
-                    'competences': [],
-                    'statistics': domain_evals.aggregate(
-                        total=Count('id'),
-                        expert=Count('id', filter=Q(mastery_level='e')),
-                        acquired=Count('id', filter=Q(mastery_level='a')),
-                        in_progress=Count('id', filter=Q(mastery_level='ec')),
-                        not_acquired=Count('id', filter=Q(mastery_level='na'))
-                    )
-                }
-                
-                # Détail par compétence
-                for comp_eval in domain_evals.select_related('competence'):
-                    summary[domain]['competences'].append({
-                        'competence': comp_eval.competence.name,
-                        'code': comp_eval.competence.code,
-                        'mastery_level': comp_eval.mastery_level,
-                        'mastery_level_display': comp_eval.get_mastery_level_display()
-                    })
-        
-        return Response(summary)
+        return Response({
+            'grading_period_id': period_id,
+            'class_id': class_id,
+            'students': summaries
+        })
 
 
 @api_view(['GET'])
@@ -594,25 +688,47 @@ def student_report_card(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    # Identifiants validés avant toute requête (400 plutôt que 500)
+    serializer = StudentReportCardSerializer(
+        data={'student_id': student_id, 'grading_period_id': period_id}
+    )
+    serializer.is_valid(raise_exception=True)
+    student_id = serializer.validated_data['student_id']
+    
     # Vérifier les permissions
     user = request.user
-    if user.user_type == 'student' and str(user.id) != student_id:
+    if user.user_type == 'student' and user.id != student_id:
         return Response(
             {'error': 'Vous ne pouvez voir que votre propre bulletin'},
             status=status.HTTP_403_FORBIDDEN
         )
     
     # Vérifier que les bulletins sont publiés
-    period = get_object_or_404(GradingPeriod, id=period_id)
+    period = get_object_or_404(
+        GradingPeriod, id=serializer.validated_data['grading_period_id']
+    )
     if not period.bulletins_published and user.user_type not in ['teacher', 'admin']:
         return Response(
             {'error': 'Les bulletins ne sont pas encore publiés'},
             status=status.HTTP_403_FORBIDDEN
         )
     
-    serializer = StudentReportCardSerializer(
-        data={'student_id': student_id, 'grading_period_id': period_id}
-    )
-    serializer.is_valid(raise_exception=True)
+    # Bulletin publié : contenu pré-calculé, validé par ETag
+    if period.bulletins_published:
+        payload, etag = get_cached_report_card(student_id, period)
+        
+        if etag is None:
+            return Response(payload)
+        
+        quoted_etag = quote_etag(etag)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and quoted_etag in parse_etags(if_none_match):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(payload)
+        
+        response['ETag'] = quoted_etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
     
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(serializer.data)
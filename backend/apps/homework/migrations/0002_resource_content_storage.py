@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:29
+
+import apps.tenants.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homework', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='homeworkresource',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=apps.tenants.storage.get_content_storage, upload_to='homework/resources/%Y/%m/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'ppt', 'pptx', 'xls', 'xlsx', 'jpg', 'png', 'mp4', 'avi'])], verbose_name='Fichier'),
+        ),
+    ]
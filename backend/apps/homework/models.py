@@ -8,6 +8,7 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from datetime import datetime, timedelta
 from apps.core.models import BaseModel
+from apps.tenants.storage import get_content_storage
 from apps.authentication.models import User
 from apps.schools.models import Class, AcademicYear
 from apps.timetable.models import Subject, Schedule
@@ -364,6 +365,7 @@ class HomeworkResource(BaseModel):
     # Contenu
     file = models.FileField(
         upload_to='homework/resources/%Y/%m/',
+        storage=get_content_storage,
         null=True,
         blank=True,
         validators=[
@@ -105,10 +105,20 @@ class MessageGroupAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     raw_id_fields = ['owner', 'dynamic_class']
     filter_horizontal = ['members']
+    readonly_fields = ['member_count']
     
-    def member_count(self, obj):
-        return obj.get_member_count()
-    member_count.short_description = 'Membres'
+    def get_exclude(self, request, obj=None):
+        """Les membres d'un groupe dynamique sont calculés, pas saisis"""
+        exclude = list(super().get_exclude(request, obj) or [])
+        if obj is not None and obj.is_dynamic:
+            exclude.append('members')
+        return exclude
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # ``save_m2m`` a pu remplacer les membres matérialisés par ``save()``
+        if form.instance.is_dynamic:
+            form.instance.refresh_members()
 
 
 @admin.register(EmailForwarding)
@@ -0,0 +1,19 @@
+"""
+Configuration de l'application messagerie
+"""
+from django.apps import AppConfig
+
+
+class MessagingConfig(AppConfig):
+    """
+    Configuration de la messagerie interne
+    """
+    name = 'apps.messaging'
+    verbose_name = 'Messagerie'
+    
+    def ready(self):
+        """
+        Initialisation de l'application
+        """
+        # Importer les signaux
+        from . import signals
@@ -0,0 +1,188 @@
+"""
+Distribution des messages à leurs destinataires
+
+Les destinataires (directs et membres des groupes, statiques ou
+dynamiques) sont résolus en une seule requête, puis les lignes
+``MessageRecipient`` sont insérées par lots avec ``bulk_create``. Au-delà
+de ``MESSAGING_BROADCAST_ASYNC_THRESHOLD`` destinataires, l'insertion est
+confiée à une tâche Celery qui suit son avancement dans
+``MessageBroadcast`` et n'envoie le message qu'à la fin.
+
+Les notifications sont mises en file par lots de destinataires, une fois
+la transaction validée.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.authentication.models import User
+from apps.tenants.utils import get_current_schema
+from .mailbox import record_new_recipients
+from .models import MessageBroadcast, MessageGroup, MessageRecipient
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_size():
+    """Nombre de destinataires insérés (et notifiés) par lot"""
+    return getattr(settings, 'MESSAGING_BROADCAST_BATCH_SIZE', 1000)
+
+
+def get_async_threshold():
+    """Nombre de destinataires au-delà duquel la distribution est différée"""
+    return getattr(settings, 'MESSAGING_BROADCAST_ASYNC_THRESHOLD', 500)
+
+
+def resolve_recipients(recipient_ids=(), group_ids=(), exclude=None):
+    """
+    Identifiants des destinataires, triés et sans doublon (une requête)
+
+    ``exclude`` (l'expéditeur) n'est jamais destinataire.
+    """
+    criteria = Q(id__in=list(recipient_ids)) if recipient_ids else Q(pk__in=[])
+    if group_ids:
+        # Membres matérialisés, y compris pour les groupes dynamiques
+        criteria |= Q(messaging_groups__in=list(group_ids))
+
+    queryset = User.objects.filter(criteria)
+    if exclude is not None:
+        queryset = queryset.exclude(id=exclude)
+
+    return list(queryset.order_by('id').values_list('id', flat=True).distinct())
+
+
+def touch_groups(group_ids):
+    """Statistiques d'utilisation des groupes (une requête)"""
+    if group_ids:
+        MessageGroup.objects.filter(id__in=list(group_ids)).update(
+            last_used=timezone.now(),
+            use_count=F('use_count') + 1
+        )
+
+
+def add_recipients(message, user_ids, batch_size=None):
+    """
+    Insérer les destinataires par lots ; les doublons sont ignorés
+
+    Les destinataires déjà présents (reprise d'une diffusion) sont écartés
+    par une lecture par lot, et les compteurs de boîte de réception ne
+    sont ajustés que pour les lignes insérées. Renvoie le nombre de
+    destinataires ajoutés.
+    """
+    batch_size = batch_size or get_batch_size()
+    added = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        existing = set(
+            MessageRecipient.objects.filter(
+                message=message, recipient_id__in=batch
+            ).values_list('recipient_id', flat=True)
+        )
+        new_ids = [user_id for user_id in batch if user_id not in existing]
+        if not new_ids:
+            continue
+        MessageRecipient.objects.bulk_create(
+            [MessageRecipient(message=message, recipient_id=user_id) for user_id in new_ids],
+            ignore_conflicts=True
+        )
+        record_new_recipients(new_ids)
+        added += len(new_ids)
+    return added
+
+
+def enqueue_notifications(message, user_ids, batch_size=None):
+    """Une tâche de notification par lot de destinataires, après validation"""
+    from .tasks import send_message_notifications
+
+    batch_size = batch_size or get_batch_size()
+    message_id = str(message.id)
+    schema_name = get_current_schema()
+    batches = [
+        [str(user_id) for user_id in user_ids[start:start + batch_size]]
+        for start in range(0, len(user_ids), batch_size)
+    ]
+
+    def schedule():
+        for batch in batches:
+            send_message_notifications.delay(message_id, batch, schema_name=schema_name)
+
+    transaction.on_commit(schedule)
+
+
+def broadcast_message(message, recipient_ids=(), group_ids=(), send=True):
+    """
+    Distribuer ``message`` à ses destinataires
+
+    Renvoie le suivi ``MessageBroadcast`` si la distribution est différée,
+    ``None`` si elle a été faite immédiatement.
+    """
+    user_ids = resolve_recipients(recipient_ids, group_ids, exclude=message.sender_id)
+    touch_groups(group_ids)
+
+    if len(user_ids) > get_async_threshold():
+        from .tasks import fan_out_message
+
+        broadcast = MessageBroadcast.objects.create(
+            message=message,
+            recipient_ids=[str(user_id) for user_id in recipient_ids],
+            group_ids=[str(group_id) for group_id in group_ids],
+            send_on_completion=send,
+            total_recipients=len(user_ids)
+        )
+        schema_name = get_current_schema()
+        transaction.on_commit(
+            lambda: fan_out_message.delay(str(broadcast.id), schema_name=schema_name)
+        )
+        return broadcast
+
+    add_recipients(message, user_ids)
+    if send:
+        message.send()
+        enqueue_notifications(message, user_ids)
+    return None
+
+
+def run_broadcast(broadcast, batch_size=None):
+    """
+    Insérer les destinataires d'une diffusion différée, lot par lot
+
+    Chaque lot est validé avec l'avancement ; une reprise saute les lots
+    déjà enregistrés (la liste résolue est triée, les doublons ignorés).
+    """
+    batch_size = batch_size or get_batch_size()
+    message = broadcast.message
+
+    user_ids = resolve_recipients(
+        broadcast.recipient_ids, broadcast.group_ids, exclude=message.sender_id
+    )
+    broadcast.status = 'running'
+    broadcast.total_recipients = len(user_ids)
+    broadcast.started_at = broadcast.started_at or timezone.now()
+    broadcast.save(update_fields=['status', 'total_recipients', 'started_at', 'updated_at'])
+
+    start = min(broadcast.processed_recipients, len(user_ids))
+    while start < len(user_ids):
+        batch = user_ids[start:start + batch_size]
+        with transaction.atomic():
+            add_recipients(message, batch, batch_size)
+            start += len(batch)
+            MessageBroadcast.objects.filter(pk=broadcast.pk).update(
+                processed_recipients=start,
+                updated_at=timezone.now()
+            )
+        broadcast.processed_recipients = start
+
+    with transaction.atomic():
+        if broadcast.send_on_completion and message.is_draft:
+            message.send()
+            enqueue_notifications(message, user_ids, batch_size)
+
+        broadcast.status = 'completed'
+        broadcast.finished_at = timezone.now()
+        broadcast.save(update_fields=['status', 'finished_at', 'updated_at'])
+
+    logger.info(f"Message {message.id} distribué à {len(user_ids)} destinataires")
+    return len(user_ids)
@@ -0,0 +1,246 @@
+"""
+Emails groupés de la messagerie (récapitulatifs et résumés quotidiens)
+
+Les destinataires en attente d'une fréquence sont lus en une seule requête
+triée par utilisateur et parcourue par lots (``.iterator()``), puis
+regroupés en un récapitulatif par utilisateur. Les emails sont envoyés par
+paquets, chaque paquet sur sa propre connexion SMTP, par plusieurs
+travailleurs en parallèle ; les destinataires d'un paquet envoyé sont
+marqués en une requête UPDATE.
+
+Les résumés quotidiens sont sélectionnés par requête sur la tranche
+horaire locale de ``summary_time`` (fuseau ``TIME_ZONE``), et leurs
+statistiques calculées en deux requêtes pour tous les utilisateurs.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Count, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import MessagePriority, MessageRecipient, NotificationPreference
+
+logger = logging.getLogger(__name__)
+
+FREQUENCY_WINDOWS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(days=7),
+}
+
+# Messages urgents cités dans un résumé quotidien
+SUMMARY_URGENT_LIMIT = 5
+
+
+def get_batch_size():
+    """Nombre d'emails envoyés sur une même connexion"""
+    return getattr(settings, 'MESSAGING_DIGEST_BATCH_SIZE', 100)
+
+
+def get_workers():
+    """Nombre de connexions SMTP ouvertes en parallèle"""
+    return getattr(settings, 'MESSAGING_DIGEST_WORKERS', 4)
+
+
+def build_email(user, subject, template, context):
+    html_message = render_to_string(template, {
+        'user': user,
+        'site_url': getattr(settings, 'FRONTEND_URL', ''),
+        **context
+    })
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=strip_tags(html_message),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email]
+    )
+    email.attach_alternative(html_message, 'text/html')
+    return email
+
+
+def _send_batch(emails):
+    """Envoyer un paquet sur une connexion (exécuté par un travailleur)"""
+    with get_connection() as connection:
+        return connection.send_messages(emails) or 0
+
+
+def send_in_batches(items, on_sent=None, batch_size=None, workers=None):
+    """
+    Envoyer ``items`` — des couples (clé, email) — par paquets
+
+    Les emails sont préparés au fil de l'itération ; au plus ``workers``
+    paquets sont en cours d'envoi. ``on_sent`` reçoit les clés de chaque
+    paquet envoyé. Renvoie le nombre d'emails envoyés.
+    """
+    batch_size = batch_size or get_batch_size()
+    workers = workers or get_workers()
+    sent = 0
+    pending = []
+
+    def collect(future, keys):
+        nonlocal sent
+        try:
+            sent += future.result()
+        except Exception as e:
+            logger.error(f"Erreur envoi d'un paquet de {len(keys)} emails: {str(e)}")
+            return
+        if on_sent is not None:
+            on_sent(keys)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) < batch_size:
+                continue
+            if len(pending) >= workers:
+                collect(*pending.pop(0))
+            pending.append((executor.submit(_send_batch, [email for _, email in batch]),
+                            [key for key, _ in batch]))
+            batch = []
+        if batch:
+            pending.append((executor.submit(_send_batch, [email for _, email in batch]),
+                            [key for key, _ in batch]))
+        for future, keys in pending:
+            collect(future, keys)
+
+    return sent
+
+
+def mark_emailed(recipient_ids_groups):
+    """Marquer envoyés les destinataires d'un paquet de récapitulatifs"""
+    MessageRecipient.objects.filter(
+        pk__in=[pk for group in recipient_ids_groups for pk in group]
+    ).update(email_sent=True)
+
+
+def pending_recipients(frequency, since):
+    """
+    Destinataires non notifiés par email depuis ``since``, pour les
+    utilisateurs de cette fréquence, triés par utilisateur (une requête)
+    """
+    return MessageRecipient.objects.filter(
+        email_sent=False,
+        message__sent_at__gte=since,
+        recipient__notification_preferences__email_enabled=True,
+        recipient__notification_preferences__email_frequency=frequency
+    ).select_related(
+        'recipient', 'message', 'message__sender'
+    ).order_by('recipient_id', 'message__sent_at')
+
+
+def iter_digests(frequency, since):
+    """Un couple (identifiants des destinataires, email) par utilisateur"""
+    rows = pending_recipients(frequency, since).iterator(chunk_size=2000)
+    for _, group in groupby(rows, key=lambda row: row.recipient_id):
+        group = list(group)
+        user = group[0].recipient
+        if not user.email:
+            continue
+        try:
+            email = build_email(
+                user,
+                f"[PeproScolaire] {len(group)} nouveaux messages",
+                'emails/message_digest.html',
+                {'messages': [row.message for row in group], 'count': len(group)}
+            )
+        except Exception as e:
+            logger.error(f"Erreur préparation du récapitulatif de {user.email}: {str(e)}")
+            continue
+        yield [row.pk for row in group], email
+
+
+def send_frequency_digests(frequency, now=None):
+    """Envoyer les récapitulatifs d'une fréquence, renvoie le nombre d'emails"""
+    since = (now or timezone.now()) - FREQUENCY_WINDOWS[frequency]
+    return send_in_batches(iter_digests(frequency, since), on_sent=mark_emailed)
+
+
+def summary_hour_bounds(now=None):
+    """Tranche horaire locale en cours, pour comparer ``summary_time``"""
+    local = timezone.localtime(now)
+    start = time(local.hour)
+    end = time(local.hour + 1) if local.hour < 23 else None
+    return local, start, end
+
+
+def summary_users(now=None):
+    """Utilisateurs dont le résumé quotidien tombe dans l'heure en cours"""
+    _, start, end = summary_hour_bounds(now)
+    preferences = NotificationPreference.objects.filter(
+        daily_summary=True,
+        summary_time__gte=start
+    )
+    if end is not None:
+        preferences = preferences.filter(summary_time__lt=end)
+    return [prefs.user for prefs in preferences.select_related('user')]
+
+
+def build_summaries(users, now=None):
+    """
+    Statistiques des résumés de ``users`` : {user_id: résumé}
+
+    Une requête agrégée (reçus aujourd'hui, non lus) et une requête pour
+    les messages urgents non lus ; les utilisateurs sans activité sont omis.
+    """
+    local, _, _ = summary_hour_bounds(now)
+    day_start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    user_ids = [user.pk for user in users]
+
+    counts = MessageRecipient.objects.filter(
+        recipient_id__in=user_ids
+    ).filter(
+        Q(is_read=False) | Q(message__sent_at__gte=day_start)
+    ).values('recipient_id').annotate(
+        received_today=Count('id', filter=Q(message__sent_at__gte=day_start)),
+        unread=Count('id', filter=Q(is_read=False))
+    ).order_by()
+
+    summaries = {
+        row['recipient_id']: {
+            'received_today': row['received_today'],
+            'unread_total': row['unread'],
+            'urgent_messages': []
+        }
+        for row in counts if row['received_today'] or row['unread']
+    }
+
+    urgent = MessageRecipient.objects.filter(
+        recipient_id__in=list(summaries),
+        is_read=False,
+        message__priority=MessagePriority.URGENT
+    ).select_related('message', 'message__sender').order_by(
+        'recipient_id', '-message__sent_at'
+    ).iterator(chunk_size=2000)
+    for row in urgent:
+        messages = summaries[row.recipient_id]['urgent_messages']
+        if len(messages) < SUMMARY_URGENT_LIMIT:
+            messages.append(row)
+
+    return summaries
+
+
+def iter_summaries(users, now=None):
+    summaries = build_summaries(users, now)
+    subject = f"[PeproScolaire] Votre résumé du {timezone.localtime(now):%d/%m/%Y}"
+    for user in users:
+        summary = summaries.get(user.pk)
+        if summary is None or not user.email:
+            continue
+        try:
+            yield user.pk, build_email(
+                user, subject, 'emails/daily_summary.html', {'summary': summary}
+            )
+        except Exception as e:
+            logger.error(f"Erreur préparation du résumé de {user.email}: {str(e)}")
+
+
+def send_daily_summaries(now=None):
+    """Envoyer les résumés quotidiens de l'heure en cours"""
+    return send_in_batches(iter_summaries(summary_users(now), now))
@@ -0,0 +1,110 @@
+"""
+Membres matérialisés des groupes de destinataires
+
+Les membres d'un groupe dynamique (classe, type d'utilisateur) sont
+enregistrés dans la même table que ceux d'un groupe statique : l'envoi à
+un groupe et son affichage sont de simples lectures indexées, et le nombre
+de membres est stocké sur le groupe.
+
+Les signaux (voir ``signals.py``) mettent à jour l'appartenance d'un
+utilisateur lorsque ses inscriptions, son type ou son activation changent ;
+la tâche ``refresh_dynamic_groups`` recalcule périodiquement tous les
+groupes pour rattraper les modifications faites en masse.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from apps.authentication.models import User
+from .models import MessageGroup
+
+Membership = MessageGroup.members.through
+
+
+def candidate_groups(user_types, class_ids=None):
+    """
+    Groupes dynamiques pouvant concerner des utilisateurs de ``user_types``
+
+    ``class_ids`` restreint aux groupes de ces classes (et aux groupes
+    sans classe) ; ``None`` retient tous les groupes.
+    """
+    groups = MessageGroup.objects.filter(is_dynamic=True).filter(
+        Q(dynamic_user_type='') | Q(dynamic_user_type__in=list(user_types))
+    )
+    if class_ids is not None:
+        groups = groups.filter(
+            Q(dynamic_class__isnull=True) | Q(dynamic_class_id__in=list(class_ids))
+        )
+    return groups
+
+
+def sync_user_groups(user_ids, class_ids=None):
+    """
+    Mettre à jour l'appartenance de ``user_ids`` aux groupes dynamiques
+
+    Une requête par groupe candidat vérifie les critères pour tous les
+    utilisateurs ; les compteurs sont ajustés en base.
+    """
+    user_ids = list(user_ids)
+    user_types = set(
+        User.objects.filter(pk__in=user_ids).values_list('user_type', flat=True)
+    )
+    # Un utilisateur supprimé ou dont le type a changé peut aussi quitter
+    # des groupes d'un autre type
+    user_types |= set(
+        MessageGroup.objects.filter(
+            is_dynamic=True,
+            members__in=user_ids
+        ).values_list('dynamic_user_type', flat=True)
+    )
+
+    changed = 0
+    for group in candidate_groups(user_types, class_ids):
+        expected = set(
+            User.objects.filter(pk__in=user_ids).filter(
+                group.dynamic_filter()
+            ).values_list('id', flat=True).distinct()
+        )
+        current = set(
+            Membership.objects.filter(
+                messagegroup=group,
+                user_id__in=user_ids
+            ).values_list('user_id', flat=True)
+        )
+        added, removed = expected - current, current - expected
+        if not added and not removed:
+            continue
+
+        with transaction.atomic():
+            Membership.objects.filter(messagegroup=group, user_id__in=removed).delete()
+            Membership.objects.bulk_create(
+                [Membership(messagegroup=group, user_id=user_id) for user_id in added],
+                ignore_conflicts=True
+            )
+            MessageGroup.objects.filter(pk=group.pk).update(
+                member_count=F('member_count') + len(added) - len(removed)
+            )
+        changed += 1
+    return changed
+
+
+def update_member_counts(group_ids):
+    """Recompter les membres de groupes (une requête de lecture)"""
+    counts = MessageGroup.objects.filter(pk__in=list(group_ids)).annotate(
+        total=Count('members')
+    ).values_list('pk', 'total')
+    for group_id, total in counts:
+        MessageGroup.objects.filter(pk=group_id).exclude(
+            member_count=total
+        ).update(member_count=total)
+
+
+def refresh_all_groups():
+    """Recalculer tous les groupes dynamiques et les compteurs statiques"""
+    refreshed = 0
+    for group in MessageGroup.objects.filter(is_dynamic=True).iterator():
+        group.refresh_members()
+        refreshed += 1
+    update_member_counts(
+        MessageGroup.objects.filter(is_dynamic=False).values_list('pk', flat=True)
+    )
+    return refreshed
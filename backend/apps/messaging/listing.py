@@ -0,0 +1,100 @@
+"""
+Listes de messages par dossier
+
+Les dossiers de réception (boîte de réception, archives, corbeille...)
+sont lus depuis ``MessageRecipient`` avec l'index (destinataire, dossier,
+date), le dossier « envoyés » depuis ``Message`` avec l'index (expéditeur,
+date d'envoi) : aucune jointure OR ni ``DISTINCT``.
+
+La pagination se fait par curseur (clé de tri de la dernière ligne vue)
+plutôt que par numéro de page : la page 50 coûte autant que la première.
+"""
+from django.conf import settings
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.pagination import CursorPagination
+
+from .models import Message, MessageAttachment, MessageFolder, MessageRecipient
+
+
+class MessageCursorPagination(CursorPagination):
+    """Pagination par curseur, des plus récents aux plus anciens"""
+    page_size = getattr(settings, 'MESSAGING_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-created_at'
+
+
+class SentCursorPagination(MessageCursorPagination):
+    ordering = '-sent_at'
+
+
+def with_list_counts(queryset, message_ref='pk'):
+    """
+    Nombre de destinataires et présence de pièces jointes, en sous-requêtes
+
+    Elles ne sont évaluées que pour les lignes de la page.
+    """
+    recipients_total = MessageRecipient.objects.filter(
+        message=OuterRef(message_ref)
+    ).order_by().values('message').annotate(total=Count('id')).values('total')
+
+    return queryset.annotate(
+        recipients_total=Coalesce(
+            Subquery(recipients_total, output_field=IntegerField()), 0
+        ),
+        attachment_exists=Exists(
+            MessageAttachment.objects.filter(message=OuterRef(message_ref))
+        )
+    )
+
+
+def received_queryset(user, folder):
+    """Lignes destinataires d'un dossier de réception, messages envoyés seulement"""
+    queryset = MessageRecipient.objects.filter(
+        recipient=user,
+        folder=folder,
+        message__sent_at__isnull=False
+    ).select_related(
+        'message', 'message__sender', 'message__sender__profile',
+        'message__root_message'
+    )
+    return with_list_counts(queryset, 'message_id')
+
+
+def sent_queryset(user):
+    """Messages envoyés par ``user``"""
+    queryset = Message.objects.filter(
+        sender=user,
+        sent_at__isnull=False
+    ).select_related('sender', 'sender__profile', 'root_message')
+    return with_list_counts(queryset)
+
+
+def folder_pagination(folder):
+    """Classe de pagination adaptée au dossier"""
+    if folder == MessageFolder.SENT:
+        return SentCursorPagination
+    return MessageCursorPagination
+
+
+def page_messages(page):
+    """
+    Messages d'une page, prêts pour ``MessageListSerializer``
+
+    Chaque message porte la ligne destinataire de l'utilisateur
+    (``mailbox_entry``) et les compteurs annotés : la sérialisation ne fait
+    plus de requête par message.
+    """
+    messages = []
+    for item in page:
+        if isinstance(item, MessageRecipient):
+            message = item.message
+            message.mailbox_entry = item
+            message.recipients_total = item.recipients_total
+            message.attachment_exists = item.attachment_exists
+        else:
+            message = item
+            message.mailbox_entry = None
+        messages.append(message)
+    return messages
@@ -0,0 +1,181 @@
+"""
+Compteurs de boîte aux lettres
+
+Chaque utilisateur dispose d'une ligne ``MailboxCounter`` par dossier
+(nombre de messages et non lus). Les points d'accès interrogés en continu
+par le frontend (``unread_count``, ``folders``) lisent ces lignes au lieu
+de compter les destinataires.
+
+Les compteurs sont ajustés dans la transaction qui modifie les
+destinataires (création, lecture, déplacement, actions groupées) et
+l'envoi d'un message incrémente le dossier « envoyés ». Les suppressions
+en masse et les modifications faites hors de ces chemins sont rattrapées
+par la tâche périodique ``reconcile_mailbox_counters``.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import MailboxCounter, Message, MessageFolder, MessageRecipient
+
+
+def adjust_counters(deltas):
+    """
+    Appliquer des variations ``{(user_id, dossier): (total, non lus)}``
+
+    Les lignes manquantes sont créées, puis une requête UPDATE par
+    variation distincte applique les incréments en base.
+    """
+    deltas = {key: value for key, value in deltas.items() if any(value)}
+    if not deltas:
+        return
+
+    MailboxCounter.objects.bulk_create(
+        [MailboxCounter(user_id=user_id, folder=folder) for user_id, folder in deltas],
+        ignore_conflicts=True
+    )
+
+    # Regrouper les utilisateurs ayant la même variation sur le même dossier
+    grouped = defaultdict(list)
+    for (user_id, folder), value in deltas.items():
+        grouped[(folder, value)].append(user_id)
+
+    for (folder, (total, unread)), user_ids in grouped.items():
+        MailboxCounter.objects.filter(user_id__in=user_ids, folder=folder).update(
+            total=F('total') + total,
+            unread=F('unread') + unread
+        )
+
+
+def record_new_recipients(user_ids, folder=MessageFolder.INBOX):
+    """Un nouveau message non lu pour chacun de ``user_ids``"""
+    adjust_counters({(user_id, folder): (1, 1) for user_id in user_ids})
+
+
+def record_sent(user_id):
+    adjust_counters({(user_id, MessageFolder.SENT): (1, 0)})
+
+
+def update_recipients(queryset, **changes):
+    """
+    ``queryset.update(**changes)`` en ajustant les compteurs
+
+    Seuls ``folder`` et ``is_read`` modifient les compteurs ; la
+    répartition avant modification est lue en une requête groupée.
+    Renvoie le nombre de lignes modifiées.
+    """
+    if 'folder' not in changes and 'is_read' not in changes:
+        return queryset.update(**changes)
+
+    if 'folder' in changes:
+        # ``updated_at`` date l'entrée dans le dossier (purge de la corbeille)
+        changes.setdefault('updated_at', timezone.now())
+
+    with transaction.atomic():
+        before = queryset.values('recipient_id', 'folder', 'is_read').annotate(
+            count=Count('id')
+        ).order_by()
+
+        deltas = defaultdict(lambda: [0, 0])
+        for row in before:
+            folder = changes.get('folder', row['folder'])
+            is_read = changes.get('is_read', row['is_read'])
+            count = row['count']
+
+            previous = deltas[(row['recipient_id'], row['folder'])]
+            previous[0] -= count
+            previous[1] -= 0 if row['is_read'] else count
+
+            current = deltas[(row['recipient_id'], folder)]
+            current[0] += count
+            current[1] += 0 if is_read else count
+
+        updated = queryset.update(**changes)
+        adjust_counters({key: tuple(value) for key, value in deltas.items()})
+
+    return updated
+
+
+def _read_counters(user):
+    return {
+        folder: (total, unread)
+        for folder, total, unread in MailboxCounter.objects.filter(user=user).values_list(
+            'folder', 'total', 'unread'
+        )
+    }
+
+
+def get_counters(user):
+    """Compteurs de l'utilisateur par dossier : {dossier: (total, non lus)}"""
+    counters = _read_counters(user)
+    if not counters:
+        # Première consultation : calcul complet, conservé pour la suite
+        reconcile_counters([user.pk])
+        counters = _read_counters(user)
+    return counters
+
+
+def get_unread_count(user, folder=MessageFolder.INBOX):
+    """Non lus d'un dossier (lecture d'une ligne)"""
+    row = MailboxCounter.objects.filter(user=user, folder=folder).values_list(
+        'unread', flat=True
+    ).first()
+    if row is None:
+        return get_counters(user).get(folder, (0, 0))[1]
+    return max(row, 0)
+
+
+def reconcile_counters(user_ids):
+    """
+    Recalculer les compteurs de ``user_ids`` depuis les destinataires
+
+    Deux requêtes groupées (reçus par dossier, envoyés) puis une
+    insertion avec mise à jour. Renvoie le nombre de compteurs corrigés.
+    """
+    user_ids = list(user_ids)
+    expected = {
+        (user_id, folder): (0, 0)
+        for user_id in user_ids for folder in MessageFolder.values
+    }
+
+    received = MessageRecipient.objects.filter(recipient_id__in=user_ids).values(
+        'recipient_id', 'folder'
+    ).annotate(
+        total=Count('id'),
+        unread=Count('id', filter=Q(is_read=False))
+    ).order_by()
+    for row in received:
+        expected[(row['recipient_id'], row['folder'])] = (row['total'], row['unread'])
+
+    sent = Message.objects.filter(
+        sender_id__in=user_ids,
+        sent_at__isnull=False
+    ).values('sender_id').annotate(total=Count('id')).order_by()
+    for row in sent:
+        expected[(row['sender_id'], MessageFolder.SENT)] = (row['total'], 0)
+
+    current = {
+        (user_id, folder): (total, unread)
+        for user_id, folder, total, unread in MailboxCounter.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', 'folder', 'total', 'unread')
+    }
+    # Un compteur absent vaut zéro ; la boîte de réception est toujours
+    # créée pour que ``get_counters`` ne recalcule pas à chaque lecture
+    counted_users = {user_id for user_id, _ in current}
+    stale = [
+        MailboxCounter(user_id=user_id, folder=folder, total=total, unread=unread)
+        for (user_id, folder), (total, unread) in expected.items()
+        if current.get((user_id, folder), (0, 0)) != (total, unread)
+        or (folder == MessageFolder.INBOX and user_id not in counted_users)
+    ]
+
+    MailboxCounter.objects.bulk_create(
+        stale,
+        update_conflicts=True,
+        unique_fields=['user', 'folder'],
+        update_fields=['total', 'unread', 'updated_at']
+    )
+    return len(stale)
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_threads(apps, schema_editor):
+    """Renseigner le message racine et la taille des fils existants"""
+    Message = apps.get_model('messaging', 'Message')
+    
+    parents = dict(Message.objects.values_list('id', 'parent_message_id'))
+    roots = {}
+    
+    def find_root(message_id):
+        path = []
+        while message_id not in roots and parents.get(message_id):
+            path.append(message_id)
+            message_id = parents[message_id]
+        root = roots.get(message_id, message_id)
+        for item in path:
+            roots[item] = root
+        roots.setdefault(message_id, root)
+        return root
+    
+    sizes = {}
+    replies = []
+    for message_id, parent_id in parents.items():
+        root = find_root(message_id)
+        sizes[root] = sizes.get(root, 1) + (1 if parent_id else 0)
+        if parent_id:
+            replies.append(Message(id=message_id, root_message_id=root))
+    
+    Message.objects.bulk_update(replies, ['root_message'], batch_size=1000)
+    Message.objects.bulk_update(
+        [Message(id=root, thread_size=size) for root, size in sizes.items() if size > 1],
+        ['thread_size'],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='root_message',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Vide pour le message racine du fil', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='messaging.message', verbose_name='Message racine'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='thread_size',
+            field=models.PositiveIntegerField(default=1, help_text='Tenu à jour sur le message racine uniquement', verbose_name='Messages dans le fil'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['root_message', 'created_at'], name='messages_root_me_61d987_idx'),
+        ),
+        migrations.RunPython(fill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:13
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_message_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageBroadcast',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('completed', 'Terminé'), ('failed', 'Échec')], default='pending', max_length=20, verbose_name='Statut')),
+                ('recipient_ids', models.JSONField(blank=True, default=list)),
+                ('group_ids', models.JSONField(blank=True, default=list)),
+                ('send_on_completion', models.BooleanField(default=True, verbose_name='Envoyer à la fin de la distribution')),
+                ('total_recipients', models.PositiveIntegerField(default=0, verbose_name='Nombre de destinataires')),
+                ('processed_recipients', models.PositiveIntegerField(default=0, verbose_name='Destinataires traités')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast', to='messaging.message')),
+            ],
+            options={
+                'verbose_name': 'Diffusion de message',
+                'verbose_name_plural': 'Diffusions de messages',
+                'db_table': 'message_broadcasts',
+            },
+        ),
+    ]
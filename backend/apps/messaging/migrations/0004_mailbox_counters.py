@@ -0,0 +1,65 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:15
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    """Compteurs initiaux calculés depuis les destinataires et les envois"""
+    MailboxCounter = apps.get_model('messaging', 'MailboxCounter')
+    MessageRecipient = apps.get_model('messaging', 'MessageRecipient')
+    Message = apps.get_model('messaging', 'Message')
+    
+    counters = {}
+    received = MessageRecipient.objects.values('recipient_id', 'folder').annotate(
+        total=models.Count('id'),
+        unread=models.Count('id', filter=models.Q(is_read=False))
+    ).order_by()
+    for row in received:
+        counters[(row['recipient_id'], row['folder'])] = (row['total'], row['unread'])
+    
+    sent = Message.objects.filter(sent_at__isnull=False).values('sender_id').annotate(
+        total=models.Count('id')
+    ).order_by()
+    for row in sent:
+        counters[(row['sender_id'], 'sent')] = (row['total'], 0)
+    
+    MailboxCounter.objects.bulk_create(
+        [
+            MailboxCounter(user_id=user_id, folder=folder, total=total, unread=unread)
+            for (user_id, folder), (total, unread) in counters.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_message_broadcasts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailboxCounter',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('folder', models.CharField(choices=[('inbox', 'Boîte de réception'), ('sent', 'Messages envoyés'), ('draft', 'Brouillons'), ('trash', 'Corbeille'), ('archive', 'Archives')], max_length=20, verbose_name='Dossier')),
+                ('total', models.IntegerField(default=0, verbose_name='Messages')),
+                ('unread', models.IntegerField(default=0, verbose_name='Non lus')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mailbox_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Compteur de dossier',
+                'verbose_name_plural': 'Compteurs de dossiers',
+                'db_table': 'mailbox_counters',
+                'unique_together': {('user', 'folder')},
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
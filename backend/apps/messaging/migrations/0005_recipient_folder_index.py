@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_mailbox_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagerecipient',
+            index=models.Index(fields=['recipient', 'folder', '-created_at'], name='message_rec_recipie_4169b3_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:20
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Extensions installées dans ``public`` : la migration est rejouée pour
+# chaque schéma de tenant et l'extension n'existe qu'une fois par base
+EXTENSIONS_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent SCHEMA public;",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;",
+]
+
+SEARCH_SQL = [
+    # Configuration française insensible aux accents
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_ts_config c JOIN pg_namespace n ON n.oid = c.cfgnamespace
+            WHERE c.cfgname = 'french_unaccent' AND n.nspname = 'public'
+        ) THEN
+            CREATE TEXT SEARCH CONFIGURATION public.french_unaccent (COPY = pg_catalog.french);
+            ALTER TEXT SEARCH CONFIGURATION public.french_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+        END IF;
+    END
+    $$;
+    """,
+    # Vecteur tenu à jour à chaque écriture de l'objet ou du corps
+    """
+    CREATE OR REPLACE FUNCTION messages_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('public.french_unaccent', coalesce(NEW.subject, '')), 'A') ||
+            setweight(to_tsvector('public.french_unaccent', coalesce(NEW.body, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS messages_search_vector_trigger ON messages;",
+    """
+    CREATE TRIGGER messages_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF subject, body ON messages
+        FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update();
+    """,
+    "UPDATE messages SET subject = subject;",
+    "CREATE INDEX IF NOT EXISTS messages_search_vector_gin ON messages USING gin (search_vector);",
+    "CREATE INDEX IF NOT EXISTS users_first_name_trgm ON users USING gin (first_name gin_trgm_ops);",
+    "CREATE INDEX IF NOT EXISTS users_last_name_trgm ON users USING gin (last_name gin_trgm_ops);",
+]
+
+REVERSE_SQL = [
+    "DROP INDEX IF EXISTS users_last_name_trgm;",
+    "DROP INDEX IF EXISTS users_first_name_trgm;",
+    "DROP INDEX IF EXISTS messages_search_vector_gin;",
+    "DROP TRIGGER IF EXISTS messages_search_vector_trigger ON messages;",
+    "DROP FUNCTION IF EXISTS messages_search_vector_update();",
+]
+
+
+def create_extensions(apps, schema_editor):
+    """Extensions unaccent et pg_trgm (PostgreSQL uniquement)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in EXTENSIONS_SQL:
+        schema_editor.execute(statement)
+
+
+def create_search(apps, schema_editor):
+    """Déclencheur et index de recherche (PostgreSQL uniquement)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in SEARCH_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_recipient_folder_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_extensions, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='message',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:26
+
+from django.db import migrations, models
+
+
+def fill_members(apps, schema_editor):
+    """Membres des groupes dynamiques matérialisés, nombre de membres de tous les groupes"""
+    MessageGroup = apps.get_model('messaging', 'MessageGroup')
+    User = apps.get_model('authentication', 'User')
+    Membership = MessageGroup.members.through
+    
+    for group in MessageGroup.objects.filter(is_dynamic=True):
+        criteria = models.Q(is_active=True)
+        if group.dynamic_class_id:
+            criteria &= models.Q(
+                enrollments__class_group_id=group.dynamic_class_id,
+                enrollments__is_active=True
+            )
+        if group.dynamic_user_type:
+            criteria &= models.Q(user_type=group.dynamic_user_type)
+        
+        user_ids = set(User.objects.filter(criteria).values_list('id', flat=True).distinct())
+        Membership.objects.filter(messagegroup=group).delete()
+        Membership.objects.bulk_create(
+            [Membership(messagegroup=group, user_id=user_id) for user_id in user_ids],
+            batch_size=1000
+        )
+    
+    counts = MessageGroup.objects.annotate(total=models.Count('members')).values_list('pk', 'total')
+    for group_id, total in counts:
+        MessageGroup.objects.filter(pk=group_id).update(member_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_message_search'),
+        ('schools', '__first__'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagegroup',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, help_text='Tenu à jour avec les membres', verbose_name='Nombre de membres'),
+        ),
+        migrations.RunPython(fill_members, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:29
+
+import apps.tenants.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_group_member_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='messageattachment',
+            name='file',
+            field=models.FileField(storage=apps.tenants.storage.get_content_storage, upload_to='messages/attachments/%Y/%m/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'jpg', 'jpeg', 'png', 'gif', 'zip', 'txt'])], verbose_name='Fichier'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 """
 Modèles pour le système de messagerie interne
 """
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
@@ -9,13 +9,18 @@ from django.utils import timezone
 # ArrayField compatibility for SQLite
 try:
     from django.contrib.postgres.fields import ArrayField
+    from django.contrib.postgres.search import SearchVectorField
 except ImportError:
     # Fallback for SQLite
     class ArrayField(models.JSONField):
         def __init__(self, base_field, **kwargs):
             kwargs.setdefault('default', list)
             super().__init__(**kwargs)
+
+    class SearchVectorField(models.TextField):
+        pass
 from apps.core.models import BaseModel
+from apps.tenants.storage import get_content_storage
 from apps.authentication.models import User
 from apps.schools.models import Class, School
 
@@ -79,6 +84,23 @@ class Message(BaseModel):
         verbose_name=_("Message parent")
     )
     
+    # Fil de discussion (dénormalisé : renseigné à la création d'une réponse)
+    root_message = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='thread_replies',
+        verbose_name=_("Message racine"),
+        help_text=_("Vide pour le message racine du fil")
+    )
+    thread_size = models.PositiveIntegerField(
+        default=1,
+        verbose_name=_("Messages dans le fil"),
+        help_text=_("Tenu à jour sur le message racine uniquement")
+    )
+    
     # État
     sent_at = models.DateTimeField(
         null=True,
@@ -86,6 +108,13 @@ class Message(BaseModel):
         verbose_name=_("Date d'envoi")
     )
     
+    # Recherche plein texte (objet et corps), tenu à jour par un
+    # déclencheur PostgreSQL (migration 0006_message_search)
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False
+    )
+    
     # Paramètres
     allow_reply = models.BooleanField(
         default=True,
@@ -110,11 +139,30 @@ class Message(BaseModel):
         indexes = [
             models.Index(fields=['sender', 'sent_at']),
             models.Index(fields=['subject']),
+            models.Index(fields=['root_message', 'created_at']),
         ]
     
     def __str__(self):
         return f"{self.subject} - {self.sender.get_full_name()}"
     
+    def save(self, *args, **kwargs):
+        is_new_reply = self._state.adding and self.parent_message_id
+        if is_new_reply and not self.root_message_id:
+            parent = self.parent_message
+            self.root_message_id = parent.root_message_id or parent.id
+        
+        super().save(*args, **kwargs)
+        
+        if is_new_reply:
+            Message.objects.filter(pk=self.root_message_id).update(
+                thread_size=models.F('thread_size') + 1
+            )
+    
+    @property
+    def thread_root_id(self):
+        """Identifiant du message racine du fil"""
+        return self.root_message_id or self.id
+    
     @property
     def is_draft(self):
         """Vérifie si le message est un brouillon"""
@@ -123,40 +171,22 @@ class Message(BaseModel):
     @property
     def thread_count(self):
         """Nombre de messages dans le fil de discussion"""
-        count = 1  # Le message lui-même
-        if self.parent_message:
-            # Remonter jusqu'au message racine
-            root = self.get_root_message()
-            count = root.get_thread_messages().count()
-        else:
-            # C'est le message racine
-            count = self.get_thread_messages().count()
-        return count
+        if self.root_message_id:
+            return self.root_message.thread_size
+        return self.thread_size
     
     def get_root_message(self):
         """Récupère le message racine du fil"""
-        message = self
-        while message.parent_message:
-            message = message.parent_message
-        return message
+        if self.root_message_id:
+            return self.root_message
+        return self
     
     def get_thread_messages(self):
-        """Récupère tous les messages du fil"""
-        if self.parent_message:
-            return self.get_root_message().get_thread_messages()
-        
-        # Récupérer tous les descendants
-        messages = [self]
-        replies = list(self.replies.all())
-        
-        while replies:
-            messages.extend(replies)
-            new_replies = []
-            for reply in replies:
-                new_replies.extend(list(reply.replies.all()))
-            replies = new_replies
-        
-        return Message.objects.filter(id__in=[m.id for m in messages])
+        """Récupère tous les messages du fil (une requête indexée)"""
+        root_id = self.thread_root_id
+        return Message.objects.filter(
+            models.Q(pk=root_id) | models.Q(root_message_id=root_id)
+        )
     
     def send(self):
         """Envoyer le message"""
@@ -166,6 +196,9 @@ class Message(BaseModel):
         self.sent_at = timezone.now()
         self.save()
         
+        from .mailbox import record_sent
+        record_sent(self.sender_id)
+        
         # Si redirection email activée, envoyer par email
         if self.forward_to_email:
             from .tasks import send_message_by_email
@@ -237,6 +270,7 @@ class MessageRecipient(BaseModel):
         indexes = [
             models.Index(fields=['recipient', 'folder', 'is_read']),
             models.Index(fields=['recipient', 'is_starred']),
+            models.Index(fields=['recipient', 'folder', '-created_at']),
         ]
     
     def __str__(self):
@@ -245,9 +279,13 @@ class MessageRecipient(BaseModel):
     def mark_as_read(self):
         """Marquer comme lu"""
         if not self.is_read:
+            from .mailbox import adjust_counters
+            
             self.is_read = True
             self.read_at = timezone.now()
-            self.save()
+            with transaction.atomic():
+                self.save()
+                adjust_counters({(self.recipient_id, self.folder): (0, -1)})
             
             # Envoyer accusé de lecture si demandé
             if self.message.request_read_receipt:
@@ -259,10 +297,20 @@ class MessageRecipient(BaseModel):
         if folder not in MessageFolder.values:
             raise ValidationError(f"Dossier invalide: {folder}")
         
+        from .mailbox import adjust_counters
+        
+        unread = 0 if self.is_read else 1
+        deltas = {
+            (self.recipient_id, self.folder): (-1, -unread),
+            (self.recipient_id, folder): (1, unread),
+        } if folder != self.folder else {}
+        
         self.folder = folder
         if folder == MessageFolder.ARCHIVE:
             self.is_archived = True
-        self.save()
+        with transaction.atomic():
+            self.save()
+            adjust_counters(deltas)
     
     def toggle_star(self):
         """Ajouter/retirer des favoris"""
@@ -270,6 +318,42 @@ class MessageRecipient(BaseModel):
         self.save()
 
 
+class MailboxCounter(BaseModel):
+    """
+    Compteurs d'un dossier de la messagerie d'un utilisateur
+    
+    Tenus à jour avec les destinataires (voir ``mailbox.py``) et
+    recalculés périodiquement.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mailbox_counters'
+    )
+    folder = models.CharField(
+        max_length=20,
+        choices=MessageFolder.choices,
+        verbose_name=_("Dossier")
+    )
+    total = models.IntegerField(
+        default=0,
+        verbose_name=_("Messages")
+    )
+    unread = models.IntegerField(
+        default=0,
+        verbose_name=_("Non lus")
+    )
+    
+    class Meta:
+        db_table = 'mailbox_counters'
+        verbose_name = _("Compteur de dossier")
+        verbose_name_plural = _("Compteurs de dossiers")
+        unique_together = ['user', 'folder']
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.folder}: {self.unread}/{self.total}"
+
+
 class MessageAttachment(BaseModel):
     """
     Pièce jointe d'un message
@@ -282,6 +366,7 @@ class MessageAttachment(BaseModel):
     
     file = models.FileField(
         upload_to='messages/attachments/%Y/%m/',
+        storage=get_content_storage,
         validators=[
             FileExtensionValidator(
                 allowed_extensions=['pdf', 'doc', 'docx', 'xls', 'xlsx',
@@ -491,6 +576,12 @@ class MessageGroup(BaseModel):
         verbose_name=_("Nombre d'utilisations")
     )
     
+    member_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Nombre de membres"),
+        help_text=_("Tenu à jour avec les membres")
+    )
+    
     class Meta:
         db_table = 'message_groups'
         verbose_name = _("Groupe de destinataires")
@@ -501,38 +592,135 @@ class MessageGroup(BaseModel):
     def __str__(self):
         return f"{self.name} ({self.get_member_count()} membres)"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Les critères ont pu changer : recalculer les membres
+        if self.is_dynamic:
+            self.refresh_members()
+    
     def get_member_count(self):
         """Nombre de membres du groupe"""
-        if self.is_dynamic:
-            return self.get_dynamic_members().count()
-        return self.members.count()
+        return self.member_count
     
-    def get_dynamic_members(self):
-        """Récupérer les membres pour un groupe dynamique"""
-        if not self.is_dynamic:
-            return self.members.all()
-        
-        queryset = User.objects.filter(is_active=True)
+    def members_filter(self):
+        """Critère (sur ``User``) des membres du groupe"""
+        return models.Q(messaging_groups=self)
+    
+    def dynamic_filter(self):
+        """Critère (sur ``User``) des membres d'un groupe dynamique"""
+        criteria = models.Q(is_active=True)
         
-        if self.dynamic_class:
+        if self.dynamic_class_id:
             # Tous les élèves de la classe
-            queryset = queryset.filter(
-                enrollments__class_group=self.dynamic_class,
+            criteria &= models.Q(
+                enrollments__class_group_id=self.dynamic_class_id,
                 enrollments__is_active=True
             )
         
         if self.dynamic_user_type:
-            queryset = queryset.filter(user_type=self.dynamic_user_type)
+            criteria &= models.Q(user_type=self.dynamic_user_type)
         
-        return queryset.distinct()
+        return criteria
+    
+    def refresh_members(self):
+        """
+        Matérialiser les membres d'un groupe dynamique
+        
+        Seules les différences sont écrites (insertion et suppression
+        groupées), puis le nombre de membres est enregistré.
+        """
+        Membership = MessageGroup.members.through
+        expected = set(
+            User.objects.filter(self.dynamic_filter()).values_list('id', flat=True).distinct()
+        )
+        current = set(
+            Membership.objects.filter(messagegroup=self).values_list('user_id', flat=True)
+        )
+        
+        with transaction.atomic():
+            Membership.objects.filter(
+                messagegroup=self,
+                user_id__in=current - expected
+            ).delete()
+            Membership.objects.bulk_create(
+                [Membership(messagegroup=self, user_id=user_id) for user_id in expected - current],
+                ignore_conflicts=True
+            )
+            MessageGroup.objects.filter(pk=self.pk).update(member_count=len(expected))
+        self.member_count = len(expected)
+    
+    def get_dynamic_members(self):
+        """Récupérer les membres pour un groupe dynamique"""
+        return self.members.all()
     
     def get_all_members(self):
         """Récupérer tous les membres (statiques + dynamiques)"""
-        if self.is_dynamic:
-            return self.get_dynamic_members()
         return self.members.all()
 
 
+class MessageBroadcast(BaseModel):
+    """
+    Suivi de la distribution d'un message à un grand nombre de destinataires
+    
+    Les destinataires sont insérés par lots en tâche de fond ; le message
+    n'est envoyé qu'une fois tous les lots insérés. Une reprise repart du
+    dernier lot enregistré.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('completed', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+    
+    message = models.OneToOneField(
+        Message,
+        on_delete=models.CASCADE,
+        related_name='broadcast'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name=_("Statut")
+    )
+    
+    # Destinataires demandés (résolus à nouveau par la tâche)
+    recipient_ids = models.JSONField(default=list, blank=True)
+    group_ids = models.JSONField(default=list, blank=True)
+    send_on_completion = models.BooleanField(
+        default=True,
+        verbose_name=_("Envoyer à la fin de la distribution")
+    )
+    
+    total_recipients = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Nombre de destinataires")
+    )
+    processed_recipients = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Destinataires traités")
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    
+    class Meta:
+        db_table = 'message_broadcasts'
+        verbose_name = _("Diffusion de message")
+        verbose_name_plural = _("Diffusions de messages")
+    
+    def __str__(self):
+        return f"{self.message.subject} ({self.get_status_display()})"
+    
+    @property
+    def progress(self):
+        """Pourcentage d'avancement"""
+        if not self.total_recipients:
+            return 100 if self.status == 'completed' else 0
+        return round(self.processed_recipients / self.total_recipients * 100)
+
+
 class EmailForwarding(BaseModel):
     """
     Configuration de redirection email
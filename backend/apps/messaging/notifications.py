@@ -0,0 +1,206 @@
+"""
+Envoi groupé des notifications de nouveaux messages
+
+Pour un lot de destinataires, ``NotificationDispatcher`` lit toutes les
+préférences en une requête (les préférences manquantes sont créées en une
+insertion), répartit les envois par canal, envoie les emails immédiats sur
+une seule connexion SMTP et marque les destinataires notifiés en une
+requête UPDATE.
+
+Seuls les emails effectivement remis sont marqués ``email_sent`` : un
+nouvel appel (reprise de la tâche) renvoie les emails immédiats restés en
+échec, sans répéter les notifications push déjà faites.
+
+Les emails passent par ``EMAIL_BACKEND`` : le backend ``locmem`` de Django
+ou un serveur SMTP local suffisent pour vérifier les envois.
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from .models import MessageRecipient, NotificationPreference
+
+logger = logging.getLogger(__name__)
+
+
+def load_preferences(user_ids):
+    """
+    Préférences de notification de ``user_ids`` : {user_id: préférences}
+
+    Une requête de lecture ; les utilisateurs sans préférences reçoivent
+    les valeurs par défaut, enregistrées en une insertion groupée.
+    """
+    preferences = {
+        prefs.user_id: prefs
+        for prefs in NotificationPreference.objects.filter(user_id__in=user_ids)
+    }
+    missing = [
+        NotificationPreference(user_id=user_id)
+        for user_id in user_ids if user_id not in preferences
+    ]
+    if missing:
+        NotificationPreference.objects.bulk_create(missing, ignore_conflicts=True)
+        preferences.update((prefs.user_id, prefs) for prefs in missing)
+    return preferences
+
+
+def send_push_notification(user, message):
+    """Envoyer une notification push"""
+    # TODO: Implémenter avec Firebase ou autre service
+    logger.info(f"Notification push pour {user.email}: {message.subject}")
+
+
+def queue_email_notification(user, message):
+    """Ajouter à la file pour envoi groupé"""
+    # Les destinataires non notifiés par email (``email_sent=False``) sont
+    # repris par ``process_email_batch`` selon leur fréquence
+    pass
+
+
+def build_email(user, message):
+    """Email de notification d'un nouveau message pour ``user``"""
+    context = {
+        'user': user,
+        'message': message,
+        'sender': message.sender,
+        'site_url': getattr(settings, 'FRONTEND_URL', '')
+    }
+
+    html_message = render_to_string('emails/new_message.html', context)
+    email = EmailMultiAlternatives(
+        subject=f"Nouveau message: {message.subject}",
+        body=strip_tags(html_message),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email]
+    )
+    email.attach_alternative(html_message, 'text/html')
+    return email
+
+
+class NotificationDispatcher:
+    """
+    Notifications d'un message pour un lot de destinataires
+
+    ``dispatch`` renvoie le nombre de notifications envoyées (push et
+    emails immédiats) ; ``failed`` liste ensuite les destinataires dont
+    l'email immédiat n'a pas été remis.
+    """
+
+    def __init__(self, message, connection=None):
+        self.message = message
+        self.connection = connection
+        self.failed = []
+
+    def plan(self, recipients):
+        """Répartir les destinataires par canal selon leurs préférences"""
+        preferences = load_preferences([recipient.recipient_id for recipient in recipients])
+        channels = {'push': [], 'email': [], 'queued': []}
+
+        for recipient in recipients:
+            prefs = preferences[recipient.recipient_id]
+            if not recipient.notification_sent and prefs.should_send_notification(self.message, 'push'):
+                channels['push'].append(recipient)
+            if not recipient.email_sent and prefs.should_send_notification(self.message, 'email'):
+                if prefs.email_frequency == 'instant':
+                    channels['email'].append(recipient)
+                elif not recipient.notification_sent:
+                    channels['queued'].append(recipient)
+        return channels
+
+    def send_push(self, recipients):
+        for recipient in recipients:
+            send_push_notification(recipient.recipient, self.message)
+        return len(recipients)
+
+    def send_emails(self, recipients):
+        """
+        Emails immédiats sur une seule connexion
+
+        Chaque email est remis séparément sur la connexion ouverte, ce qui
+        indique précisément les envois réussis (y compris avec
+        ``fail_silently``). Les destinataires servis sont marqués
+        ``email_sent`` en une requête ; les autres restent à envoyer.
+        Renvoie les destinataires servis.
+        """
+        recipients = [recipient for recipient in recipients if recipient.recipient.email]
+        if not recipients:
+            return []
+
+        emails = []
+        for recipient in recipients:
+            try:
+                emails.append((recipient, build_email(recipient.recipient, self.message)))
+            except Exception as e:
+                logger.error(f"Erreur préparation email pour {recipient.recipient.email}: {str(e)}")
+        if not emails:
+            return []
+
+        connection = self.connection or get_connection()
+        delivered = []
+        try:
+            connection.open()
+            for recipient, email in emails:
+                try:
+                    if connection.send_messages([email]):
+                        delivered.append(recipient)
+                except Exception as e:
+                    logger.error(f"Erreur envoi email pour {recipient.recipient.email}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Erreur connexion SMTP pour le message {self.message.id}: {str(e)}")
+        finally:
+            if self.connection is None:
+                connection.close()
+
+        if delivered:
+            MessageRecipient.objects.filter(
+                pk__in=[recipient.pk for recipient in delivered]
+            ).update(email_sent=True)
+            for recipient in delivered:
+                recipient.email_sent = True
+        return delivered
+
+    def dispatch(self, recipients):
+        recipients = list(recipients)
+        if not recipients:
+            return 0
+
+        channels = self.plan(recipients)
+        sent = self.send_push(channels['push'])
+        delivered = self.send_emails(channels['email'])
+        sent += len(delivered)
+        for recipient in channels['queued']:
+            queue_email_notification(recipient.recipient, self.message)
+
+        self.failed = [
+            recipient for recipient in channels['email']
+            if recipient.recipient.email and not recipient.email_sent
+        ]
+
+        MessageRecipient.objects.filter(
+            pk__in=[recipient.pk for recipient in recipients if not recipient.notification_sent]
+        ).update(notification_sent=True)
+        return sent
+
+
+def notify_recipients(message, recipient_ids=None):
+    """
+    Notifier les destinataires de ``message`` (tous, ou ``recipient_ids``)
+
+    Les destinataires déjà notifiés sont ignorés, sauf si leur email
+    immédiat n'a pas été remis : la tâche est rejouable sans doublon.
+    Renvoie ``(notifications envoyées, identifiants des destinataires en
+    échec)``.
+    """
+    recipients = message.recipients.filter(
+        Q(notification_sent=False) | Q(email_sent=False)
+    ).select_related('recipient')
+    if recipient_ids is not None:
+        recipients = recipients.filter(recipient_id__in=recipient_ids)
+
+    dispatcher = NotificationDispatcher(message)
+    sent = dispatcher.dispatch(recipients)
+    return sent, [str(recipient.recipient_id) for recipient in dispatcher.failed]
@@ -0,0 +1,235 @@
+"""
+Limitation du débit d'envoi des messages
+
+Chaque envoi (nouveau message, réponse, message depuis un modèle) est
+compté sur une fenêtre glissante, en nombre de messages et en nombre de
+destinataires. Les compteurs sont tenus dans le cache Django (Redis en
+production) par tranches d'une minute : un envoi coûte deux incréments,
+une vérification une lecture groupée des tranches de la fenêtre.
+
+Les limites dépendent du type d'utilisateur (``MESSAGING_RATE_LIMITS``).
+Un envoi qui dépasse sa limite est refusé avant la création des lignes
+destinataires (HTTP 429) et l'utilisateur est signalé aux administrateurs.
+Les brouillons (``send_now=False``) ne sont pas comptés. Si le cache est
+indisponible, les envois ne sont pas bloqués.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+
+from apps.tenants.utils import get_current_schema
+from .models import MessageGroup
+
+logger = logging.getLogger(__name__)
+
+# Par type d'utilisateur, sur la fenêtre : messages envoyés et destinataires
+# cumulés ; ``None`` désactive la limite
+DEFAULT_LIMITS = {
+    'student': {'messages': 30, 'recipients': 200},
+    'parent': {'messages': 30, 'recipients': 100},
+    'teacher': {'messages': 200, 'recipients': 5000},
+    'admin': {'messages': 500, 'recipients': 50000},
+    'superadmin': None,
+}
+
+LIMIT_LABELS = {
+    'messages': 'messages',
+    'recipients': 'destinataires',
+}
+
+
+def get_limits(user_type):
+    """Limites du type d'utilisateur (réglages complétés par les défauts)"""
+    limits = {**DEFAULT_LIMITS, **getattr(settings, 'MESSAGING_RATE_LIMITS', {})}
+    return limits.get(user_type, DEFAULT_LIMITS['student'])
+
+
+def estimate_recipients(recipient_ids=(), group_ids=()):
+    """
+    Nombre de destinataires d'un envoi, sans résoudre les groupes
+
+    Le nombre de membres stocké sur chaque groupe suffit (une requête) ;
+    les doublons entre groupes sont comptés, ce qui majore l'estimation.
+    """
+    total = len(set(recipient_ids))
+    if group_ids:
+        total += sum(
+            MessageGroup.objects.filter(id__in=list(group_ids)).values_list(
+                'member_count', flat=True
+            )
+        )
+    return total
+
+
+class SendRateLimiter:
+    """
+    Compteurs d'envoi sur fenêtre glissante, par tenant et par utilisateur
+
+    La fenêtre de ``window`` secondes est découpée en tranches de
+    ``bucket`` secondes ; chaque tranche expire seule du cache.
+    """
+
+    def __init__(self, cache=None, window=None, bucket=None, clock=time.time):
+        self.cache = cache or caches[getattr(settings, 'MESSAGING_RATE_LIMIT_CACHE', 'default')]
+        self.window = window or getattr(settings, 'MESSAGING_RATE_WINDOW', 3600)
+        self.bucket = bucket or getattr(settings, 'MESSAGING_RATE_BUCKET', 60)
+        self.clock = clock
+
+    @property
+    def bucket_count(self):
+        return max(1, self.window // self.bucket)
+
+    def _prefix(self, tenant=None):
+        return f'msgrate:{tenant or get_current_schema()}'
+
+    def _key(self, user_id, kind, index, tenant=None):
+        return f'{self._prefix(tenant)}:{user_id}:{kind}:{index}'
+
+    def _indexes(self, now):
+        current = int(now // self.bucket)
+        return range(current - self.bucket_count + 1, current + 1)
+
+    def _increment(self, key, delta):
+        # ``add`` ne remplace pas une tranche existante ; ``incr`` est
+        # atomique sur Redis
+        self.cache.add(key, 0, self.window + self.bucket)
+        return self.cache.incr(key, delta)
+
+    def buckets(self, user_id, tenant=None, now=None):
+        """Compteurs par tranche : {type: [(tranche, valeur), ...]}"""
+        indexes = self._indexes(self.clock() if now is None else now)
+        keys = {
+            self._key(user_id, kind, index, tenant): (kind, index)
+            for kind in LIMIT_LABELS for index in indexes
+        }
+        values = self.cache.get_many(list(keys))
+
+        buckets = {kind: [] for kind in LIMIT_LABELS}
+        for key, value in values.items():
+            kind, index = keys[key]
+            if value:
+                buckets[kind].append((index, int(value)))
+        for kind in buckets:
+            buckets[kind].sort()
+        return buckets
+
+    def usage(self, user_id, tenant=None, now=None):
+        """Envois de l'utilisateur sur la fenêtre en cours"""
+        return {
+            kind: sum(value for _, value in values)
+            for kind, values in self.buckets(user_id, tenant, now).items()
+        }
+
+    def retry_after(self, values, excess, now):
+        """Secondes avant que les plus anciennes tranches libèrent ``excess``"""
+        for index, value in values:
+            excess -= value
+            if excess <= 0:
+                return max(1, int((index + self.bucket_count) * self.bucket - now))
+        return self.window
+
+    def consume(self, user, recipients):
+        """
+        Compter un envoi de ``recipients`` destinataires pour ``user``
+
+        Renvoie ``None`` si l'envoi est accepté, sinon (type, limite,
+        secondes d'attente) ; un envoi refusé n'est pas compté.
+        """
+        now = self.clock()
+        index = int(now // self.bucket)
+        amounts = {'messages': 1, 'recipients': recipients}
+
+        try:
+            keys = {kind: self._key(user.pk, kind, index) for kind in amounts}
+            for kind, amount in amounts.items():
+                self._increment(keys[kind], amount)
+            buckets = self.buckets(user.pk, now=now)
+        except ValueError:
+            # Cache sans compteurs (DummyCache) : pas de limitation
+            return None
+        except Exception as e:
+            # Cache indisponible (Redis arrêté...) : l'envoi n'est pas bloqué
+            logger.warning(f"Limite d'envoi non vérifiée pour {user.pk}: {str(e)}")
+            return None
+
+        limits = get_limits(user.user_type)
+        if limits is None:
+            return None
+
+        for kind, limit in limits.items():
+            used = sum(value for _, value in buckets[kind])
+            if used <= limit:
+                continue
+            try:
+                for name, amount in amounts.items():
+                    self.cache.decr(keys[name], amount)
+            except Exception as e:
+                logger.warning(f"Envoi refusé non décompté pour {user.pk}: {str(e)}")
+            return kind, limit, self.retry_after(buckets[kind], used - limit, now)
+        return None
+
+    def flag(self, user, kind, limit):
+        """Signaler un dépassement aux administrateurs"""
+        key = f'{self._prefix()}:flagged'
+        entry = {'rejections': 0}
+        try:
+            flagged = self.cache.get(key) or {}
+            entry = flagged.get(str(user.pk), entry)
+            entry.update({
+                'user_id': str(user.pk),
+                'user_type': user.user_type,
+                'limit': kind,
+                'rejections': entry['rejections'] + 1,
+                'last_rejected_at': timezone.now().isoformat(),
+            })
+            flagged[str(user.pk)] = entry
+            self.cache.set(key, flagged, self.window * 24)
+        except Exception as e:
+            logger.warning(f"Signalement de {user.pk} non enregistré: {str(e)}")
+
+        logger.warning(
+            f"Limite d'envoi atteinte: User {user.pk} ({user.user_type}) "
+            f"au-delà de {limit} {LIMIT_LABELS[kind]} "
+            f"({entry['rejections']} refus)"
+        )
+
+    def flagged(self, tenant=None):
+        """Utilisateurs ayant dépassé leur limite récemment"""
+        return list((self.cache.get(f'{self._prefix(tenant)}:flagged') or {}).values())
+
+
+_limiter = None
+
+
+def get_limiter():
+    """Limiteur partagé du processus"""
+    global _limiter
+    if _limiter is None:
+        _limiter = SendRateLimiter()
+    return _limiter
+
+
+def check_send_rate(user, recipients):
+    """
+    Compter un envoi ou le refuser (``Throttled``, HTTP 429)
+
+    À appeler avant la création du message et de ses destinataires.
+    """
+    limiter = get_limiter()
+    exceeded = limiter.consume(user, recipients)
+    if exceeded is None:
+        return
+
+    kind, limit, wait = exceeded
+    limiter.flag(user, kind, limit)
+    raise Throttled(
+        wait=wait,
+        detail=(
+            f"Limite d'envoi atteinte : {limit} {LIMIT_LABELS[kind]} "
+            f"par période de {limiter.window // 60} minutes."
+        )
+    )
@@ -0,0 +1,212 @@
+"""
+Conservation des messages : purge de la corbeille et des messages orphelins
+
+Les suppressions se font par lots bornés, en SQL brut
+(``DELETE ... WHERE id IN (SELECT ... LIMIT n)``) : l'ORM ne charge ni ne
+cascade les lignes en mémoire, et chaque lot est une courte transaction.
+Les compteurs de boîte aux lettres et la taille des fils sont ajustés à
+partir des lignes supprimées (``RETURNING``), les fichiers des pièces
+jointes effacés une fois leur lot validé. Une pause entre les lots laisse
+la base servir le trafic courant.
+
+Les durées de conservation sont réglables par tenant dans
+``MESSAGING_RETENTION`` : ``{'default': {...}, '<schéma>': {...}}``.
+"""
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from apps.tenants.utils import get_current_schema
+from .mailbox import adjust_counters
+from .models import (
+    Message, MessageAttachment, MessageBroadcast, MessageFolder, MessageRecipient
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICY = {
+    # Jours passés dans la corbeille avant suppression définitive
+    'trash_days': 30,
+    # Ancienneté des messages envoyés n'ayant plus aucun destinataire
+    'orphan_days': 30,
+    'batch_size': 1000,
+    # Pause entre deux lots (secondes)
+    'pause': 0.1,
+}
+
+
+def get_policy(tenant=None):
+    """Politique de conservation du tenant (valeurs par défaut complétées)"""
+    policies = getattr(settings, 'MESSAGING_RETENTION', {})
+    return {
+        **DEFAULT_POLICY,
+        **policies.get('default', {}),
+        **policies.get(tenant or get_current_schema(), {}),
+    }
+
+
+def delete_rows(queryset, limit=None, returning=()):
+    """
+    ``DELETE FROM table WHERE id IN (SELECT id ... LIMIT n)`` en SQL brut
+
+    Sans signaux ni cascade : les lignes dépendantes doivent déjà avoir
+    été supprimées. Renvoie les colonnes ``returning`` des lignes
+    supprimées, ou leur nombre.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+
+    selection = queryset.order_by('pk').values('pk')
+    if limit is not None:
+        selection = selection[:limit]
+    select_sql, params = selection.query.sql_with_params()
+
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(model._meta.pk.column)} IN ({select_sql})'
+    )
+    if returning:
+        sql += ' RETURNING ' + ', '.join(
+            quote(model._meta.get_field(name).column) for name in returning
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall() if returning else cursor.rowcount
+
+
+def remove_files(names):
+    """Effacer les fichiers de pièces jointes (après validation du lot)"""
+    storage = MessageAttachment._meta.get_field('file').storage
+    for name in names:
+        if not name:
+            continue
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.warning(f"Pièce jointe {name} non supprimée: {str(e)}")
+
+
+class RetentionRun:
+    """
+    Une exécution de la purge pour le tenant courant
+
+    ``progress`` est appelé après chaque lot avec l'étape et les totaux ;
+    ``max_batches`` borne le nombre de lots par étape (reprise au passage
+    suivant).
+    """
+
+    def __init__(self, policy=None, progress=None, max_batches=None, now=None, sleep=time.sleep):
+        self.policy = policy or get_policy()
+        self.progress = progress
+        self.max_batches = max_batches
+        self.now = now or timezone.now()
+        self.sleep = sleep
+        self.stats = {'trash': 0, 'orphans': 0, 'attachments': 0, 'batches': 0}
+
+    def _after_batch(self, step):
+        self.stats['batches'] += 1
+        logger.info(f"Conservation ({step}) : {self.stats}")
+        if self.progress is not None:
+            self.progress(step, dict(self.stats))
+        if self.policy['pause']:
+            self.sleep(self.policy['pause'])
+
+    def _batches(self):
+        count = 0
+        while self.max_batches is None or count < self.max_batches:
+            yield count
+            count += 1
+
+    def purge_trash(self):
+        """Destinataires restés dans la corbeille au-delà du délai"""
+        threshold = self.now - timedelta(days=self.policy['trash_days'])
+        expired = MessageRecipient.objects.filter(
+            folder=MessageFolder.TRASH,
+            updated_at__lt=threshold
+        )
+
+        for _ in self._batches():
+            with transaction.atomic():
+                rows = delete_rows(
+                    expired, self.policy['batch_size'], returning=['recipient', 'is_read']
+                )
+                deltas = defaultdict(lambda: [0, 0])
+                for recipient_id, is_read in rows:
+                    delta = deltas[(recipient_id, MessageFolder.TRASH)]
+                    delta[0] -= 1
+                    delta[1] -= 0 if is_read else 1
+                adjust_counters({key: tuple(value) for key, value in deltas.items()})
+
+            self.stats['trash'] += len(rows)
+            if not rows:
+                break
+            self._after_batch('trash')
+            if len(rows) < self.policy['batch_size']:
+                break
+
+    def purge_orphans(self):
+        """
+        Messages envoyés sans plus aucun destinataire
+
+        Un message ayant encore des réponses est conservé : son fil reste
+        consultable.
+        """
+        threshold = self.now - timedelta(days=self.policy['orphan_days'])
+        orphans = Message.objects.filter(
+            sent_at__isnull=False,
+            sent_at__lt=threshold
+        ).filter(
+            ~Exists(MessageRecipient.objects.filter(message=OuterRef('pk'))),
+            ~Exists(Message.objects.filter(
+                Q(parent_message=OuterRef('pk')) | Q(root_message=OuterRef('pk'))
+            ))
+        )
+
+        for _ in self._batches():
+            with transaction.atomic():
+                ids = list(
+                    orphans.order_by('pk').values_list('pk', flat=True)[:self.policy['batch_size']]
+                )
+                if not ids:
+                    break
+
+                attachments = MessageAttachment.objects.filter(message_id__in=ids)
+                files = [name for (name,) in delete_rows(attachments, returning=['file'])]
+                delete_rows(MessageBroadcast.objects.filter(message_id__in=ids))
+                rows = delete_rows(
+                    Message.objects.filter(pk__in=ids), returning=['sender', 'root_message']
+                )
+
+                sent = Counter(sender_id for sender_id, _ in rows)
+                adjust_counters({
+                    (sender_id, MessageFolder.SENT): (-count, 0)
+                    for sender_id, count in sent.items()
+                })
+                replies = Counter(root_id for _, root_id in rows if root_id)
+                for root_id, count in replies.items():
+                    Message.objects.filter(pk=root_id).update(thread_size=F('thread_size') - count)
+
+            remove_files(files)
+            self.stats['orphans'] += len(rows)
+            self.stats['attachments'] += len(files)
+            self._after_batch('orphans')
+            if len(ids) < self.policy['batch_size']:
+                break
+
+    def run(self):
+        self.purge_trash()
+        self.purge_orphans()
+        return self.stats
+
+
+def apply_retention(progress=None, max_batches=None, tenant=None):
+    """Purger le tenant courant selon sa politique, renvoie les totaux"""
+    return RetentionRun(get_policy(tenant), progress=progress, max_batches=max_batches).run()
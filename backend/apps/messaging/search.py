@@ -0,0 +1,86 @@
+"""
+Recherche de messages
+
+Sous PostgreSQL, l'objet et le corps sont indexés dans la colonne
+``search_vector`` (configuration française sans accents, index GIN,
+déclencheur créé par la migration ``0006_message_search``) et les
+résultats sont classés par pertinence. Les noms d'expéditeurs sont
+comparés par trigrammes (index GIN ``gin_trgm_ops`` sur les utilisateurs),
+ce qui tolère aussi les fautes de frappe.
+
+Les autres bases (SQLite en développement) retombent sur une recherche
+par sous-chaîne.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from rest_framework.pagination import PageNumberPagination
+
+from apps.authentication.models import User
+from .models import MessageRecipient
+
+
+def get_search_config():
+    """Configuration de recherche plein texte (créée par la migration)"""
+    return getattr(settings, 'MESSAGING_SEARCH_CONFIG', 'public.french_unaccent')
+
+
+def uses_full_text():
+    return connection.vendor == 'postgresql'
+
+
+class MessageSearchPagination(PageNumberPagination):
+    """Résultats classés par pertinence, par pages"""
+    page_size = getattr(settings, 'MESSAGING_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def received_ids(user, **filters):
+    """Sous-requête des messages reçus par ``user`` (index destinataire)"""
+    return MessageRecipient.objects.filter(recipient=user, **filters).values('message_id')
+
+
+def visible_messages(queryset, user):
+    """
+    Messages envoyés par ``user`` ou reçus par lui
+
+    Une sous-requête sur les destinataires remplace la jointure OR suivie
+    de ``DISTINCT``.
+    """
+    return queryset.filter(
+        Q(sender=user) | Q(sent_at__isnull=False, pk__in=received_ids(user))
+    )
+
+
+def matching_senders(query):
+    """Utilisateurs dont le prénom ou le nom ressemble à ``query``"""
+    return User.objects.filter(
+        Q(first_name__trigram_word_similar=query) |
+        Q(last_name__trigram_word_similar=query)
+    ).values('pk')
+
+
+def search_text(queryset, query):
+    """
+    Filtrer ``queryset`` sur ``query`` et le trier par pertinence
+
+    Les messages d'un expéditeur reconnu par son nom viennent après les
+    correspondances dans le texte, du plus récent au plus ancien.
+    """
+    if not uses_full_text():
+        return queryset.filter(
+            Q(subject__icontains=query) |
+            Q(body__icontains=query) |
+            Q(sender__first_name__icontains=query) |
+            Q(sender__last_name__icontains=query)
+        ).order_by('-sent_at')
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    search_query = SearchQuery(query, config=get_search_config(), search_type='websearch')
+    return queryset.filter(
+        Q(search_vector=search_query) | Q(sender__in=matching_senders(query))
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query)
+    ).order_by(F('rank').desc(nulls_last=True), '-sent_at')
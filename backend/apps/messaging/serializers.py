@@ -7,8 +7,11 @@ from django.utils import timezone
 from .models import (
     Message, MessageRecipient, MessageAttachment,
     MessageTemplate, MessageGroup, EmailForwarding,
-    NotificationPreference, MessageFolder
+    NotificationPreference, MessageFolder, MessageBroadcast
 )
+from .broadcast import broadcast_message
+from .mailbox import update_recipients
+from .ratelimit import check_send_rate, estimate_recipients
 from apps.authentication.serializers import UserSerializer
 
 
@@ -56,14 +59,8 @@ class MessageListSerializer(serializers.ModelSerializer):
         source='sender.profile.avatar',
         read_only=True
     )
-    recipients_count = serializers.IntegerField(
-        source='recipients.count',
-        read_only=True
-    )
-    has_attachments = serializers.BooleanField(
-        source='attachments.exists',
-        read_only=True
-    )
+    recipients_count = serializers.SerializerMethodField()
+    has_attachments = serializers.SerializerMethodField()
     thread_count = serializers.IntegerField(read_only=True)
     is_draft = serializers.BooleanField(read_only=True)
     
@@ -82,24 +79,50 @@ class MessageListSerializer(serializers.ModelSerializer):
             'folder', 'created_at'
         ]
     
+    def _mailbox_entry(self, obj):
+        """
+        Ligne destinataire de l'utilisateur actuel
+
+        Fournie par les listes par dossier (voir ``listing.page_messages``),
+        sinon cherchée une seule fois pour les trois champs.
+        """
+        if not hasattr(obj, 'mailbox_entry'):
+            user = self.context['request'].user
+            if 'recipients' in getattr(obj, '_prefetched_objects_cache', {}):
+                obj.mailbox_entry = next(
+                    (r for r in obj.recipients.all() if r.recipient_id == user.pk),
+                    None
+                )
+            else:
+                obj.mailbox_entry = obj.recipients.filter(recipient=user).first()
+        return obj.mailbox_entry
+    
+    def get_recipients_count(self, obj):
+        if hasattr(obj, 'recipients_total'):
+            return obj.recipients_total
+        return obj.recipients.count()
+    
+    def get_has_attachments(self, obj):
+        if hasattr(obj, 'attachment_exists'):
+            return obj.attachment_exists
+        return obj.attachments.exists()
+    
     def get_is_read(self, obj):
         """Statut de lecture pour l'utilisateur actuel"""
-        user = self.context['request'].user
-        recipient = obj.recipients.filter(recipient=user).first()
+        recipient = self._mailbox_entry(obj)
         return recipient.is_read if recipient else True
     
     def get_is_starred(self, obj):
         """Statut favori pour l'utilisateur actuel"""
-        user = self.context['request'].user
-        recipient = obj.recipients.filter(recipient=user).first()
+        recipient = self._mailbox_entry(obj)
         return recipient.is_starred if recipient else False
     
     def get_folder(self, obj):
         """Dossier pour l'utilisateur actuel"""
         user = self.context['request'].user
-        if obj.sender == user:
+        if obj.sender_id == user.pk:
             return MessageFolder.SENT
-        recipient = obj.recipients.filter(recipient=user).first()
+        recipient = self._mailbox_entry(obj)
         return recipient.folder if recipient else None
 
 
@@ -172,38 +195,17 @@ class MessageCreateSerializer(serializers.ModelSerializer):
         attachment_files = validated_data.pop('attachments', [])
         send_now = validated_data.pop('send_now', True)
         
+        # Limite d'envoi, vérifiée avant toute écriture (hors brouillons)
+        if send_now:
+            check_send_rate(
+                self.context['request'].user,
+                estimate_recipients(recipient_ids, group_ids)
+            )
+        
         # Créer le message
         validated_data['sender'] = self.context['request'].user
         message = Message.objects.create(**validated_data)
         
-        # Collecter tous les destinataires
-        all_recipients = set()
-        
-        # Ajouter les destinataires directs
-        all_recipients.update(recipient_ids)
-        
-        # Ajouter les membres des groupes
-        for group_id in group_ids:
-            try:
-                group = MessageGroup.objects.get(id=group_id)
-                members = group.get_all_members()
-                all_recipients.update(members.values_list('id', flat=True))
-                
-                # Mettre à jour les stats du groupe
-                group.last_used = timezone.now()
-                group.use_count += 1
-                group.save()
-            except MessageGroup.DoesNotExist:
-                pass
-        
-        # Créer les entrées destinataires
-        for recipient_id in all_recipients:
-            if str(recipient_id) != str(message.sender.id):  # Pas d'auto-envoi
-                MessageRecipient.objects.create(
-                    message=message,
-                    recipient_id=recipient_id
-                )
-        
         # Gérer les pièces jointes
         for file in attachment_files:
             MessageAttachment.objects.create(
@@ -212,9 +214,14 @@ class MessageCreateSerializer(serializers.ModelSerializer):
                 content_type=file.content_type
             )
         
-        # Envoyer si demandé
-        if send_now:
-            message.send()
+        # Destinataires directs et membres des groupes : insertion par lots,
+        # différée pour les diffusions importantes, puis envoi si demandé
+        broadcast_message(
+            message,
+            recipient_ids=recipient_ids,
+            group_ids=group_ids,
+            send=send_now
+        )
         
         return message
 
@@ -233,15 +240,6 @@ class MessageReplySerializer(serializers.ModelSerializer):
         parent_message = self.context['parent_message']
         reply_all = validated_data.pop('reply_all', False)
         
-        # Créer la réponse
-        reply = Message.objects.create(
-            sender=self.context['request'].user,
-            subject=f"Re: {parent_message.subject}",
-            body=validated_data['body'],
-            parent_message=parent_message,
-            priority=parent_message.priority
-        )
-        
         # Déterminer les destinataires
         if reply_all:
             # Répondre à tous (expéditeur + tous les destinataires sauf soi)
@@ -255,20 +253,37 @@ class MessageReplySerializer(serializers.ModelSerializer):
             # Répondre seulement à l'expéditeur
             recipients = [parent_message.sender.id]
         
-        # Créer les destinataires
-        for recipient_id in recipients:
-            if recipient_id != reply.sender.id:
-                MessageRecipient.objects.create(
-                    message=reply,
-                    recipient_id=recipient_id
-                )
+        check_send_rate(self.context['request'].user, len(recipients))
         
-        # Envoyer
-        reply.send()
+        # Créer la réponse
+        reply = Message.objects.create(
+            sender=self.context['request'].user,
+            subject=f"Re: {parent_message.subject}",
+            body=validated_data['body'],
+            parent_message=parent_message,
+            priority=parent_message.priority
+        )
+        
+        # Créer les destinataires et envoyer
+        broadcast_message(reply, recipient_ids=recipients)
         
         return reply
 
 
+class MessageBroadcastSerializer(serializers.ModelSerializer):
+    """Serializer pour le suivi d'une diffusion"""
+    progress = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = MessageBroadcast
+        fields = [
+            'id', 'message', 'status', 'total_recipients',
+            'processed_recipients', 'progress', 'started_at',
+            'finished_at', 'error_message'
+        ]
+        read_only_fields = fields
+
+
 class MessageTemplateSerializer(serializers.ModelSerializer):
     """Serializer pour les modèles de messages"""
     owner_name = serializers.CharField(
@@ -292,10 +307,7 @@ class MessageTemplateSerializer(serializers.ModelSerializer):
 
 class MessageGroupSerializer(serializers.ModelSerializer):
     """Serializer pour les groupes de destinataires"""
-    member_count = serializers.IntegerField(
-        source='get_member_count',
-        read_only=True
-    )
+    member_count = serializers.IntegerField(read_only=True)
     members = UserSerializer(many=True, read_only=True)
     
     class Meta:
@@ -360,46 +372,30 @@ class MessageSearchSerializer(serializers.Serializer):
     
     def search(self, user):
         """Effectuer la recherche"""
-        from django.db.models import Q, Exists, OuterRef
+        from django.db.models import Exists, OuterRef
+        from .listing import with_list_counts
+        from .search import received_ids, search_text, visible_messages
         
         # Requête de base - messages où l'utilisateur est destinataire ou expéditeur
-        queryset = Message.objects.filter(
-            Q(recipients__recipient=user) | Q(sender=user)
-        ).distinct()
+        queryset = visible_messages(Message.objects.all(), user)
         
         # Appliquer les filtres
-        if self.validated_data.get('query'):
-            query = self.validated_data['query']
-            queryset = queryset.filter(
-                Q(subject__icontains=query) |
-                Q(body__icontains=query) |
-                Q(sender__first_name__icontains=query) |
-                Q(sender__last_name__icontains=query)
-            )
-        
         if self.validated_data.get('sender'):
             queryset = queryset.filter(sender_id=self.validated_data['sender'])
         
         if self.validated_data.get('folder'):
             queryset = queryset.filter(
-                recipients__recipient=user,
-                recipients__folder=self.validated_data['folder']
+                pk__in=received_ids(user, folder=self.validated_data['folder'])
             )
         
         if self.validated_data.get('priority'):
             queryset = queryset.filter(priority=self.validated_data['priority'])
         
         if self.validated_data.get('is_starred'):
-            queryset = queryset.filter(
-                recipients__recipient=user,
-                recipients__is_starred=True
-            )
+            queryset = queryset.filter(pk__in=received_ids(user, is_starred=True))
         
         if self.validated_data.get('is_unread'):
-            queryset = queryset.filter(
-                recipients__recipient=user,
-                recipients__is_read=False
-            )
+            queryset = queryset.filter(pk__in=received_ids(user, is_read=False))
         
         if self.validated_data.get('has_attachments'):
             queryset = queryset.filter(
@@ -412,6 +408,12 @@ class MessageSearchSerializer(serializers.Serializer):
         if self.validated_data.get('date_to'):
             queryset = queryset.filter(sent_at__date__lte=self.validated_data['date_to'])
         
+        queryset = with_list_counts(queryset).select_related(
+            'sender', 'sender__profile', 'root_message'
+        )
+        
+        if self.validated_data.get('query'):
+            return search_text(queryset, self.validated_data['query'])
         return queryset.order_by('-sent_at')
 
 
@@ -420,19 +422,27 @@ class ConversationSerializer(serializers.Serializer):
     
     def to_representation(self, instance):
         """Instance est le message racine"""
-        # Récupérer tous les messages du fil
-        messages = instance.get_thread_messages().order_by('created_at')
+        # Récupérer tous les messages du fil (une requête)
+        messages = list(instance.get_thread_messages().select_related(
+            'sender', 'root_message', 'parent_message__root_message'
+        ).prefetch_related(
+            'recipients', 'attachments', 'replies__root_message'
+        ).order_by('created_at'))
         
         # Marquer comme lus
         user = self.context['request'].user
-        MessageRecipient.objects.filter(
-            message__in=messages,
-            recipient=user,
-            is_read=False
-        ).update(is_read=True, read_at=timezone.now())
+        update_recipients(
+            MessageRecipient.objects.filter(
+                message__in=[message.id for message in messages],
+                recipient=user,
+                is_read=False
+            ),
+            is_read=True,
+            read_at=timezone.now()
+        )
         
         return {
-            'root_message': MessageDetailSerializer(instance).data,
-            'messages': MessageDetailSerializer(messages, many=True).data,
-            'total_messages': messages.count()
+            'root_message': MessageDetailSerializer(instance, context=self.context).data,
+            'messages': MessageDetailSerializer(messages, many=True, context=self.context).data,
+            'total_messages': len(messages)
         }
\ No newline at end of file
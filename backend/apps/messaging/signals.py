@@ -0,0 +1,87 @@
+"""
+Signaux Django pour la messagerie
+
+Maintiennent la taille dénormalisée des fils de discussion lorsqu'une
+réponse est supprimée (l'ajout est compté dans ``Message.save``), et les
+compteurs de boîte aux lettres lorsqu'un destinataire est créé
+individuellement (les insertions groupées les ajustent elles-mêmes).
+
+Ils tiennent aussi à jour les membres matérialisés des groupes
+dynamiques et le nombre de membres des groupes (voir ``groups.py``).
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from apps.authentication.models import User
+from apps.schools.models import StudentClassEnrollment
+from .groups import sync_user_groups, update_member_counts
+from .mailbox import adjust_counters
+from .models import Message, MessageGroup, MessageRecipient
+
+# Champs de ``User`` utilisés par les critères des groupes dynamiques
+GROUP_CRITERIA_FIELDS = {'user_type', 'is_active'}
+
+
+@receiver(post_delete, sender=Message)
+def decrement_thread_size(sender, instance, **kwargs):
+    """Une réponse supprimée (y compris par cascade) quitte son fil"""
+    if instance.root_message_id:
+        Message.objects.filter(
+            pk=instance.root_message_id,
+            thread_size__gt=1
+        ).update(thread_size=F('thread_size') - 1)
+
+
+@receiver(post_save, sender=MessageRecipient)
+def count_new_recipient(sender, instance, created, **kwargs):
+    """Un destinataire créé compte dans son dossier"""
+    if created:
+        adjust_counters({
+            (instance.recipient_id, instance.folder): (1, 0 if instance.is_read else 1)
+        })
+
+
+@receiver(post_save, sender=StudentClassEnrollment)
+@receiver(post_delete, sender=StudentClassEnrollment)
+def sync_enrollment_groups(sender, instance, **kwargs):
+    """Une inscription modifiée peut faire entrer ou sortir l'élève d'un groupe"""
+    student_id, class_id = instance.student_id, instance.class_group_id
+    transaction.on_commit(lambda: sync_user_groups([student_id], class_ids=[class_id]))
+
+
+@receiver(post_save, sender=User)
+def sync_user_type_groups(sender, instance, created, update_fields=None, **kwargs):
+    """Type ou activation modifiés : revoir les groupes dynamiques"""
+    if update_fields is not None and not GROUP_CRITERIA_FIELDS & set(update_fields):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: sync_user_groups([user_id]))
+
+
+@receiver(pre_delete, sender=User)
+def release_user_groups(sender, instance, **kwargs):
+    """Les groupes d'un utilisateur supprimé perdent un membre"""
+    group_ids = list(instance.messaging_groups.values_list('pk', flat=True))
+    if group_ids:
+        transaction.on_commit(lambda: update_member_counts(group_ids))
+
+
+@receiver(m2m_changed, sender=MessageGroup.members.through)
+def count_group_members(sender, instance, action, reverse, pk_set, **kwargs):
+    """Membres ajoutés ou retirés d'un groupe : nombre de membres à jour"""
+    if reverse and action == 'pre_clear':
+        # ``user.messaging_groups.clear()`` : ``pk_set`` vaut None ensuite,
+        # les groupes quittés sont relevés avant la suppression
+        instance._cleared_group_ids = list(
+            instance.messaging_groups.values_list('pk', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        update_member_counts([instance.pk])
+    elif action == 'post_clear':
+        update_member_counts(getattr(instance, '_cleared_group_ids', []))
+    elif pk_set:
+        update_member_counts(pk_set)
@@ -11,98 +11,77 @@ from datetime import datetime, timedelta
 import logging
 
 from .models import (
-    Message, MessageRecipient, EmailForwarding,
-    NotificationPreference, MessagePriority
+    Message, MessageRecipient, EmailForwarding, MessagePriority
 )
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task
-def send_message_notifications(message_id):
+@shared_task(bind=True, max_retries=3)
+def send_message_notifications(self, message_id, recipient_ids=None, schema_name=None):
     """
     Envoyer les notifications pour un nouveau message
+    
+    ``recipient_ids`` limite l'envoi à un lot de destinataires (voir
+    ``broadcast.enqueue_notifications``). Les emails immédiats non remis
+    sont renvoyés par une nouvelle tentative, pour ces seuls destinataires.
+    ``schema_name`` est le tenant du message.
     """
+    from django.db import connection
+    from .notifications import notify_recipients
+    
+    if schema_name and hasattr(connection, 'set_schema'):
+        connection.set_schema(schema_name)
+    
     try:
-        message = Message.objects.get(id=message_id)
+        message = Message.objects.select_related('sender').get(id=message_id)
     except Message.DoesNotExist:
         logger.error(f"Message {message_id} introuvable")
         return
     
-    notifications_sent = 0
+    notifications_sent, failed = notify_recipients(message, recipient_ids)
     
-    for recipient in message.recipients.all():
-        # Vérifier les préférences
-        prefs, created = NotificationPreference.objects.get_or_create(
-            user=recipient.recipient
-        )
-        
-        # Notification push
-        if prefs.should_send_notification(message, 'push'):
-            send_push_notification(recipient.recipient, message)
-            notifications_sent += 1
-        
-        # Notification email
-        if prefs.should_send_notification(message, 'email'):
-            if prefs.email_frequency == 'instant':
-                send_email_notification(recipient.recipient, message)
-                notifications_sent += 1
-            else:
-                # Ajouter à la file d'attente pour envoi groupé
-                queue_email_notification(recipient.recipient, message)
-        
-        # Marquer comme notifié
-        recipient.notification_sent = True
-        recipient.save()
+    if failed and self.request.id and self.request.retries < self.max_retries:
+        raise self.retry(args=[message_id, failed], countdown=300)
     
     return f"{notifications_sent} notifications envoyées pour le message {message_id}"
 
 
-def send_push_notification(user, message):
-    """Envoyer une notification push"""
-    # TODO: Implémenter avec Firebase ou autre service
-    logger.info(f"Notification push pour {user.email}: {message.subject}")
-
-
-def send_email_notification(user, message):
-    """Envoyer une notification par email"""
-    context = {
-        'user': user,
-        'message': message,
-        'sender': message.sender,
-        'site_url': settings.FRONTEND_URL
-    }
-    
-    html_message = render_to_string(
-        'emails/new_message.html',
-        context
-    )
-    plain_message = strip_tags(html_message)
+@shared_task(bind=True, max_retries=3)
+def fan_out_message(self, broadcast_id, schema_name=None):
+    """
+    Distribuer un message à un grand nombre de destinataires, par lots
+    
+    ``schema_name`` est le tenant de la diffusion.
+    """
+    from django.db import connection
+    from .broadcast import run_broadcast
+    from .models import MessageBroadcast
+    
+    if schema_name and hasattr(connection, 'set_schema'):
+        connection.set_schema(schema_name)
     
     try:
-        send_mail(
-            subject=f"Nouveau message: {message.subject}",
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False
-        )
-        
-        # Marquer comme envoyé
-        MessageRecipient.objects.filter(
-            message=message,
-            recipient=user
-        ).update(email_sent=True)
-        
+        broadcast = MessageBroadcast.objects.select_related('message').get(id=broadcast_id)
+    except MessageBroadcast.DoesNotExist:
+        logger.error(f"Diffusion {broadcast_id} introuvable")
+        return
+    
+    if broadcast.status == 'completed':
+        return f"Diffusion {broadcast_id} déjà terminée"
+    
+    try:
+        count = run_broadcast(broadcast)
     except Exception as e:
-        logger.error(f"Erreur envoi email à {user.email}: {str(e)}")
-
-
-def queue_email_notification(user, message):
-    """Ajouter à la file pour envoi groupé"""
-    # TODO: Implémenter avec Redis ou base de données
-    pass
+        logger.error(f"Erreur lors de la diffusion {broadcast_id}: {e}")
+        MessageBroadcast.objects.filter(pk=broadcast.pk).update(
+            status='failed',
+            error_message=str(e)
+        )
+        # La reprise repart du dernier lot enregistré
+        raise self.retry(exc=e, countdown=60)
+    
+    return f"{count} destinataires pour le message {broadcast.message_id}"
 
 
 @shared_task
@@ -199,75 +178,13 @@ def process_email_batch():
     """
     Traiter les envois d'emails groupés
     """
-    # Récupérer les préférences avec envoi groupé
-    for freq in ['hourly', 'daily', 'weekly']:
-        process_frequency_batch(freq)
-
-
-def process_frequency_batch(frequency):
-    """Traiter une fréquence spécifique"""
-    now = timezone.now()
-    
-    # Déterminer la période
-    if frequency == 'hourly':
-        since = now - timedelta(hours=1)
-    elif frequency == 'daily':
-        since = now - timedelta(days=1)
-    else:  # weekly
-        since = now - timedelta(days=7)
-    
-    # Récupérer les utilisateurs avec cette fréquence
-    users = NotificationPreference.objects.filter(
-        email_enabled=True,
-        email_frequency=frequency
-    ).values_list('user', flat=True)
-    
-    for user_id in users:
-        # Récupérer les messages non notifiés
-        messages = MessageRecipient.objects.filter(
-            recipient_id=user_id,
-            email_sent=False,
-            message__sent_at__gte=since
-        ).select_related('message', 'message__sender')
-        
-        if messages.exists():
-            send_batch_email(user_id, messages)
-
-
-def send_batch_email(user_id, message_recipients):
-    """Envoyer un email groupé"""
-    from apps.authentication.models import User
-    
-    user = User.objects.get(id=user_id)
-    
-    context = {
-        'user': user,
-        'messages': [mr.message for mr in message_recipients],
-        'count': message_recipients.count(),
-        'site_url': settings.FRONTEND_URL
-    }
+    from .digest import send_frequency_digests
     
-    html_message = render_to_string(
-        'emails/message_digest.html',
-        context
-    )
-    plain_message = strip_tags(html_message)
+    sent = 0
+    for freq in ['hourly', 'daily', 'weekly']:
+        sent += send_frequency_digests(freq)
     
-    try:
-        send_mail(
-            subject=f"[PeproScolaire] {message_recipients.count()} nouveaux messages",
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False
-        )
-        
-        # Marquer comme envoyés
-        message_recipients.update(email_sent=True)
-        
-    except Exception as e:
-        logger.error(f"Erreur envoi batch à {user.email}: {str(e)}")
+    return f"{sent} récapitulatifs envoyés"
 
 
 @shared_task
@@ -275,111 +192,86 @@ def send_daily_summary():
     """
     Envoyer le résumé quotidien
     """
-    # Récupérer les utilisateurs avec résumé activé
-    prefs = NotificationPreference.objects.filter(
-        daily_summary=True
-    )
-    
-    summaries_sent = 0
+    from .digest import send_daily_summaries
     
-    for pref in prefs:
-        # Vérifier l'heure
-        now = timezone.now().time()
-        if now.hour == pref.summary_time.hour:
-            # Générer et envoyer le résumé
-            summary = generate_daily_summary(pref.user)
-            if summary:
-                send_summary_email(pref.user, summary)
-                summaries_sent += 1
+    # Utilisateurs dont l'heure de résumé tombe dans l'heure en cours
+    summaries_sent = send_daily_summaries()
     
     return f"{summaries_sent} résumés envoyés"
 
 
-def generate_daily_summary(user):
-    """Générer le résumé quotidien pour un utilisateur"""
-    today = timezone.now().date()
-    
-    # Messages reçus aujourd'hui
-    received_today = MessageRecipient.objects.filter(
-        recipient=user,
-        message__sent_at__date=today
-    ).count()
-    
-    # Messages non lus
-    unread = MessageRecipient.objects.filter(
-        recipient=user,
-        is_read=False
-    ).count()
-    
-    # Messages urgents non lus
-    urgent_unread = MessageRecipient.objects.filter(
-        recipient=user,
-        is_read=False,
-        message__priority=MessagePriority.URGENT
-    ).select_related('message', 'message__sender')[:5]
-    
-    if received_today == 0 and unread == 0:
-        return None
-    
-    return {
-        'received_today': received_today,
-        'unread_total': unread,
-        'urgent_messages': urgent_unread
-    }
+@shared_task(bind=True)
+def cleanup_old_messages(self, max_batches=None, schema_name=None):
+    """
+    Nettoyer les anciens messages
+    
+    Corbeille et messages orphelins sont purgés par lots dans chaque tenant
+    actif (ou seulement ``schema_name``), selon sa politique de
+    conservation ; l'avancement est publié dans l'état de la tâche.
+    """
+    from apps.tenants.models import Tenant
+    from apps.tenants.utils import execute_on_tenant
+    from .retention import apply_retention
+    
+    tenants = Tenant.objects.filter(is_active=True)
+    if schema_name:
+        tenants = tenants.filter(schema_name=schema_name)
+    
+    totals = {'trash': 0, 'orphans': 0, 'attachments': 0}
+    def purge(schema):
+        def report(step, stats):
+            if self.request.id:
+                self.update_state(state='PROGRESS', meta={'tenant': schema, 'step': step, **stats})
+        
+        return apply_retention(progress=report, max_batches=max_batches, tenant=schema)
+    
+    for tenant in tenants.order_by('schema_name'):
+        stats = execute_on_tenant(tenant, purge, tenant.schema_name)
+        for key in totals:
+            totals[key] += stats[key]
+    
+    return (
+        f"{totals['trash']} messages de corbeille et {totals['orphans']} messages "
+        f"orphelins supprimés ({totals['attachments']} pièces jointes)"
+    )
 
 
-def send_summary_email(user, summary):
-    """Envoyer l'email de résumé"""
-    context = {
-        'user': user,
-        'summary': summary,
-        'site_url': settings.FRONTEND_URL
-    }
-    
-    html_message = render_to_string(
-        'emails/daily_summary.html',
-        context
-    )
-    plain_message = strip_tags(html_message)
+@shared_task
+def reconcile_mailbox_counters(batch_size=500):
+    """
+    Recalculer les compteurs de boîte aux lettres, par lots d'utilisateurs
+    """
+    from apps.authentication.models import User
+    from .mailbox import reconcile_counters
+    
+    corrected = 0
+    last_id = None
+    while True:
+        users = User.objects.order_by('id')
+        if last_id is not None:
+            users = users.filter(id__gt=last_id)
+        user_ids = list(users.values_list('id', flat=True)[:batch_size])
+        if not user_ids:
+            break
+        
+        corrected += reconcile_counters(user_ids)
+        last_id = user_ids[-1]
     
-    try:
-        send_mail(
-            subject=f"[PeproScolaire] Votre résumé du {timezone.now():%d/%m/%Y}",
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False
-        )
-    except Exception as e:
-        logger.error(f"Erreur envoi résumé à {user.email}: {str(e)}")
+    if corrected:
+        logger.warning(f"{corrected} compteurs de boîte aux lettres corrigés")
+    return f"{corrected} compteurs corrigés"
 
 
 @shared_task
-def cleanup_old_messages():
+def refresh_dynamic_groups():
     """
-    Nettoyer les anciens messages
+    Recalculer les membres des groupes dynamiques et le nombre de membres
     """
-    # Messages dans la corbeille depuis plus de 30 jours
-    threshold = timezone.now() - timedelta(days=30)
+    from .groups import refresh_all_groups
     
-    old_trash = MessageRecipient.objects.filter(
-        folder='trash',
-        modified_at__lt=threshold
-    )
-    
-    deleted_count = old_trash.delete()[0]
-    
-    # Supprimer les messages orphelins (sans destinataires)
-    orphan_messages = Message.objects.filter(
-        recipients__isnull=True,
-        sent_at__isnull=False,
-        sent_at__lt=threshold
-    )
-    
-    orphan_count = orphan_messages.delete()[0]
+    refreshed = refresh_all_groups()
     
-    return f"{deleted_count} messages de corbeille et {orphan_count} messages orphelins supprimés"
+    return f"{refreshed} groupes dynamiques recalculés"
 
 
 @shared_task
@@ -404,7 +296,18 @@ def detect_spam_patterns():
             f"Activité suspecte: User {sender_data['sender']} a envoyé "
             f"{sender_data['count']} messages en 24h"
         )
-        
-        # TODO: Implémenter des actions (limitation, notification admin)
     
-    return f"{len(suspicious_senders)} expéditeurs suspects détectés"
\ No newline at end of file
+    # Les envois sont limités en continu (voir ``ratelimit.py``) : les
+    # utilisateurs bloqués récemment complètent le rapport
+    from .ratelimit import get_limiter
+    flagged = get_limiter().flagged()
+    for entry in flagged:
+        logger.warning(
+            f"Envois bloqués: User {entry['user_id']} ({entry['user_type']}), "
+            f"{entry['rejections']} refus, dernier le {entry['last_rejected_at']}"
+        )
+    
+    return (
+        f"{len(suspicious_senders)} expéditeurs suspects détectés, "
+        f"{len(flagged)} utilisateurs limités"
+    )
\ No newline at end of file
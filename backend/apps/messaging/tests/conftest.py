@@ -0,0 +1,49 @@
+"""
+Fixtures pour les tests du module messagerie
+"""
+import pytest
+from apps.authentication.models import User
+
+
+def make_user(name, user_type='student'):
+    return User.objects.create_user(
+        email=f'{name}@test.com',
+        username=name,
+        password='testpass123',
+        first_name=name.capitalize(),
+        last_name='Test',
+        user_type=user_type
+    )
+
+
+@pytest.fixture
+def user_factory():
+    """Créer des utilisateurs supplémentaires"""
+    return make_user
+
+
+@pytest.fixture
+def teacher():
+    """Créer un professeur de test"""
+    return make_user('prof', 'teacher')
+
+
+@pytest.fixture
+def student():
+    """Créer un élève de test"""
+    return make_user('eleve')
+
+
+@pytest.fixture
+def recipients():
+    """Cinq destinataires"""
+    return [make_user(f'dest{i}') for i in range(5)]
+
+
+@pytest.fixture
+def no_notifications(monkeypatch):
+    """Les notifications ne sont pas mises en file pendant le test"""
+    monkeypatch.setattr(
+        'apps.messaging.broadcast.enqueue_notifications',
+        lambda *args, **kwargs: None
+    )
@@ -0,0 +1,166 @@
+"""
+Tests du stockage dédupliqué des pièces jointes
+"""
+import os
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from apps.core.models import StoredBlob
+from apps.messaging.models import Message, MessageAttachment
+from apps.tenants.management.commands.dedupe_tenant_files import Command as DedupeCommand
+from apps.tenants.storage import content_storage
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def message(teacher):
+    return Message.objects.create(sender=teacher, subject='Documents', body='Ci-joint')
+
+
+def attach(message, content, filename='cours.txt'):
+    return MessageAttachment.objects.create(
+        message=message,
+        file=ContentFile(content, name=filename),
+        filename=filename,
+        file_size=len(content),
+        content_type='text/plain'
+    )
+
+
+def blob_for(attachment):
+    return StoredBlob.objects.get(name=attachment.file.name)
+
+
+@pytest.mark.django_db
+class TestContentAddressedStorage:
+
+    def test_identical_content_is_stored_once(self, message):
+        first = attach(message, b'Chapitre 1', 'a.txt')
+        second = attach(message, b'Chapitre 1', 'b.txt')
+        other = attach(message, b'Chapitre 2', 'c.txt')
+
+        assert first.file.name == second.file.name
+        assert first.file.name.startswith(content_storage.BLOB_PREFIX)
+        assert other.file.name != first.file.name
+        assert blob_for(first).refcount == 2
+        assert blob_for(other).refcount == 1
+        assert blob_for(first).size == len(b'Chapitre 1')
+        assert content_storage.exists(first.file.name)
+
+    def test_file_removed_with_last_reference(self, message, django_capture_on_commit_callbacks):
+        first = attach(message, b'Chapitre 1')
+        second = attach(message, b'Chapitre 1')
+        name = first.file.name
+        path = content_storage.path(name)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            first.delete()
+
+        assert StoredBlob.objects.get(name=name).refcount == 1
+        assert os.path.exists(path)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            MessageAttachment.objects.get(pk=second.pk).delete()
+
+        assert not StoredBlob.objects.filter(name=name).exists()
+        assert not os.path.exists(path)
+
+    def test_cascade_releases_references(self, message, django_capture_on_commit_callbacks):
+        attachment = attach(message, b'Chapitre 1')
+        path = content_storage.path(attachment.file.name)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            message.delete()
+
+        assert not StoredBlob.objects.exists()
+        assert not os.path.exists(path)
+
+    def test_replaced_file_releases_old_content(self, message, django_capture_on_commit_callbacks):
+        attachment = attach(message, b'Version 1')
+        old_name = attachment.file.name
+
+        attachment = MessageAttachment.objects.get(pk=attachment.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            attachment.file = ContentFile(b'Version 2', name='cours.txt')
+            attachment.save()
+
+        assert not StoredBlob.objects.filter(name=old_name).exists()
+        assert not os.path.exists(content_storage.path(old_name))
+        assert blob_for(attachment).refcount == 1
+
+        # Même contenu renvoyé : une seule référence subsiste
+        with django_capture_on_commit_callbacks(execute=True):
+            attachment.file = ContentFile(b'Version 2', name='cours.txt')
+            attachment.save()
+
+        assert blob_for(attachment).refcount == 1
+
+        # Enregistrement sans changement de fichier : rien n'est retiré
+        with django_capture_on_commit_callbacks(execute=True):
+            attachment.filename = 'cours-v2.txt'
+            attachment.save()
+
+        assert blob_for(attachment).refcount == 1
+
+    def test_adopt_moves_legacy_files(self, message):
+        legacy = []
+        for index in range(2):
+            path = content_storage.path(f'messages/attachments/ancien{index}.txt')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as handle:
+                handle.write(b'Ancien contenu')
+            legacy.append((f'messages/attachments/ancien{index}.txt', path))
+
+        names = {content_storage.adopt(name) for name, _ in legacy}
+
+        assert len(names) == 1
+        name = names.pop()
+        assert content_storage.is_blob(name)
+        assert content_storage.adopt(name) == name
+        assert StoredBlob.objects.get(name=name).refcount == 2
+        assert all(not os.path.exists(path) for _, path in legacy)
+        with content_storage.open(name) as handle:
+            assert handle.read() == b'Ancien contenu'
+
+    def test_files_saved_by_previous_storage(self, message, media_root, django_capture_on_commit_callbacks):
+        # Enregistrés par ``FileSystemStorage`` sous ``MEDIA_ROOT/<upload_to>``
+        old_storage = FileSystemStorage(location=str(media_root))
+        names = [
+            old_storage.save('messages/attachments/2026/01/circ.pdf', ContentFile(b'Circulaire')),
+            old_storage.save('messages/attachments/2026/01/circ-copie.pdf', ContentFile(b'Circulaire')),
+        ]
+        MessageAttachment.objects.bulk_create([
+            MessageAttachment(
+                message=message, file=name, filename='circ.pdf', file_size=10,
+                content_type='application/pdf'
+            )
+            for name in names
+        ])
+
+        attachment = MessageAttachment.objects.get(file=names[0])
+        assert content_storage.exists(names[0])
+        with attachment.file.open('rb') as handle:
+            assert handle.read() == b'Circulaire'
+
+        assert DedupeCommand().adopt_files() == 2
+
+        blob_names = set(MessageAttachment.objects.values_list('file', flat=True))
+        assert len(blob_names) == 1
+        blob = StoredBlob.objects.get(name=blob_names.pop())
+        assert blob.refcount == 2
+        assert not any(old_storage.exists(name) for name in names)
+
+        # Un fichier d'origine non adopté est supprimé à son emplacement
+        legacy = old_storage.save('messages/attachments/2026/01/ancien.pdf', ContentFile(b'Ancien'))
+        MessageAttachment.objects.filter(pk=attachment.pk).update(file=legacy)
+        with django_capture_on_commit_callbacks(execute=True):
+            MessageAttachment.objects.get(pk=attachment.pk).delete()
+
+        assert not old_storage.exists(legacy)
+        assert StoredBlob.objects.get(pk=blob.pk).refcount == 2
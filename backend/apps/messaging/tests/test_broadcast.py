@@ -0,0 +1,169 @@
+"""
+Tests de la distribution des messages à leurs destinataires
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from apps.messaging import broadcast as broadcast_module
+from apps.messaging.broadcast import broadcast_message, run_broadcast
+from apps.messaging.models import (
+    MailboxCounter, Message, MessageBroadcast, MessageFolder, MessageGroup, MessageRecipient
+)
+from apps.messaging.tasks import fan_out_message
+
+
+def recipient_inserts(queries):
+    return [
+        query['sql'] for query in queries
+        if query['sql'].startswith('INSERT INTO "message_recipients"')
+    ]
+
+
+def sent_count(user):
+    return MailboxCounter.objects.filter(
+        user=user, folder=MessageFolder.SENT
+    ).values_list('total', flat=True).first() or 0
+
+
+@pytest.fixture
+def message(teacher):
+    return Message.objects.create(sender=teacher, subject='Réunion', body='Jeudi 18h')
+
+
+@pytest.fixture
+def group(teacher, recipients):
+    group = MessageGroup.objects.create(owner=teacher, name='Classe')
+    group.members.set(recipients[:3] + [teacher])
+    return group
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('no_notifications')
+class TestSyncBroadcast:
+
+    def test_single_bulk_insert_with_dedup(self, settings, message, teacher, recipients, group):
+        settings.MESSAGING_BROADCAST_ASYNC_THRESHOLD = 100
+        direct = [user.id for user in recipients[2:]] + [teacher.id]
+
+        with CaptureQueriesContext(connection) as queries:
+            result = broadcast_message(message, direct, [group.id])
+
+        assert result is None
+        assert len(recipient_inserts(queries.captured_queries)) == 1
+        assert set(message.recipients.values_list('recipient_id', flat=True)) == {
+            user.id for user in recipients
+        }
+        assert not message.recipients.filter(recipient=teacher).exists()
+
+        message.refresh_from_db()
+        assert not message.is_draft
+        assert sent_count(teacher) == 1
+        group.refresh_from_db()
+        assert group.use_count == 1
+
+    def test_draft_is_not_sent(self, settings, message, recipients):
+        settings.MESSAGING_BROADCAST_ASYNC_THRESHOLD = 100
+
+        broadcast_message(message, [user.id for user in recipients], send=False)
+
+        message.refresh_from_db()
+        assert message.is_draft
+        assert message.recipients.count() == len(recipients)
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('no_notifications')
+class TestDeferredBroadcast:
+
+    @pytest.fixture
+    def deferred(self, settings, message, recipients, group):
+        settings.MESSAGING_BROADCAST_ASYNC_THRESHOLD = 2
+        return broadcast_message(message, [user.id for user in recipients[3:]], [group.id])
+
+    def test_broadcast_is_deferred(self, deferred, message):
+        assert isinstance(deferred, MessageBroadcast)
+        assert deferred.total_recipients == 5
+        assert not message.recipients.exists()
+        message.refresh_from_db()
+        assert message.is_draft
+
+    def test_resume_after_partial_run(self, deferred, message, teacher, recipients, monkeypatch):
+        add_recipients = broadcast_module.add_recipients
+        calls = []
+
+        def failing_add_recipients(message, batch, batch_size=None):
+            calls.append(list(batch))
+            if len(calls) == 2:
+                raise RuntimeError('Connexion perdue')
+            return add_recipients(message, batch, batch_size)
+
+        monkeypatch.setattr(broadcast_module, 'add_recipients', failing_add_recipients)
+        with pytest.raises(RuntimeError):
+            run_broadcast(deferred, batch_size=2)
+
+        deferred.refresh_from_db()
+        assert deferred.processed_recipients == 2
+        assert message.recipients.count() == 2
+        message.refresh_from_db()
+        assert message.is_draft
+
+        monkeypatch.setattr(broadcast_module, 'add_recipients', add_recipients)
+        deferred = MessageBroadcast.objects.select_related('message').get(pk=deferred.pk)
+        assert run_broadcast(deferred, batch_size=2) == 5
+
+        deferred.refresh_from_db()
+        assert deferred.status == 'completed'
+        assert deferred.processed_recipients == 5
+        assert set(message.recipients.values_list('recipient_id', flat=True)) == {
+            user.id for user in recipients
+        }
+        # Chaque destinataire n'est compté qu'une fois
+        assert set(
+            MailboxCounter.objects.filter(
+                user__in=recipients, folder=MessageFolder.INBOX
+            ).values_list('total', flat=True)
+        ) == {1}
+
+        message.refresh_from_db()
+        assert not message.is_draft
+        assert sent_count(teacher) == 1
+
+    def test_completed_broadcast_is_not_sent_twice(self, deferred, message, teacher, monkeypatch):
+        run_broadcast(deferred, batch_size=2)
+        sent_at = Message.objects.get(pk=message.pk).sent_at
+
+        sends = []
+        monkeypatch.setattr(Message, 'send', lambda self: sends.append(self.pk))
+        deferred = MessageBroadcast.objects.select_related('message').get(pk=deferred.pk)
+        run_broadcast(deferred, batch_size=2)
+
+        assert sends == []
+        assert Message.objects.get(pk=message.pk).sent_at == sent_at
+        assert sent_count(teacher) == 1
+        assert MessageRecipient.objects.filter(message=message).count() == 5
+
+    def test_task_runs_in_broadcast_tenant(
+        self, settings, message, recipients, monkeypatch, django_capture_on_commit_callbacks
+    ):
+        settings.MESSAGING_BROADCAST_ASYNC_THRESHOLD = 2
+        monkeypatch.setattr(broadcast_module, 'get_current_schema', lambda: 'lycee_hugo')
+        scheduled = []
+        monkeypatch.setattr(
+            fan_out_message, 'delay', lambda *args, **kwargs: scheduled.append((args, kwargs))
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            deferred = broadcast_message(message, [user.id for user in recipients])
+
+        assert scheduled == [((str(deferred.id),), {'schema_name': 'lycee_hugo'})]
+
+        schemas = []
+        monkeypatch.setattr(
+            type(connection), 'set_schema', lambda self, schema_name: schemas.append(schema_name)
+        )
+        args, kwargs = scheduled[0]
+        fan_out_message.run(*args, **kwargs)
+
+        assert schemas == ['lycee_hugo']
+        deferred.refresh_from_db()
+        assert deferred.status == 'completed'
@@ -0,0 +1,193 @@
+"""
+Tests des récapitulatifs et résumés quotidiens par email
+"""
+from datetime import datetime, time, timedelta
+
+import pytest
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.utils import timezone
+from apps.messaging.digest import (
+    SUMMARY_URGENT_LIMIT, build_summaries, iter_digests, send_daily_summaries,
+    send_frequency_digests, send_in_batches, summary_users
+)
+from apps.messaging.models import (
+    Message, MessagePriority, MessageRecipient, NotificationPreference
+)
+
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class RefusingBackend(EmailBackend):
+    """Backend locmem qui refuse les paquets contenant une adresse de ``refused``"""
+
+    refused = set()
+
+    def send_messages(self, messages):
+        if any(address in self.refused for email in messages for address in email.to):
+            raise ConnectionError('Destinataire refusé')
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def email_settings(settings):
+    settings.EMAIL_BACKEND = LOCMEM
+    settings.DEFAULT_FROM_EMAIL = 'noreply@test.com'
+    mail.outbox = []
+    return settings
+
+
+def local(hour, minute=0):
+    return timezone.make_aware(datetime(2026, 3, 2, hour, minute))
+
+
+def deliver(sender, recipients, subject='Information', sent_at=None, priority=None, **fields):
+    message = Message.objects.create(
+        sender=sender, subject=subject, body='...',
+        priority=priority or MessagePriority.NORMAL
+    )
+    Message.objects.filter(pk=message.pk).update(sent_at=sent_at or timezone.now())
+    MessageRecipient.objects.bulk_create([
+        MessageRecipient(message=message, recipient=user, **fields) for user in recipients
+    ])
+    return message
+
+
+def preferences(user, **fields):
+    return NotificationPreference.objects.create(user=user, **fields)
+
+
+@pytest.mark.django_db
+class TestDigests:
+
+    def test_one_digest_per_user(self, email_settings, teacher, recipients, django_assert_num_queries):
+        hourly, other_hourly, daily, no_email, _ = recipients
+        for user in [hourly, other_hourly, no_email]:
+            preferences(user, email_frequency='hourly')
+        preferences(daily, email_frequency='daily')
+        no_email.email = ''
+        no_email.save()
+
+        deliver(teacher, [hourly, daily, no_email])
+        deliver(teacher, [hourly, other_hourly])
+        deliver(teacher, [hourly], email_sent=True)
+        deliver(teacher, [other_hourly], sent_at=timezone.now() - timedelta(hours=2))
+
+        since = timezone.now() - timedelta(hours=1)
+        with django_assert_num_queries(1):
+            digests = list(iter_digests('hourly', since))
+
+        by_email = {email.to[0]: (ids, email) for ids, email in digests}
+        assert set(by_email) == {hourly.email, other_hourly.email}
+        ids, email = by_email[hourly.email]
+        assert len(ids) == 2
+        assert email.subject == '[PeproScolaire] 2 nouveaux messages'
+        assert len(by_email[other_hourly.email][0]) == 1
+
+    def test_sent_digests_are_marked(self, email_settings, teacher, recipients):
+        for user in recipients[:3]:
+            preferences(user, email_frequency='hourly')
+            deliver(teacher, [user])
+
+        assert send_frequency_digests('hourly') == 3
+        assert len(mail.outbox) == 3
+        assert not MessageRecipient.objects.filter(email_sent=False).exists()
+
+        # Rien n'est renvoyé au passage suivant
+        assert send_frequency_digests('hourly') == 0
+
+
+class TestSendInBatches:
+
+    def emails(self, count):
+        return [
+            (index, EmailMessage('Sujet', 'Corps', 'noreply@test.com', [f'user{index}@test.com']))
+            for index in range(count)
+        ]
+
+    def test_batches_are_sent_and_reported(self, email_settings):
+        sent_keys = []
+        sent = send_in_batches(self.emails(5), on_sent=sent_keys.append, batch_size=2, workers=2)
+
+        assert sent == 5
+        assert sent_keys == [[0, 1], [2, 3], [4]]
+        assert len(mail.outbox) == 5
+
+    def test_failed_batch_is_not_reported(self, email_settings, monkeypatch):
+        email_settings.EMAIL_BACKEND = f'{__name__}.RefusingBackend'
+        monkeypatch.setattr(RefusingBackend, 'refused', {'user2@test.com'})
+        sent_keys = []
+        sent = send_in_batches(self.emails(5), on_sent=sent_keys.append, batch_size=2, workers=2)
+
+        assert sent == 3
+        assert sent_keys == [[0, 1], [4]]
+        assert sorted(email.to[0] for email in mail.outbox) == [
+            'user0@test.com', 'user1@test.com', 'user4@test.com'
+        ]
+
+
+@pytest.mark.django_db
+class TestDailySummaries:
+
+    def test_users_of_the_current_hour(self, user_factory):
+        users = {}
+        for name, hour, minute in [
+            ('avant', 17, 59), ('debut', 18, 0), ('fin', 18, 59), ('apres', 19, 0)
+        ]:
+            users[name] = user_factory(name)
+            preferences(users[name], daily_summary=True, summary_time=time(hour, minute))
+        preferences(user_factory('sans'), daily_summary=False, summary_time=time(18, 30))
+
+        assert {user.username for user in summary_users(local(18, 30))} == {'debut', 'fin'}
+
+    def test_last_hour_of_the_day(self, user_factory):
+        for name, value in [
+            ('onze', time(23, 0)), ('minuit_moins', time(23, 59, 59)),
+            ('minuit', time(0, 0)), ('vingt_deux', time(22, 59))
+        ]:
+            preferences(user_factory(name), daily_summary=True, summary_time=value)
+
+        assert {user.username for user in summary_users(local(23, 45))} == {'onze', 'minuit_moins'}
+        assert {user.username for user in summary_users(local(0, 15))} == {'minuit'}
+
+    def test_summaries_in_two_queries(self, teacher, recipients, django_assert_num_queries):
+        active, urgent_user, idle = recipients[:3]
+        now = timezone.now()
+        day_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        deliver(teacher, [active], is_read=True)
+        deliver(teacher, [active])
+        deliver(teacher, [active, idle], sent_at=day_start - timedelta(hours=1), is_read=True)
+        deliver(teacher, [active], sent_at=day_start - timedelta(hours=1))
+        urgent = [
+            deliver(
+                teacher, [urgent_user], subject=f'Urgent {index}',
+                sent_at=now - timedelta(seconds=index), priority=MessagePriority.URGENT
+            )
+            for index in range(SUMMARY_URGENT_LIMIT + 1)
+        ]
+
+        with django_assert_num_queries(2):
+            summaries = build_summaries([active, urgent_user, idle], now)
+
+        assert set(summaries) == {active.id, urgent_user.id}
+        assert summaries[active.id]['received_today'] == 2
+        assert summaries[active.id]['unread_total'] == 2
+        assert summaries[active.id]['urgent_messages'] == []
+
+        assert summaries[urgent_user.id]['unread_total'] == SUMMARY_URGENT_LIMIT + 1
+        assert [row.message for row in summaries[urgent_user.id]['urgent_messages']] == (
+            urgent[:SUMMARY_URGENT_LIMIT]
+        )
+
+    def test_summaries_are_sent(self, email_settings, teacher, recipients):
+        now = timezone.now()
+        for user in recipients[:2]:
+            preferences(user, daily_summary=True, summary_time=timezone.localtime(now).time())
+        deliver(teacher, recipients[:1], sent_at=now)
+
+        assert send_daily_summaries(now) == 1
+        assert [email.to for email in mail.outbox] == [[recipients[0].email]]
+        assert mail.outbox[0].subject.startswith('[PeproScolaire] Votre résumé du ')
+
@@ -0,0 +1,70 @@
+"""
+Tests des membres matérialisés des groupes
+"""
+import pytest
+from django.contrib.admin.sites import AdminSite
+from django.test import RequestFactory
+from apps.messaging.admin import MessageGroupAdmin
+from apps.messaging.models import MessageGroup
+
+
+@pytest.mark.django_db
+class TestMessageGroupMembers:
+
+    def test_dynamic_group_materialises_members(self, teacher, recipients):
+        group = MessageGroup.objects.create(
+            owner=teacher, name='Élèves', is_dynamic=True, dynamic_user_type='student'
+        )
+
+        assert set(group.members.all()) == set(recipients)
+        assert group.member_count == len(recipients)
+
+    def test_admin_save_keeps_materialised_members(self, teacher, recipients):
+        group = MessageGroup.objects.create(
+            owner=teacher, name='Groupe', is_dynamic=True, dynamic_user_type='teacher'
+        )
+        admin = MessageGroupAdmin(MessageGroup, AdminSite())
+        request = RequestFactory().post('/')
+        request.user = teacher
+
+        # Nouveau critère, mais une liste de membres périmée dans le formulaire
+        form_class = admin.get_form(request, obj=None)
+        form = form_class(data={
+            'owner': str(teacher.pk),
+            'name': 'Groupe',
+            'is_dynamic': 'on',
+            'dynamic_user_type': 'student',
+            'members': [str(teacher.pk)],
+            'use_count': 0,
+        }, instance=group)
+        assert form.is_valid(), form.errors
+        obj = form.save(commit=False)
+        admin.save_model(request, obj, form, change=True)
+        admin.save_related(request, form, [], change=True)
+
+        group.refresh_from_db()
+        assert set(group.members.all()) == set(recipients)
+        assert group.member_count == len(recipients)
+
+    def test_admin_hides_members_of_dynamic_group(self, teacher):
+        group = MessageGroup.objects.create(
+            owner=teacher, name='Profs', is_dynamic=True, dynamic_user_type='teacher'
+        )
+        admin = MessageGroupAdmin(MessageGroup, AdminSite())
+        request = RequestFactory().get('/')
+        request.user = teacher
+
+        assert 'members' in admin.get_exclude(request, group)
+
+    def test_reverse_clear_updates_counts(self, teacher, recipients, user_factory):
+        first = MessageGroup.objects.create(owner=teacher, name='A')
+        second = MessageGroup.objects.create(owner=teacher, name='B')
+        member = user_factory('membre')
+        first.members.add(member, recipients[0])
+        second.members.add(member)
+
+        member.messaging_groups.clear()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert (first.member_count, second.member_count) == (1, 0)
@@ -0,0 +1,142 @@
+"""
+Tests des listes de messages par dossier
+"""
+import pytest
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.messaging.broadcast import add_recipients
+from apps.messaging.listing import page_messages, received_queryset, sent_queryset
+from apps.messaging.mailbox import update_recipients
+from apps.messaging.models import Message, MessageAttachment, MessageFolder, MessageRecipient
+from apps.messaging.views import MessageViewSet
+
+message_list = MessageViewSet.as_view({'get': 'list'})
+
+
+def sent_message(sender, subject, recipients=()):
+    message = Message.objects.create(sender=sender, subject=subject, body='...')
+    add_recipients(message, [user.id for user in recipients])
+    message.send()
+    return message
+
+
+def list_folder(user, url='/messages/', **params):
+    request = APIRequestFactory().get(url, params)
+    force_authenticate(request, user=user)
+    response = message_list(request)
+    assert response.status_code == 200
+    return response
+
+
+def read_all_pages(user, **params):
+    """Sujets de toutes les pages, en suivant les curseurs"""
+    subjects, pages = [], 0
+    response = list_folder(user, **params)
+    while True:
+        pages += 1
+        subjects += [row['subject'] for row in response.data['results']]
+        if not response.data['next']:
+            return subjects, pages
+        response = list_folder(user, url=response.data['next'])
+
+
+@pytest.fixture
+def inbox(teacher, student):
+    return [sent_message(teacher, f'Message {index}', [student]) for index in range(7)]
+
+
+@pytest.mark.django_db
+class TestFolderQuerysets:
+
+    def test_received_folder(self, teacher, student, user_factory, inbox):
+        draft = Message.objects.create(sender=teacher, subject='Brouillon', body='...')
+        add_recipients(draft, [student.id])
+        archived = sent_message(teacher, 'Archivé', [student])
+        update_recipients(archived.recipients.all(), folder=MessageFolder.ARCHIVE)
+        sent_message(teacher, 'Autre élève', [user_factory('autre')])
+
+        rows = list(received_queryset(student, MessageFolder.INBOX))
+
+        assert all(isinstance(row, MessageRecipient) for row in rows)
+        assert {row.message for row in rows} == set(inbox)
+        assert [row.message for row in received_queryset(student, MessageFolder.ARCHIVE)] == [archived]
+
+    def test_sent_folder(self, teacher, student, inbox):
+        Message.objects.create(sender=teacher, subject='Brouillon', body='...')
+        sent_message(student, 'Réponse', [teacher])
+
+        assert set(sent_queryset(teacher)) == set(inbox)
+        assert list(sent_queryset(student).values_list('subject', flat=True)) == ['Réponse']
+
+    def test_page_messages(self, settings, tmp_path, teacher, student, recipients, inbox):
+        settings.MEDIA_ROOT = str(tmp_path)
+        add_recipients(inbox[0], [user.id for user in recipients[:2]])
+        MessageAttachment.objects.create(
+            message=inbox[0],
+            file=ContentFile(b'Programme', name='programme.txt'),
+            filename='programme.txt',
+            file_size=9,
+            content_type='text/plain'
+        )
+
+        received = page_messages(received_queryset(student, MessageFolder.INBOX).filter(
+            message=inbox[0]
+        ))
+        assert received == [inbox[0]]
+        assert received[0].mailbox_entry.recipient_id == student.id
+        assert received[0].recipients_total == 3
+        assert received[0].attachment_exists
+
+        sent = page_messages(sent_queryset(teacher).filter(pk=inbox[1].pk))
+        assert sent == [inbox[1]]
+        assert sent[0].mailbox_entry is None
+        assert sent[0].recipients_total == 1
+        assert not sent[0].attachment_exists
+
+
+@pytest.mark.django_db
+class TestFolderPagination:
+
+    def test_cursor_pages_have_no_gaps_or_duplicates(self, student, inbox):
+        subjects, pages = read_all_pages(student, folder=MessageFolder.INBOX, page_size=3)
+
+        assert pages == 3
+        assert subjects == [message.subject for message in reversed(inbox)]
+
+    def test_new_message_does_not_shift_pages(self, teacher, student, inbox):
+        first = list_folder(student, folder=MessageFolder.INBOX, page_size=3)
+        sent_message(teacher, 'Nouveau', [student])
+
+        second = list_folder(student, url=first.data['next'])
+
+        assert [row['subject'] for row in second.data['results']] == [
+            'Message 3', 'Message 2', 'Message 1'
+        ]
+
+    def test_sent_folder_is_ordered_by_sending_date(self, teacher, student):
+        drafts = [
+            Message.objects.create(sender=teacher, subject=f'Message {index}', body='...')
+            for index in range(4)
+        ]
+        for index in [2, 0, 3, 1]:
+            add_recipients(drafts[index], [student.id])
+            drafts[index].send()
+
+        subjects, pages = read_all_pages(teacher, folder=MessageFolder.SENT, page_size=3)
+
+        assert pages == 2
+        assert subjects == ['Message 1', 'Message 3', 'Message 0', 'Message 2']
+
+    def test_query_count_does_not_depend_on_page_size(
+        self, student, inbox, django_assert_max_num_queries
+    ):
+        with CaptureQueriesContext(connection) as small:
+            list_folder(student, folder=MessageFolder.INBOX, page_size=2)
+
+        with django_assert_max_num_queries(len(small.captured_queries)):
+            response = list_folder(student, folder=MessageFolder.INBOX, page_size=7)
+
+        assert len(response.data['results']) == 7
+        assert all(row['is_read'] is False for row in response.data['results'])
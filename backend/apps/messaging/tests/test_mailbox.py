@@ -0,0 +1,93 @@
+"""
+Tests des compteurs de boîte aux lettres
+"""
+import pytest
+from apps.messaging.broadcast import add_recipients
+from apps.messaging.mailbox import get_counters, reconcile_counters, update_recipients
+from apps.messaging.models import MailboxCounter, Message, MessageFolder, MessageRecipient
+
+INBOX = MessageFolder.INBOX
+TRASH = MessageFolder.TRASH
+
+
+def counters(user):
+    return {
+        folder: (total, unread)
+        for folder, total, unread in MailboxCounter.objects.filter(user=user).values_list(
+            'folder', 'total', 'unread'
+        )
+        if total or unread
+    }
+
+
+@pytest.fixture
+def messages(teacher):
+    return [
+        Message.objects.create(sender=teacher, subject=f'Message {i}', body='...')
+        for i in range(3)
+    ]
+
+
+@pytest.mark.django_db
+class TestMailboxCounters:
+
+    def test_add_recipients_counts_inserted_rows_only(self, messages, recipients):
+        user_ids = [user.id for user in recipients]
+
+        assert add_recipients(messages[0], user_ids[:3], batch_size=2) == 3
+        # Reprise avec des destinataires déjà présents
+        assert add_recipients(messages[0], user_ids, batch_size=2) == 2
+        assert add_recipients(messages[0], user_ids) == 0
+
+        assert MessageRecipient.objects.filter(message=messages[0]).count() == len(recipients)
+        for user in recipients:
+            assert counters(user) == {INBOX: (1, 1)}
+
+    def test_update_recipients_applies_deltas(self, messages, student):
+        for message in messages:
+            add_recipients(message, [student.id])
+        rows = MessageRecipient.objects.filter(recipient=student)
+
+        assert update_recipients(rows.filter(message=messages[0]), is_read=True) == 1
+        assert counters(student) == {INBOX: (3, 2)}
+
+        # Un lu et un non lu passent à la corbeille
+        update_recipients(rows.filter(message__in=messages[:2]), folder=TRASH)
+        assert counters(student) == {INBOX: (1, 1), TRASH: (2, 1)}
+
+        update_recipients(rows.filter(folder=TRASH), folder=INBOX, is_read=True)
+        assert counters(student) == {INBOX: (3, 1)}
+
+        # Les autres champs ne touchent pas aux compteurs
+        update_recipients(rows, is_starred=True)
+        assert counters(student) == {INBOX: (3, 1)}
+        assert counters(student) == {
+            folder: value for folder, value in get_counters(student).items() if any(value)
+        }
+
+    def test_reconcile_fixes_drift(self, messages, teacher, student):
+        add_recipients(messages[0], [student.id])
+        messages[0].send()
+        MessageRecipient.objects.bulk_create([
+            MessageRecipient(message=message, recipient=student, folder=TRASH, is_read=True)
+            for message in messages[1:]
+        ])
+        MailboxCounter.objects.filter(user=student, folder=INBOX).update(total=9, unread=0)
+
+        fixed = reconcile_counters([student.id, teacher.id])
+
+        assert fixed == 2
+        assert counters(student) == {INBOX: (1, 1), TRASH: (2, 0)}
+        assert counters(teacher) == {MessageFolder.SENT: (1, 0)}
+        assert reconcile_counters([student.id, teacher.id]) == 0
+
+    def test_get_counters_computes_on_first_read(self, messages, student, django_assert_num_queries):
+        MessageRecipient.objects.bulk_create([
+            MessageRecipient(message=message, recipient=student) for message in messages
+        ])
+        assert not MailboxCounter.objects.filter(user=student).exists()
+
+        assert get_counters(student)[INBOX] == (3, 3)
+
+        with django_assert_num_queries(1):
+            assert get_counters(student)[INBOX] == (3, 3)
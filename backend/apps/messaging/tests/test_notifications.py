@@ -0,0 +1,132 @@
+"""
+Tests de l'envoi groupé des notifications
+"""
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from apps.messaging import notifications
+from apps.messaging.models import Message, MessageRecipient, NotificationPreference
+from apps.messaging.notifications import NotificationDispatcher, load_preferences, notify_recipients
+from apps.messaging.tasks import send_message_notifications
+
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class FailingBackend(EmailBackend):
+    """Backend locmem qui refuse les adresses de ``refused``"""
+
+    refused = set()
+
+    def send_messages(self, messages):
+        if any(address in self.refused for email in messages for address in email.to):
+            raise ConnectionError('Destinataire refusé')
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def message(teacher, recipients):
+    message = Message.objects.create(sender=teacher, subject='Sortie', body='Départ à 8h')
+    MessageRecipient.objects.bulk_create([
+        MessageRecipient(message=message, recipient=user) for user in recipients
+    ])
+    return message
+
+
+@pytest.fixture
+def email_settings(settings):
+    settings.EMAIL_BACKEND = LOCMEM
+    settings.DEFAULT_FROM_EMAIL = 'noreply@test.com'
+    mail.outbox = []
+    return settings
+
+
+@pytest.mark.django_db
+class TestNotificationDispatcher:
+
+    def test_missing_preferences_are_bulk_created(self, recipients, django_assert_num_queries):
+        NotificationPreference.objects.create(user=recipients[0], email_frequency='daily')
+        user_ids = [user.id for user in recipients]
+
+        with django_assert_num_queries(2):
+            preferences = load_preferences(user_ids)
+
+        assert set(preferences) == set(user_ids)
+        assert preferences[recipients[0].id].email_frequency == 'daily'
+        assert NotificationPreference.objects.filter(user_id__in=user_ids).count() == len(recipients)
+
+    def test_plan_splits_channels(self, message, recipients):
+        NotificationPreference.objects.create(user=recipients[0], email_frequency='hourly')
+        NotificationPreference.objects.create(user=recipients[1], email_enabled=False)
+        NotificationPreference.objects.create(user=recipients[2], push_enabled=False)
+
+        channels = NotificationDispatcher(message).plan(list(message.recipients.all()))
+        users = {name: {r.recipient_id for r in rows} for name, rows in channels.items()}
+
+        assert users['queued'] == {recipients[0].id}
+        assert users['email'] == {user.id for user in recipients} - {recipients[0].id, recipients[1].id}
+        assert users['push'] == {user.id for user in recipients} - {recipients[2].id}
+
+    def test_one_connection_per_batch(self, message, recipients, email_settings, monkeypatch):
+        connections = []
+
+        def counting_connection(*args, **kwargs):
+            connection = EmailBackend()
+            connections.append(connection)
+            return connection
+
+        monkeypatch.setattr(notifications, 'get_connection', counting_connection)
+
+        sent, failed = notify_recipients(message)
+
+        assert len(connections) == 1
+        assert sorted(email.to[0] for email in mail.outbox) == sorted(user.email for user in recipients)
+        assert sent == 2 * len(recipients)
+        assert failed == []
+        assert not message.recipients.filter(email_sent=False).exists()
+        assert not message.recipients.filter(notification_sent=False).exists()
+
+    def test_failed_email_is_retried_once(self, message, recipients, email_settings, monkeypatch):
+        email_settings.EMAIL_BACKEND = f'{__name__}.FailingBackend'
+        monkeypatch.setattr(FailingBackend, 'refused', {recipients[0].email})
+        pushed = []
+        monkeypatch.setattr(notifications, 'send_push_notification', lambda user, msg: pushed.append(user.id))
+
+        sent, failed = notify_recipients(message)
+
+        assert failed == [str(recipients[0].id)]
+        assert len(mail.outbox) == len(recipients) - 1
+        assert sent == len(recipients) + len(recipients) - 1
+        failed_row = message.recipients.get(recipient=recipients[0])
+        assert failed_row.notification_sent and not failed_row.email_sent
+
+        # Reprise : seul l'email en échec est renvoyé, sans nouveau push
+        FailingBackend.refused = set()
+        sent, failed = notify_recipients(message, failed)
+
+        assert (sent, failed) == (1, [])
+        assert len(pushed) == len(recipients)
+        assert [email.to[0] for email in mail.outbox].count(recipients[0].email) == 1
+        assert len(mail.outbox) == len(recipients)
+
+        # Rien n'est renvoyé une fois tous les emails remis
+        assert notify_recipients(message) == (0, [])
+        assert len(mail.outbox) == len(recipients)
+
+    def test_task_retries_failed_recipients(self, message, recipients, email_settings, monkeypatch):
+        email_settings.EMAIL_BACKEND = f'{__name__}.FailingBackend'
+        monkeypatch.setattr(FailingBackend, 'refused', {recipients[0].email})
+        retries = []
+
+        def retry(*args, **kwargs):
+            retries.append(kwargs)
+            return RuntimeError('retry')
+
+        monkeypatch.setattr(send_message_notifications, 'retry', retry)
+        send_message_notifications.push_request(id='task-1', retries=0)
+        try:
+            with pytest.raises(RuntimeError):
+                send_message_notifications.run(str(message.id))
+        finally:
+            send_message_notifications.pop_request()
+
+        assert retries[0]['args'] == [str(message.id), [str(recipients[0].id)]]
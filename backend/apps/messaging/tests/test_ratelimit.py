@@ -0,0 +1,78 @@
+"""
+Tests de la limitation du débit d'envoi
+"""
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.messaging import ratelimit
+from apps.messaging.models import Message
+from apps.messaging.views import MessageViewSet
+
+
+class BrokenCache(LocMemCache):
+    """Cache dont le serveur ne répond plus"""
+
+    def add(self, *args, **kwargs):
+        raise ConnectionError("Redis indisponible")
+
+
+@pytest.fixture
+def limiter(monkeypatch, settings):
+    settings.MESSAGING_RATE_LIMITS = {'student': {'messages': 2, 'recipients': 3}}
+    clock = [1_000_000.0]
+    limiter = ratelimit.SendRateLimiter(
+        cache=LocMemCache('ratelimit-tests', {}),
+        clock=lambda: clock[0]
+    )
+    limiter.clock_value = clock
+    monkeypatch.setattr(ratelimit, '_limiter', limiter)
+    return limiter
+
+
+def create_message(user, recipients, **extra):
+    request = APIRequestFactory().post('/api/v1/messaging/messages/', {
+        'subject': 'Sujet',
+        'body': 'Corps',
+        'recipients': [str(recipient.id) for recipient in recipients],
+        **extra
+    }, format='json')
+    force_authenticate(request, user=user)
+    return MessageViewSet.as_view({'post': 'create'})(request)
+
+
+@pytest.mark.django_db
+class TestSendRateLimiter:
+
+    def test_rejects_over_recipient_limit(self, limiter, student, recipients, no_notifications):
+        assert create_message(student, recipients[:2]).status_code == 201
+
+        response = create_message(student, recipients[:2])
+
+        assert response.status_code == 429
+        assert Message.objects.filter(sender=student).count() == 1
+        assert limiter.usage(student.id) == {'messages': 1, 'recipients': 2}
+        assert limiter.flagged()[0]['user_id'] == str(student.id)
+
+    def test_window_slides(self, limiter, student, recipients, no_notifications):
+        create_message(student, recipients[:1])
+        create_message(student, recipients[:1])
+        assert create_message(student, recipients[:1]).status_code == 429
+
+        limiter.clock_value[0] += limiter.window
+
+        assert create_message(student, recipients[:1]).status_code == 201
+
+    def test_drafts_are_not_counted(self, limiter, student, recipients, no_notifications):
+        for _ in range(3):
+            response = create_message(student, recipients[:1], send_now=False)
+            assert response.status_code == 201
+
+        assert limiter.usage(student.id) == {'messages': 0, 'recipients': 0}
+
+    def test_unavailable_cache_lets_messages_through(self, monkeypatch, student, recipients,
+                                                     no_notifications):
+        monkeypatch.setattr(
+            ratelimit, '_limiter', ratelimit.SendRateLimiter(cache=BrokenCache('broken', {}))
+        )
+
+        assert create_message(student, recipients[:1]).status_code == 201
@@ -0,0 +1,149 @@
+"""
+Tests de la purge de la corbeille et des messages orphelins
+"""
+from datetime import timedelta
+
+import pytest
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.utils import timezone
+from apps.core.models import StoredBlob
+from apps.messaging.broadcast import add_recipients
+from apps.messaging.mailbox import update_recipients
+from apps.messaging.models import (
+    MailboxCounter, Message, MessageAttachment, MessageFolder, MessageRecipient
+)
+from apps.messaging import retention
+from apps.messaging.retention import DEFAULT_POLICY, RetentionRun
+from apps.messaging.tasks import cleanup_old_messages
+from apps.schools.models import School
+from apps.tenants.models import Tenant
+
+
+def counter(user, folder):
+    return MailboxCounter.objects.filter(user=user, folder=folder).values_list(
+        'total', 'unread'
+    ).first()
+
+
+def sent_message(sender, subject, recipients=(), parent=None):
+    message = Message.objects.create(
+        sender=sender, subject=subject, body='...', parent_message=parent
+    )
+    add_recipients(message, [user.id for user in recipients])
+    message.send()
+    return message
+
+
+def search_path():
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW search_path')
+        return cursor.fetchone()[0].split(',')[0].strip()
+
+
+def make_tenant(schema_name, is_active=True):
+    school = School.objects.create(
+        name=f'Lycée {schema_name}',
+        school_type='lycee',
+        address='1 rue du Test',
+        postal_code='75000',
+        city='Paris',
+        phone='0123456789',
+        email=f'{schema_name}@test.fr',
+        subdomain=schema_name.replace('_', '-')
+    )
+    return Tenant.objects.create(
+        schema_name=schema_name,
+        domain_url=f'{schema_name}.test.fr',
+        school=school,
+        is_active=is_active
+    )
+
+
+@pytest.mark.django_db
+class TestRetentionRun:
+
+    def test_purges_expired_trash_and_orphans(
+        self, settings, tmp_path, teacher, student, recipients, django_capture_on_commit_callbacks
+    ):
+        settings.MEDIA_ROOT = str(tmp_path)
+        shared = sent_message(teacher, 'Partagé', [student, recipients[0]])
+        orphan = sent_message(teacher, 'Orphelin', [student])
+        MessageAttachment.objects.create(
+            message=orphan,
+            file=ContentFile(b'Programme', name='programme.txt'),
+            filename='programme.txt',
+            file_size=9,
+            content_type='text/plain'
+        )
+        answered = sent_message(teacher, 'Avec réponse')
+        sent_message(student, 'RE: Avec réponse', [teacher], parent=answered)
+        draft = Message.objects.create(sender=teacher, subject='Brouillon', body='...')
+
+        update_recipients(
+            MessageRecipient.objects.filter(recipient=student), folder=MessageFolder.TRASH
+        )
+        assert counter(student, MessageFolder.TRASH) == (2, 2)
+        assert counter(teacher, MessageFolder.SENT) == (3, 0)
+
+        run = RetentionRun(
+            policy={**DEFAULT_POLICY, 'batch_size': 1, 'pause': 0},
+            now=timezone.now() + timedelta(days=DEFAULT_POLICY['trash_days'] + 1)
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            stats = run.run()
+
+        assert stats == {'trash': 2, 'orphans': 1, 'attachments': 1, 'batches': 3}
+        assert not MessageRecipient.objects.filter(recipient=student).exists()
+        assert counter(student, MessageFolder.TRASH) == (0, 0)
+        assert counter(recipients[0], MessageFolder.INBOX) == (1, 1)
+        assert counter(teacher, MessageFolder.SENT) == (2, 0)
+
+        remaining = set(Message.objects.values_list('pk', flat=True))
+        assert orphan.pk not in remaining
+        assert {shared.pk, answered.pk, draft.pk} <= remaining
+        assert not StoredBlob.objects.exists()
+
+    def test_recent_trash_is_kept(self, teacher, student):
+        message = sent_message(teacher, 'Récent', [student])
+        update_recipients(message.recipients.all(), folder=MessageFolder.TRASH)
+
+        stats = RetentionRun(policy={**DEFAULT_POLICY, 'pause': 0}).run()
+
+        assert stats['trash'] == 0 and stats['orphans'] == 0
+        assert message.recipients.exists()
+        assert counter(student, MessageFolder.TRASH) == (1, 1)
+
+
+@pytest.mark.django_db
+class TestCleanupTask:
+
+    @pytest.fixture
+    def runs(self, settings, monkeypatch):
+        """Politique appliquée et schéma actif à chaque purge"""
+        settings.MESSAGING_RETENTION = {'lycee_b': {'trash_days': 7}}
+        runs = []
+
+        def apply_retention(progress=None, max_batches=None, tenant=None):
+            runs.append((tenant, search_path(), retention.get_policy(tenant)['trash_days']))
+            return {'trash': 1, 'orphans': 2, 'attachments': 0, 'batches': 1}
+
+        monkeypatch.setattr(retention, 'apply_retention', apply_retention)
+        return runs
+
+    def test_each_active_tenant_is_purged(self, runs):
+        for schema_name in ['lycee_b', 'lycee_a']:
+            make_tenant(schema_name)
+        make_tenant('lycee_ferme', is_active=False)
+        result = cleanup_old_messages.run()
+
+        assert runs == [('lycee_a', 'lycee_a', 30), ('lycee_b', 'lycee_b', 7)]
+        assert result == '2 messages de corbeille et 4 messages orphelins supprimés (0 pièces jointes)'
+
+    def test_single_tenant(self, runs):
+        make_tenant('lycee_a')
+        make_tenant('lycee_b')
+
+        cleanup_old_messages.run(schema_name='lycee_b')
+
+        assert [tenant for tenant, _, _ in runs] == ['lycee_b']
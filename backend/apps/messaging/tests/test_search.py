@@ -0,0 +1,83 @@
+"""
+Tests de la recherche de messages
+"""
+import pytest
+from apps.messaging.broadcast import add_recipients
+from apps.messaging.models import Message
+from apps.messaging.search import search_text, visible_messages
+from apps.messaging.serializers import MessageSearchSerializer
+
+
+def sent_message(sender, subject, recipients=(), body='...'):
+    message = Message.objects.create(sender=sender, subject=subject, body=body)
+    add_recipients(message, [user.id for user in recipients])
+    message.send()
+    return message
+
+
+def search(user, **data):
+    serializer = MessageSearchSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return list(serializer.search(user))
+
+
+@pytest.fixture
+def substring_search(monkeypatch):
+    """Recherche par sous-chaîne, comme hors PostgreSQL"""
+    monkeypatch.setattr('apps.messaging.search.uses_full_text', lambda: False)
+
+
+@pytest.mark.django_db
+class TestVisibleMessages:
+
+    def test_sent_and_received_messages(self, teacher, student, recipients):
+        received = sent_message(teacher, 'Sortie scolaire', [student])
+        sent = sent_message(student, 'Question', [teacher])
+        sent_message(teacher, 'Autre classe', [recipients[0]])
+
+        # Brouillon adressé à l'élève mais jamais envoyé
+        draft = Message.objects.create(sender=teacher, subject='Brouillon', body='...')
+        add_recipients(draft, [student.id])
+
+        visible = visible_messages(Message.objects.all(), student)
+
+        assert set(visible) == {received, sent}
+        # L'expéditeur voit ses propres brouillons
+        assert draft in visible_messages(Message.objects.all(), teacher)
+
+    def test_message_sent_to_self_is_listed_once(self, teacher):
+        message = sent_message(teacher, 'Pense-bête', [teacher])
+
+        assert list(visible_messages(Message.objects.all(), teacher)) == [message]
+
+
+@pytest.mark.django_db
+class TestSubstringSearch:
+
+    def test_matches_subject_body_and_sender(self, substring_search, teacher, student, user_factory):
+        by_subject = sent_message(teacher, 'Réunion parents', [student])
+        by_body = sent_message(teacher, 'Information', [student], body='La réunion est reportée')
+        sent_message(teacher, 'Cantine', [student])
+        other = user_factory('reunionnais', 'teacher')
+        by_sender = sent_message(other, 'Bonjour', [student])
+
+        results = search_text(visible_messages(Message.objects.all(), student), 'réunion')
+        assert set(results) == {by_subject, by_body}
+
+        results = search_text(visible_messages(Message.objects.all(), student), 'Reunionnais')
+        assert list(results) == [by_sender]
+
+    def test_results_are_limited_to_visible_messages(self, substring_search, teacher, student, recipients):
+        mine = sent_message(teacher, 'Devoirs de français', [student])
+        sent_message(teacher, 'Devoirs de mathématiques', [recipients[0]])
+        draft = Message.objects.create(sender=teacher, subject='Devoirs à venir', body='...')
+        add_recipients(draft, [student.id])
+
+        assert [message.pk for message in search(student, query='devoirs')] == [mine.pk]
+
+    def test_latest_messages_first(self, substring_search, teacher, student):
+        messages = [sent_message(teacher, f'Devoirs {i}', [student]) for i in range(3)]
+
+        results = search(student, query='devoirs')
+
+        assert [message.pk for message in results] == [message.pk for message in reversed(messages)]
@@ -0,0 +1,85 @@
+"""
+Tests des fils de discussion (message racine et taille dénormalisée)
+"""
+import importlib
+
+import pytest
+from django.apps import apps
+from apps.messaging.models import Message
+
+fill_threads = importlib.import_module(
+    'apps.messaging.migrations.0002_message_threads'
+).fill_threads
+
+
+def reply(parent, sender, subject=None):
+    return Message.objects.create(
+        sender=sender,
+        subject=subject or f'RE: {parent.subject}',
+        body='Réponse',
+        parent_message=parent
+    )
+
+
+@pytest.fixture
+def thread(teacher, student):
+    """Racine, deux réponses directes et une chaîne imbriquée"""
+    root = Message.objects.create(sender=teacher, subject='Sortie', body='Autorisations ?')
+    first = reply(root, student)
+    second = reply(first, teacher)
+    third = reply(second, student)
+    sibling = reply(root, teacher)
+    return root, first, second, third, sibling
+
+
+def thread_size(message):
+    return Message.objects.get(pk=message.pk).thread_size
+
+
+@pytest.mark.django_db
+class TestMessageThreads:
+
+    def test_nested_replies_point_to_root(self, thread):
+        root, first, second, third, sibling = thread
+
+        assert {message.root_message_id for message in thread[1:]} == {root.id}
+        assert root.root_message_id is None
+        assert thread_size(root) == 5
+        assert third.thread_root_id == root.id
+        assert third.thread_count == 5
+
+    def test_thread_messages_in_one_query(self, thread, django_assert_num_queries):
+        root, first, second, third, sibling = thread
+        third = Message.objects.get(pk=third.pk)
+
+        with django_assert_num_queries(1):
+            messages = list(third.get_thread_messages())
+
+        assert {message.pk for message in messages} == {message.pk for message in thread}
+
+    def test_deleting_mid_thread_reply(self, thread):
+        root, first, second, third, sibling = thread
+
+        # La suppression emporte les réponses imbriquées (cascade)
+        Message.objects.get(pk=second.pk).delete()
+
+        assert thread_size(root) == 3
+        assert {message.pk for message in root.get_thread_messages()} == {
+            root.pk, first.pk, sibling.pk
+        }
+
+        Message.objects.get(pk=sibling.pk).delete()
+        assert thread_size(root) == 2
+
+    def test_migration_fills_existing_threads(self, thread, teacher):
+        root, first, second, third, sibling = thread
+        alone = Message.objects.create(sender=teacher, subject='Seul', body='...')
+        Message.objects.update(root_message=None, thread_size=1)
+
+        fill_threads(apps, None)
+
+        for message in thread[1:]:
+            assert Message.objects.get(pk=message.pk).root_message_id == root.id
+        assert thread_size(root) == 5
+        assert thread_size(alone) == 1
+        assert Message.objects.get(pk=alone.pk).root_message_id is None
@@ -6,7 +6,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     MessageViewSet, MessageTemplateViewSet, MessageGroupViewSet,
     email_forwarding_settings, notification_preferences,
-    message_statistics
+    message_statistics, message_rate_limits
 )
 
 router = DefaultRouter()
@@ -21,4 +21,5 @@ urlpatterns = [
     path('settings/email-forwarding/', email_forwarding_settings, name='email-forwarding'),
     path('settings/notifications/', notification_preferences, name='notifications'),
     path('statistics/', message_statistics, name='statistics'),
+    path('rate-limits/', message_rate_limits, name='rate-limits'),
 ]
\ No newline at end of file
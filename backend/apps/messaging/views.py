@@ -4,15 +4,19 @@ Vues API pour le système de messagerie
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError
 from django.db.models import Q, Count, Case, When, BooleanField, F
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django_filters import rest_framework as filters
+from django_filters.utils import translate_validation
+
+from apps.authentication.models import User
 
 from .models import (
     Message, MessageRecipient, MessageAttachment,
     MessageTemplate, MessageGroup, EmailForwarding,
-    NotificationPreference, MessageFolder, MessagePriority
+    NotificationPreference, MessageFolder, MessagePriority, MessageBroadcast
 )
 from .serializers import (
     MessageListSerializer, MessageDetailSerializer,
@@ -20,8 +24,16 @@ from .serializers import (
     MessageTemplateSerializer, MessageGroupSerializer,
     EmailForwardingSerializer, NotificationPreferenceSerializer,
     MessageSearchSerializer, ConversationSerializer,
-    MessageRecipientSerializer
+    MessageRecipientSerializer, MessageBroadcastSerializer
+)
+from .broadcast import broadcast_message
+from .listing import (
+    MessageCursorPagination, folder_pagination, page_messages,
+    received_queryset, sent_queryset
 )
+from .mailbox import get_counters, get_unread_count, update_recipients
+from .ratelimit import check_send_rate, get_limiter, get_limits
+from .search import MessageSearchPagination
 from .tasks import send_message_notifications, process_email_batch
 
 
@@ -80,11 +92,29 @@ class MessageFilter(filters.FilterSet):
         return queryset.filter(attachments__isnull=True)
 
 
+class MailboxFilter(filters.FilterSet):
+    """Filtres des dossiers de réception, appliqués aux lignes destinataires"""
+    is_unread = filters.BooleanFilter(field_name='is_read', exclude=True)
+    is_starred = filters.BooleanFilter()
+    priority = filters.MultipleChoiceFilter(
+        field_name='message__priority',
+        choices=MessagePriority.choices
+    )
+    sender = filters.UUIDFilter(field_name='message__sender')
+    is_announcement = filters.BooleanFilter(field_name='message__is_announcement')
+    has_attachments = filters.BooleanFilter(field_name='attachment_exists')
+    
+    class Meta:
+        model = MessageRecipient
+        fields = []
+
+
 class MessageViewSet(viewsets.ModelViewSet):
     """ViewSet pour les messages"""
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.DjangoFilterBackend]
     filterset_class = MessageFilter
+    pagination_class = MessageCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -103,7 +133,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         queryset = Message.objects.filter(
             Q(recipients__recipient=user) | Q(sender=user)
         ).select_related(
-            'sender', 'sender__profile'
+            'sender', 'sender__profile', 'root_message'
         ).prefetch_related(
             'recipients', 'attachments'
         ).annotate(
@@ -122,6 +152,35 @@ class MessageViewSet(viewsets.ModelViewSet):
         
         return queryset.order_by('-created_at')
     
+    def list(self, request, *args, **kwargs):
+        """
+        Liste des messages
+        
+        Avec ``folder``, la liste est lue depuis le dossier de l'utilisateur
+        (requête dédiée, pagination par curseur) ; sans dossier, elle
+        regroupe messages reçus et envoyés.
+        """
+        folder = request.query_params.get('folder')
+        if folder not in MessageFolder.values:
+            return super().list(request, *args, **kwargs)
+        
+        if folder == MessageFolder.SENT:
+            queryset = self.filter_queryset(sent_queryset(request.user))
+        else:
+            filterset = MailboxFilter(
+                request.query_params,
+                queryset=received_queryset(request.user, folder),
+                request=request
+            )
+            if not filterset.is_valid():
+                raise translate_validation(filterset.errors)
+            queryset = filterset.qs
+        
+        paginator = folder_pagination(folder)()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page_messages(page), many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
     def retrieve(self, request, *args, **kwargs):
         """Récupérer un message et le marquer comme lu"""
         instance = self.get_object()
@@ -137,44 +196,22 @@ class MessageViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Nombre de messages non lus"""
-        count = MessageRecipient.objects.filter(
-            recipient=request.user,
-            is_read=False,
-            folder=MessageFolder.INBOX
-        ).count()
+        count = get_unread_count(request.user)
         
         return Response({'unread_count': count})
     
     @action(detail=False, methods=['get'])
     def folders(self, request):
         """Statistiques par dossier"""
-        user = request.user
+        counters = get_counters(request.user)
         
         stats = {}
         for folder, label in MessageFolder.choices:
-            if folder == MessageFolder.SENT:
-                count = Message.objects.filter(
-                    sender=user,
-                    sent_at__isnull=False
-                ).count()
-            else:
-                count = MessageRecipient.objects.filter(
-                    recipient=user,
-                    folder=folder
-                ).count()
-            
-            unread = 0
-            if folder == MessageFolder.INBOX:
-                unread = MessageRecipient.objects.filter(
-                    recipient=user,
-                    folder=folder,
-                    is_read=False
-                ).count()
-            
+            count, unread = counters.get(folder, (0, 0))
             stats[folder] = {
                 'label': label,
-                'count': count,
-                'unread': unread
+                'count': max(count, 0),
+                'unread': max(unread, 0) if folder == MessageFolder.INBOX else 0
             }
         
         return Response(stats)
@@ -253,35 +290,25 @@ class MessageViewSet(viewsets.ModelViewSet):
         # Récupérer les messages concernés
         messages = self.get_queryset().filter(id__in=message_ids)
         
+        recipients = MessageRecipient.objects.filter(
+            message__in=messages,
+            recipient=request.user
+        )
+        
         if action == 'mark_read':
-            MessageRecipient.objects.filter(
-                message__in=messages,
-                recipient=request.user
-            ).update(is_read=True, read_at=timezone.now())
+            update_recipients(recipients, is_read=True, read_at=timezone.now())
             
         elif action == 'mark_unread':
-            MessageRecipient.objects.filter(
-                message__in=messages,
-                recipient=request.user
-            ).update(is_read=False, read_at=None)
+            update_recipients(recipients, is_read=False, read_at=None)
             
         elif action == 'star':
-            MessageRecipient.objects.filter(
-                message__in=messages,
-                recipient=request.user
-            ).update(is_starred=True)
+            recipients.update(is_starred=True)
             
         elif action == 'unstar':
-            MessageRecipient.objects.filter(
-                message__in=messages,
-                recipient=request.user
-            ).update(is_starred=False)
+            recipients.update(is_starred=False)
             
         elif action in MessageFolder.values:
-            MessageRecipient.objects.filter(
-                message__in=messages,
-                recipient=request.user
-            ).update(folder=action)
+            update_recipients(recipients, folder=action)
             
         else:
             return Response(
@@ -325,7 +352,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         reply = serializer.save()
         
         return Response(
-            MessageDetailSerializer(reply).data,
+            MessageDetailSerializer(reply, context={'request': request}).data,
             status=status.HTTP_201_CREATED
         )
     
@@ -342,6 +369,28 @@ class MessageViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def broadcast_status(self, request, pk=None):
+        """Avancement de la distribution d'un message à ses destinataires"""
+        message = self.get_object()
+        
+        if message.sender != request.user:
+            return Response(
+                {'error': 'Seul l\'expéditeur peut suivre la distribution'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            broadcast = message.broadcast
+        except MessageBroadcast.DoesNotExist:
+            return Response({
+                'status': 'completed',
+                'total_recipients': message.recipients.count(),
+                'progress': 100
+            })
+        
+        return Response(MessageBroadcastSerializer(broadcast).data)
+    
     @action(detail=False, methods=['post'])
     def search(self, request):
         """Recherche avancée de messages"""
@@ -350,21 +399,15 @@ class MessageViewSet(viewsets.ModelViewSet):
         
         messages = serializer.search(request.user)
         
-        page = self.paginate_queryset(messages)
-        if page is not None:
-            serializer = MessageListSerializer(
-                page,
-                many=True,
-                context={'request': request}
-            )
-            return self.get_paginated_response(serializer.data)
-        
+        # Résultats classés par pertinence : pagination par numéro de page
+        paginator = MessageSearchPagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
         serializer = MessageListSerializer(
-            messages,
+            page,
             many=True,
             context={'request': request}
         )
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['post'])
     def create_from_template(self, request):
@@ -388,21 +431,16 @@ class MessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        check_send_rate(request.user, len(set(recipients)))
+        
         # Créer le message
         message = template.create_message(request.user, context)
         
-        # Ajouter les destinataires
-        for recipient_id in recipients:
-            MessageRecipient.objects.create(
-                message=message,
-                recipient_id=recipient_id
-            )
-        
-        # Envoyer
-        message.send()
+        # Ajouter les destinataires et envoyer
+        broadcast_message(message, recipient_ids=recipients)
         
         return Response(
-            MessageDetailSerializer(message).data,
+            MessageDetailSerializer(message, context={'request': request}).data,
             status=status.HTTP_201_CREATED
         )
 
@@ -538,13 +576,19 @@ class MessageGroupViewSet(viewsets.ModelViewSet):
             my_classes = Class.objects.filter(
                 Q(main_teacher=user) |
                 Q(schedules__teacher=user)
+            ).annotate(
+                active_students=Count(
+                    'students',
+                    filter=Q(students__is_active=True),
+                    distinct=True
+                )
             ).distinct()
             
             for class_obj in my_classes:
                 quick_groups.append({
                     'id': f'class_{class_obj.id}',
                     'name': f'Élèves de {class_obj}',
-                    'member_count': class_obj.students.filter(is_active=True).count(),
+                    'member_count': class_obj.active_students,
                     'type': 'class'
                 })
             
@@ -669,4 +713,51 @@ def message_statistics(request):
             }
             for sender in top_senders
         ]
-    })
\ No newline at end of file
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def message_rate_limits(request):
+    """
+    Compteurs d'envoi (administration)
+
+    Avec ``?user=<id>`` (répétable) : envois de ces utilisateurs sur la
+    fenêtre en cours ; sinon : utilisateurs ayant récemment dépassé leur
+    limite.
+    """
+    if request.user.user_type not in ['admin', 'superadmin']:
+        return Response(
+            {'error': 'Réservé à l\'administration'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    limiter = get_limiter()
+    user_ids = request.query_params.getlist('user')
+    
+    if not user_ids:
+        return Response({
+            'window_seconds': limiter.window,
+            'flagged': limiter.flagged()
+        })
+    
+    try:
+        users = list(User.objects.filter(id__in=user_ids).only('id', 'user_type'))
+    except ValidationError:
+        return Response(
+            {'error': 'Identifiant utilisateur invalide'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({
+        'window_seconds': limiter.window,
+        'users': [
+            {
+                'user_id': str(user.id),
+                'user_type': user.user_type,
+                'usage': limiter.usage(user.id),
+                'limits': get_limits(user.user_type)
+            }
+            for user in users
+        ]
+    })
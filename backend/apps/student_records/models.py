@@ -8,6 +8,7 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField
 from apps.core.models import BaseModel
+from apps.tenants.storage import get_content_storage
 from apps.authentication.models import User
 from apps.schools.models import School, Class, AcademicYear
 
@@ -602,6 +603,7 @@ class StudentDocument(BaseModel):
     
     file = models.FileField(
         upload_to='student_documents/%Y/%m/',
+        storage=get_content_storage,
         validators=[
             FileExtensionValidator(
                 allowed_extensions=['pdf', 'jpg', 'jpeg', 'png']
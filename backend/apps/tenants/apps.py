@@ -18,6 +18,7 @@ class TenantsConfig(AppConfig):
         """
         # Importer les signaux
         from . import signals
+        signals.connect_content_storage()
         
         # Patcher la connexion pour le support des schémas
         from .db import patch_connection
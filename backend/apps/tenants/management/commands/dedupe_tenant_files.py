@@ -0,0 +1,96 @@
+"""
+Commande Django pour dédupliquer les fichiers des tenants
+
+Les fichiers enregistrés avant le stockage par contenu sont déplacés dans
+``blobs/`` (un seul exemplaire par contenu) et les compteurs de références
+recalculés à partir des champs fichier ; les contenus qui ne sont plus
+référencés sont effacés.
+"""
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from apps.tenants.models import Tenant
+from apps.tenants.storage import content_fields, content_storage
+from apps.tenants.utils import execute_on_tenant
+
+
+class Command(BaseCommand):
+    help = 'Déduplique les fichiers des tenants et recalcule les références'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schema',
+            type=str,
+            help='Traiter uniquement ce tenant'
+        )
+
+        parser.add_argument(
+            '--recount-only',
+            action='store_true',
+            help='Recalculer les références sans déplacer les fichiers'
+        )
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.filter(is_active=True)
+        if options['schema']:
+            tenants = tenants.filter(schema_name=options['schema'])
+
+        for tenant in tenants.order_by('schema_name'):
+            adopted, removed = execute_on_tenant(
+                tenant, self.process_tenant, options['recount_only']
+            )
+            self.stdout.write(
+                f"{tenant.schema_name}: {adopted} fichier(s) dédupliqué(s), "
+                f"{removed} contenu(s) orphelin(s) supprimé(s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS('Déduplication terminée'))
+
+    def process_tenant(self, recount_only=False):
+        adopted = 0 if recount_only else self.adopt_files()
+        return adopted, self.recount()
+
+    def adopt_files(self):
+        """Déplacer les fichiers hors ``blobs/`` dans le stockage par contenu"""
+        adopted = 0
+        for model, field in content_fields():
+            rows = model.objects.exclude(**{field.name: ''}).exclude(
+                **{f'{field.name}__isnull': True}
+            ).exclude(
+                **{f'{field.name}__startswith': content_storage.BLOB_PREFIX}
+            ).values_list('pk', field.name)
+
+            for pk, name in rows.iterator():
+                if not content_storage.exists(name):
+                    self.stdout.write(self.style.WARNING(f"Fichier manquant: {name}"))
+                    continue
+                new_name = content_storage.adopt(name)
+                model.objects.filter(pk=pk).update(**{field.name: new_name})
+                adopted += 1
+        return adopted
+
+    def recount(self):
+        """Aligner ``refcount`` sur les références réelles"""
+        from apps.core.models import StoredBlob
+
+        references = Counter()
+        for model, field in content_fields():
+            references.update(
+                model.objects.filter(
+                    **{f'{field.name}__startswith': content_storage.BLOB_PREFIX}
+                ).values_list(field.name, flat=True).iterator()
+            )
+
+        removed = 0
+        for blob in StoredBlob.objects.iterator():
+            count = references.get(blob.name, 0)
+            if count:
+                if count != blob.refcount:
+                    StoredBlob.objects.filter(pk=blob.pk).update(refcount=count)
+                continue
+            # Dernière référence fictive retirée : le fichier est effacé
+            StoredBlob.objects.filter(pk=blob.pk).update(refcount=1)
+            content_storage.delete(blob.name)
+            removed += 1
+        return removed
@@ -1,7 +1,8 @@
 """
 Signaux Django pour la gestion des tenants
 """
-from django.db.models.signals import post_save, pre_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.core.cache import cache
 from .models import Tenant, TenantDomain
@@ -67,4 +68,88 @@ def handle_domain_deletion(sender, instance, **kwargs):
     """
     # Invalider le cache
     cache_key = f'tenant:{instance.domain}'
-    cache.delete(cache_key)
\ No newline at end of file
+    cache.delete(cache_key)
+
+
+# Références des fichiers du stockage par contenu
+
+def _file_name(value):
+    return getattr(value, 'name', value) or ''
+
+
+def _content_fields(instance):
+    return getattr(type(instance), '_content_file_fields', ())
+
+
+def remember_content_files(sender, instance, **kwargs):
+    """Noms des fichiers à l'ouverture de l'instance (champs non différés)"""
+    instance._content_files = {
+        field.attname: _file_name(instance.__dict__[field.attname])
+        for field in _content_fields(instance)
+        if field.attname in instance.__dict__
+    }
+
+
+def detect_content_uploads(sender, instance, **kwargs):
+    """Champs recevant un nouveau fichier (enregistré par ``save``)"""
+    instance._content_uploads = {
+        field.attname
+        for field in _content_fields(instance)
+        if (value := getattr(instance, field.attname)) and not value._committed
+    }
+
+
+def release_replaced_content_files(sender, instance, **kwargs):
+    """
+    Retirer la référence de l'ancien fichier remplacé
+
+    Un nouvel envoi identique à l'ancien fichier a ajouté une référence :
+    l'ancienne est retirée même si le nom n'a pas changé.
+    """
+    previous = getattr(instance, '_content_files', {})
+    uploads = getattr(instance, '_content_uploads', set())
+    for field in _content_fields(instance):
+        name = _file_name(getattr(instance, field.attname))
+        old_name = previous.get(field.attname)
+        if old_name and (old_name != name or field.attname in uploads):
+            transaction.on_commit(
+                lambda field=field, old_name=old_name: field.storage.delete(old_name)
+            )
+    instance._content_files = {
+        field.attname: _file_name(getattr(instance, field.attname))
+        for field in _content_fields(instance)
+    }
+    instance._content_uploads = set()
+
+
+def release_deleted_content_files(sender, instance, **kwargs):
+    """Retirer les références des fichiers d'une ligne supprimée"""
+    for field in _content_fields(instance):
+        name = _file_name(instance.__dict__.get(field.attname))
+        if name:
+            transaction.on_commit(
+                lambda field=field, name=name: field.storage.delete(name)
+            )
+
+
+def connect_content_storage():
+    """
+    Brancher les signaux sur les modèles utilisant le stockage par contenu
+
+    Appelé au démarrage (``TenantsConfig.ready``), une fois les modèles
+    chargés.
+    """
+    from .storage import content_fields
+
+    fields = {}
+    for model, field in content_fields():
+        fields.setdefault(model, []).append(field)
+
+    for model, model_fields in fields.items():
+        model._content_file_fields = tuple(model_fields)
+        uid = f'content_storage_{model._meta.label_lower}'
+        post_init.connect(remember_content_files, sender=model, dispatch_uid=uid)
+        pre_save.connect(detect_content_uploads, sender=model, dispatch_uid=uid)
+        post_save.connect(release_replaced_content_files, sender=model, dispatch_uid=uid)
+        post_delete.connect(release_deleted_content_files, sender=model, dispatch_uid=uid)
+
@@ -1,11 +1,18 @@
 """
 Classes de stockage personnalisées pour l'isolation des fichiers par tenant
 """
+import hashlib
+import logging
 import os
+import tempfile
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
 from django.utils.functional import cached_property
 
+logger = logging.getLogger(__name__)
+
 
 class TenantFileSystemStorage(FileSystemStorage):
     """
@@ -101,10 +108,17 @@ class TenantFileSystemStorage(FileSystemStorage):
         
         if os.path.exists(tenant_root):
             for dirpath, dirnames, filenames in os.walk(tenant_root):
+                # Les contenus dédupliqués sont comptés ci-dessous
+                if dirpath == tenant_root and 'blobs' in dirnames:
+                    dirnames.remove('blobs')
                 for filename in filenames:
                     filepath = os.path.join(dirpath, filename)
                     total_size += os.path.getsize(filepath)
         
+        # Contenus dédupliqués (``ContentAddressedStorage``), comptés une fois
+        from apps.core.models import StoredBlob
+        total_size += StoredBlob.objects.aggregate(total=Sum('size'))['total'] or 0
+        
         return total_size
     
     def get_tenant_usage_gb(self):
@@ -126,6 +140,172 @@ class TenantFileSystemStorage(FileSystemStorage):
         return (current_usage_gb + file_size_gb) <= self.tenant.max_storage_gb
 
 
+class ContentAddressedStorage(TenantFileSystemStorage):
+    """
+    Stockage dédupliqué par contenu, isolé par tenant
+
+    Le fichier envoyé est haché (SHA-256) pendant son écriture dans un
+    fichier temporaire, puis rangé sous ``blobs/<aa>/<bb>/<empreinte>`` dans
+    le répertoire du tenant : un contenu identique n'est stocké qu'une fois.
+    Les références sont comptées dans ``StoredBlob`` (table du tenant) et
+    ``delete`` n'efface le fichier qu'à la dernière référence ; les
+    signaux de ``apps.tenants.signals`` retirent la référence quand la
+    ligne est supprimée ou son fichier remplacé. ``get_tenant_usage``
+    compte chaque contenu une fois, d'après la taille enregistrée dans
+    ``StoredBlob``.
+    """
+
+    BLOB_PREFIX = 'blobs/'
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tenants = {}
+
+    @property
+    def tenant(self):
+        """
+        Tenant du schéma courant, résolu à chaque appel
+
+        L'instance est partagée par tous les tenants d'un même processus :
+        seul le tenant de chaque schéma est mis en cache.
+        """
+        from .utils import get_current_schema, get_tenant_from_schema_name
+        schema = get_current_schema()
+        if not schema or schema == 'public':
+            return None
+        if schema not in self._tenants:
+            self._tenants[schema] = get_tenant_from_schema_name(schema)
+        return self._tenants[schema]
+
+    def is_blob(self, name):
+        return bool(name) and name.startswith(self.BLOB_PREFIX)
+
+    def blob_name(self, digest, name):
+        """Nom de stockage d'un contenu (l'extension d'origine est conservée)"""
+        extension = os.path.splitext(name)[1].lower()[:10]
+        return f'{self.BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif dépend du contenu : il est choisi par ``_save``
+        return name
+
+    # Les opérations de ``FileSystemStorage`` passent par ``path`` : seuls
+    # les contenus (``blobs/``) sont rangés dans le répertoire du tenant.
+    # Les fichiers enregistrés avant la déduplication restent lus, servis
+    # et supprimés à leur emplacement d'origine (``MEDIA_ROOT/<upload_to>``)
+    def path(self, name):
+        if self.is_blob(name):
+            return super().path(name)
+        return FileSystemStorage.path(self, name)
+
+    def url(self, name):
+        if self.is_blob(name):
+            return super().url(name)
+        return FileSystemStorage.url(self, name)
+
+    def exists(self, name):
+        return FileSystemStorage.exists(self, name)
+
+    def size(self, name):
+        return FileSystemStorage.size(self, name)
+
+    def listdir(self, path):
+        return FileSystemStorage.listdir(self, path)
+
+    def _spool(self, content):
+        """
+        Écrire ``content`` dans un fichier temporaire en le hachant
+
+        Renvoie (empreinte, taille, chemin du fichier temporaire).
+        """
+        directory = self.path(self.BLOB_PREFIX + 'tmp')
+        os.makedirs(directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+            for chunk in content.chunks(self.CHUNK_SIZE):
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                temp.write(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size, temp.name
+
+    def _save(self, name, content):
+        from apps.core.models import StoredBlob
+
+        digest, size, temp_path = self._spool(content)
+        try:
+            with transaction.atomic():
+                blob, created = StoredBlob.objects.select_for_update().get_or_create(
+                    sha256=digest,
+                    defaults={'name': self.blob_name(digest, name), 'size': size}
+                )
+                full_path = self.path(blob.name)
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.replace(temp_path, full_path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return blob.name
+
+    def delete(self, name):
+        """
+        Retirer une référence ; le fichier est effacé à la dernière
+
+        Les fichiers enregistrés avant la déduplication sont supprimés
+        directement, à leur emplacement d'origine.
+        """
+        if not self.is_blob(name):
+            return FileSystemStorage.delete(self, name)
+
+        from apps.core.models import StoredBlob
+
+        full_path = self.path(name)
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                logger.warning(f"Contenu {name} sans référence enregistrée, conservé")
+                return
+            if blob.refcount > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return
+            blob.delete()
+            transaction.on_commit(lambda: self._remove(name, full_path))
+
+    def _remove(self, name, full_path):
+        from apps.core.models import StoredBlob
+
+        # Le même contenu a pu être renvoyé avant la validation
+        if StoredBlob.objects.filter(name=name).exists():
+            return
+        try:
+            os.remove(full_path)
+        except FileNotFoundError:
+            pass
+
+    def adopt(self, name):
+        """
+        Déplacer un fichier existant dans le stockage dédupliqué
+
+        ``name`` est lu à son emplacement d'origine (hors répertoire du
+        tenant), puis supprimé ; renvoie le nouveau nom (une référence de
+        plus sur le contenu).
+        """
+        if self.is_blob(name):
+            return name
+        with self.open(name) as content:
+            new_name = self._save(name, content)
+        FileSystemStorage.delete(self, name)
+        return new_name
+
+
 class TenantStaticFileStorage(FileSystemStorage):
     """
     Stockage pour les fichiers statiques personnalisés par tenant
@@ -168,4 +348,23 @@ class TenantStaticFileStorage(FileSystemStorage):
 
 # Instance globale pour le stockage des fichiers tenant
 tenant_storage = TenantFileSystemStorage()
-tenant_static_storage = TenantStaticFileStorage()
\ No newline at end of file
+tenant_static_storage = TenantStaticFileStorage()
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    """Stockage des pièces jointes et documents (référencé par les champs)"""
+    return content_storage
+
+
+def content_fields():
+    """Couples (modèle, champ) des champs fichier utilisant ``content_storage``"""
+    from django.apps import apps
+    from django.db.models import FileField
+
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, FileField) and field.storage is content_storage
+    ]
\ No newline at end of file
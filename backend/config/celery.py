@@ -81,4 +81,16 @@ app.conf.beat_schedule = {
         'task': 'apps.homework.tasks.cleanup_draft_submissions',
         'schedule': crontab(day_of_month=1, hour=3, minute=0),
     },
+    
+    # Recalcul des compteurs de la messagerie
+    'reconcile-mailbox-counters': {
+        'task': 'apps.messaging.tasks.reconcile_mailbox_counters',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    
+    # Membres des groupes dynamiques de la messagerie
+    'refresh-dynamic-message-groups': {
+        'task': 'apps.messaging.tasks.refresh_dynamic_groups',
+        'schedule': crontab(hour=2, minute=45),
+    },
 }
\ No newline at end of file
@@ -7,6 +7,7 @@ from pathlib import Path
 from datetime import timedelta
 import environ
 import os
+import tempfile
 
 # Initialisation des variables d'environnement
 env = environ.Env(
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Apps tierces
     'rest_framework',
@@ -128,6 +130,32 @@ CACHES = {
     }
 }
 
+# Cache des réponses de l'API IA (apps.ai_modules.cache)
+# Sur disque par défaut, hors de l'arborescence du projet (AI_RESPONSE_CACHE_DIR) ;
+# AI_RESPONSE_CACHE_URL=redis://... pour le partager
+# entre serveurs (prévoir alors une politique maxmemory-policy allkeys-lru)
+AI_RESPONSE_CACHE_URL = env('AI_RESPONSE_CACHE_URL', default='')
+AI_RESPONSE_CACHE_TIMEOUT = env.int('AI_RESPONSE_CACHE_TIMEOUT', default=60 * 60 * 24 * 7)  # 7 jours
+if AI_RESPONSE_CACHE_URL:
+    CACHES['ai_responses'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': AI_RESPONSE_CACHE_URL,
+        'TIMEOUT': AI_RESPONSE_CACHE_TIMEOUT,
+        'KEY_PREFIX': 'ai',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        }
+    }
+else:
+    CACHES['ai_responses'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('AI_RESPONSE_CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'peproscolaire', 'ai_responses')),
+        'TIMEOUT': AI_RESPONSE_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('AI_RESPONSE_CACHE_MAX_ENTRIES', default=10000),
+        }
+    }
+
 # Validation des mots de passe
 AUTH_PASSWORD_VALIDATORS = [
     {
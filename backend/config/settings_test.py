@@ -43,6 +43,11 @@ SECRET_KEY = 'test-secret-key-for-ci'
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    # Réponses IA en mémoire : rien n'est écrit sur disque pendant les tests
+    'ai_responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-ai-responses',
     }
 }
 